@@ -6,19 +6,35 @@ Administrator Functions
 '''
 
 import os
-import difflib
 from datetime import date, timedelta
 
+import aggregates
+import auth
+import columnar
+import fuzzy_search
+import partitions
 import utils
 
 # ------------------------------
 # File paths
 # ------------------------------
 current_path = os.path.dirname(os.path.abspath(__file__))
-user_source = os.path.join(current_path, "data/user.txt")
-appointment_source = os.path.join(current_path, "data/appointment.txt")
-medicine_source = os.path.join(current_path, "data/medicine.txt")
-income_source = os.path.join(current_path, "data/income.txt")
+# One folder per clinic; HEALTHPLUS_DATA_DIR picks another one (see clinics.py)
+data_dir = os.environ.get("HEALTHPLUS_DATA_DIR", os.path.join(current_path, "data"))
+user_source = os.path.join(data_dir, "user.txt")
+appointment_source = os.path.join(data_dir, "appointment.txt")
+medicine_source = os.path.join(data_dir, "medicine.txt")
+income_source = os.path.join(data_dir, "income.txt")
+
+
+def set_data_dir(folder):
+    """Point every admin function at the data files in another folder."""
+    global data_dir, user_source, appointment_source, medicine_source, income_source
+    data_dir = folder
+    user_source = os.path.join(folder, "user.txt")
+    appointment_source = os.path.join(folder, "appointment.txt")
+    medicine_source = os.path.join(folder, "medicine.txt")
+    income_source = os.path.join(folder, "income.txt")
 
 # ---------------------------------------------------
 # SHARED ROLE MAP (shortcut -> lowercase stored role)
@@ -51,9 +67,17 @@ role_map = {
 # ---------------------------------------------------
 # Helper: load users as dict {id: user_record}
 # ---------------------------------------------------
+_user_map_cache = {"stamp": None, "map": {}}
+
+
 def load_user_map():
-    users = utils.read_records(user_source)
-    return {u.get("userID"): u for u in users if "userID" in u}
+    """Users by ID, rebuilt only when user.txt has changed."""
+    stamp = utils.table_stamp(user_source)
+    if stamp is None or stamp != _user_map_cache["stamp"]:
+        users = utils.iter_records(user_source)
+        _user_map_cache["map"] = {u.get("userID"): u for u in users if "userID" in u}
+        _user_map_cache["stamp"] = stamp
+    return _user_map_cache["map"]
 
 
 def format_user_id_with_name(user_id, user_map):
@@ -69,26 +93,32 @@ def format_user_id_with_name(user_id, user_map):
 # ---------------------------------------------------
 def suggest_nearest_users(input_name):
     """Print nearest matching usernames and return list of user records."""
-    records = utils.read_records(user_source)
-    usernames = [r["username"] for r in records if "username" in r]
+    suggestions = fuzzy_search.suggest(user_source, input_name, n=3, cutoff=0.4)
 
-    close = difflib.get_close_matches(input_name, usernames, n=3, cutoff=0.4)
-
-    if not close:
+    if not suggestions:
         print("\nNo similar usernames found.")
         return []
 
     print("\nDid you mean:")
-    suggestions = []
-    for name in close:
-        user = next(r for r in records if r["username"] == name)
+    for user in suggestions:
         phone = user.get("phone", "No phone")
-        print(f" - {name}  (Phone: {phone})")
-        suggestions.append(user)
+        print(f" - {user['username']}  (Phone: {phone})")
 
     return suggestions
 
 
+# ---------------------------------------------------
+# Helper: user records as shown outside this module
+# ---------------------------------------------------
+# Never printed, returned by the service or exported
+PRIVATE_USER_FIELDS = ("password",)
+
+
+def public_user(user):
+    """Copy of a user record without PRIVATE_USER_FIELDS."""
+    return {k: v for k, v in user.items() if k not in PRIVATE_USER_FIELDS}
+
+
 # ---------------------------------------------------
 # Helper: attach user names to id fields on copies
 # ---------------------------------------------------
@@ -108,12 +138,32 @@ def attach_user_names(records, user_map, fields):
 # ---------------------------------------------------
 # ADD USER
 # ---------------------------------------------------
+def create_user(username, password, age, phone, role_input, quiet=False):
+    """Add a user and return the new record; ValueError on an unknown role.
+
+    password may already be hashed (see auth.hash_password).
+    """
+    role_input = role_input.strip().lower()
+    if role_input not in role_map:
+        raise ValueError(f"Invalid role: {role_input!r}")
+
+    userID = utils.next_id(user_source, "U")
+    new_user = {
+        "userID": userID,
+        "username": username,
+        "password": password if auth.is_hashed(password) else auth.hash_password(password),
+        "age": age,
+        "role": role_map[role_input],  # lowercase stored role
+        "status": "active",
+        "phone": phone
+    }
+
+    utils.add_record(user_source, new_user, quiet)
+    found = utils.find_record(user_source, "and", {"userID": userID})
+    return next((r for r in found if r.get("userID") == userID), new_user)
+
+
 def add_user():
-    userID = utils.read_records(user_source, "userID")
-    if not userID:
-        userID = "U1"
-    else:
-        userID = f"U{len(userID) + 1}"
     username = input("Enter username: ")
     password = input("Enter password: ")
     age = input("Enter age: ")
@@ -123,33 +173,17 @@ def add_user():
           "[A]ccounts Personnel / [AD]ministrator / [U]ser(patients)):")
     role_input = input("Role: ").strip().lower()
 
-    if role_input not in role_map:
+    try:
+        added_user = create_user(username, password, age, phone, role_input)
+    except ValueError:
         print("Invalid role. User not added.")
         input("Press Enter to continue...")
         return
 
-    role = role_map[role_input]  # lowercase stored role
-
-    new_user = {
-        "userID": userID,
-        "username": username,
-        "password": password,
-        "age": age,
-        "role": role,
-        "status": "active",
-        "phone": phone
-    }
-
-    utils.add_record(user_source, new_user)
-
     # Show confirmation and the created record
-    os.system('cls||clear')
+    utils.clear_screen()
     print("User added successfully!\n")
-
-    records = utils.read_records(user_source)
-    if records:
-        added_user = records[-1]
-        utils.pretty_print_box(added_user)
+    utils.pretty_print_box(public_user(added_user))
 
     input("\nPress Enter to continue...")
 
@@ -157,14 +191,32 @@ def add_user():
 # ---------------------------------------------------
 # REMOVE USER
 # ---------------------------------------------------
-def remove_user():
-    keyword = input("Enter username or user ID to remove: ")
-
-    found = utils.find_record(user_source, "or", {
+def find_users(keyword):
+    """Users whose username or user ID matches keyword."""
+    return utils.find_record(user_source, "or", {
         "username": keyword,
         "userID": keyword
     })
 
+
+def delete_user(user_id, expected_version=None, quiet=False):
+    """Delete a user by exact ID; return the deleted record or None.
+
+    Raises utils.ConflictError if expected_version no longer matches.
+    """
+    found = utils.find_record(user_source, "and", {"userID": user_id})
+    user = next((u for u in found if u.get("userID") == user_id), None)
+    if user is None:
+        return None
+    utils.delete_record(user_source, user_id, expected_version=expected_version, quiet=quiet)
+    return user
+
+
+def remove_user():
+    keyword = input("Enter username or user ID to remove: ")
+
+    found = find_users(keyword)
+
     if not found:
         print("User not found.")
         suggest_nearest_users(keyword)
@@ -172,7 +224,7 @@ def remove_user():
         return
 
     print("\nMatching User(s):")
-    utils.pretty_print_records(found)
+    utils.pretty_print_records([public_user(u) for u in found])
 
     confirm = input("Enter EXACT userID to confirm deletion: ")
     deleted_user = next((u for u in found if u.get("userID") == confirm), None)
@@ -182,12 +234,17 @@ def remove_user():
         input("Press Enter to continue...")
         return
 
-    utils.delete_record(user_source, confirm)
+    try:
+        delete_user(confirm, expected_version=utils.record_version(deleted_user))
+    except utils.ConflictError:
+        print("This user was changed in another session. Deletion cancelled.")
+        input("Press Enter to continue...")
+        return
 
-    os.system('cls||clear')
+    utils.clear_screen()
     print("User deleted successfully!\n")
     print("Deleted User Record:")
-    utils.pretty_print_box(deleted_user)
+    utils.pretty_print_box(public_user(deleted_user))
 
     input("\nPress Enter to continue...")
 
@@ -195,11 +252,29 @@ def remove_user():
 # ---------------------------------------------------
 # UPDATE USER
 # ---------------------------------------------------
+def get_user_by_name(username):
+    """Exact (case-sensitive) username lookup through the index."""
+    records = utils.find_record(user_source, "and", {"username": username})
+    return next((r for r in records if r.get("username") == username), None)
+
+
+def change_user(user, updates, quiet=False):
+    """Apply updates to user and return the stored record afterwards.
+
+    Raises utils.ConflictError if user changed since it was read.
+    """
+    if "password" in updates and not auth.is_hashed(updates["password"]):
+        updates = {**updates, "password": auth.hash_password(updates["password"])}
+    utils.update_record(user_source, user["userID"], updates,
+                        expected_version=utils.record_version(user), quiet=quiet)
+    new_records = utils.find_record(user_source, "and", {"userID": user["userID"]})
+    return next((r for r in new_records if r.get("userID") == user["userID"]), user)
+
+
 def update_user():
     username = input("Enter username to update: ")
 
-    records = utils.read_records(user_source)
-    user = next((r for r in records if r.get("username") == username), None)
+    user = get_user_by_name(username)
 
     if not user:
         print("User not found.")
@@ -208,7 +283,7 @@ def update_user():
         return
 
     print("\nCurrent User Data:")
-    utils.pretty_print_box(user)
+    utils.pretty_print_box(public_user(user))
 
     new_pass = input("New password (leave blank to keep): ")
 
@@ -233,17 +308,18 @@ def update_user():
         updates["age"] = new_age
 
     if updates:
-        utils.update_record(user_source, user["userID"], updates)
-
-        os.system('cls||clear')
+        try:
+            updated = change_user(user, updates)
+        except utils.ConflictError:
+            print("This user was changed in another session. Please try again.")
+            input("Press Enter to continue...")
+            return
+
+        utils.clear_screen()
         print("User updated successfully!\n")
 
-        # Reload updated record
-        new_records = utils.read_records(user_source)
-        updated = next((r for r in new_records if r.get("userID") == user["userID"]), user)
-
         print("Updated Record:")
-        utils.pretty_print_box(updated)
+        utils.pretty_print_box(public_user(updated))
         input("\nPress Enter to continue...")
     else:
         print("No changes applied.")
@@ -253,41 +329,68 @@ def update_user():
 # ---------------------------------------------------
 # VIEW PATIENTS REPORT  (role = 'patient')
 # ---------------------------------------------------
+def is_patient(record):
+    return record.get("role") == "patient"
+
+
+def patient_records():
+    """Stream every patient record."""
+    return utils.iter_records(user_source, predicate=is_patient)
+
+
 def view_patients():
-    records = utils.read_records(user_source)
-    patients = [r for r in records if r.get("role") == "patient"]
+    total = aggregates.get(user_source, "total_patients")
 
-    print("\nTotal Patients:", len(patients))
+    print("\nTotal Patients:", total)
 
     show = input("Show details? (yes/no): ").lower()
     if show == "yes":
-        utils.pretty_print_records(patients)
+        # A function, so pages that fell out of the window can be read again
+        utils.page_records(lambda: (public_user(u) for u in patient_records()))
     input("\nPress Enter to continue...")
 
 
 # ---------------------------------------------------
 # VIEW APPOINTMENTS REPORT
 # ---------------------------------------------------
-def view_appointments():
-    today = date.today()
-    records = utils.read_records(appointment_source)
-    user_map = load_user_map()
+def appointment_outlook(today=None):
+    """Pending/cancelled counts for each of the 7 days after today."""
+    today = today or date.today()
+    first_day = (today + timedelta(days=1)).strftime("%Y-%m-%d")
+    last_day = (today + timedelta(days=7)).strftime("%Y-%m-%d")
+    counts = partitions.count_by(appointment_source, ("date", "time"),
+                                 (first_day,), (last_day,), ("date", "status"))
+
+    outlook = []
+    for i in range(1, 8):
+        check_date = (today + timedelta(days=i)).strftime("%Y-%m-%d")
+        outlook.append({
+            "date": check_date,
+            "pending": counts[(check_date, "pending")],
+            "cancelled": counts[(check_date, "cancelled")],
+        })
+    return outlook
 
-    confirmed = [r for r in records if r.get("status") == "confirmed"]
-    print("\nTotal Confirmed Appointments:", len(confirmed))
 
-    print("\nPending & Cancelled (next 7 days):\n")
+def filter_appointments(status, date_from, date_to, time_from, time_to):
+    """Appointments in the status/date/time window, with user names attached."""
+    # Status + date come straight off the sorted index, time is per day;
+    # when partitioned, only the months in the date range are opened
+    in_range = partitions.find_range(appointment_source, ("status", "date", "time"),
+                                     (status, date_from), (status, date_to))
+    filtered = [r for r in in_range if time_from <= r.get("time", "") <= time_to]
+    # Convert patient & doctor id → "Uid - name"
+    return attach_user_names(filtered, load_user_map(), ["patient", "doctor"])
 
-    for i in range(1, 8):
-        check_date = (today + timedelta(days=i)).strftime("%Y-%m-%d")
 
-        pending = [r for r in records
-                   if r.get("status") == "pending" and r.get("date") == check_date]
+def view_appointments():
+    print("\nTotal Confirmed Appointments:",
+          aggregates.get(appointment_source, "confirmed_appointments"))
 
-        cancelled = [r for r in records
-                     if r.get("status") == "cancelled" and r.get("date") == check_date]
+    print("\nPending & Cancelled (next 7 days):\n")
 
-        print(f"{check_date}: Pending={len(pending)}, Cancelled={len(cancelled)}")
+    for day in appointment_outlook():
+        print(f"{day['date']}: Pending={day['pending']}, Cancelled={day['cancelled']}")
 
     show = input("\nShow filtered appointment details? (yes/no): ").lower()
     if show != "yes":
@@ -305,17 +408,10 @@ def view_appointments():
         input("\nPress Enter to continue...")
         return
 
-    filtered = [
-        r for r in records
-        if r.get("status") == status
-        and date_from <= r.get("date", "") <= date_to
-        and time_from <= r.get("time", "") <= time_to
-    ]
+    display = filter_appointments(status, date_from, date_to, time_from, time_to)
 
     print("\nFiltered Results:")
-    if filtered:
-        # Convert patient & doctor id → "Uid - name"
-        display = attach_user_names(filtered, user_map, ["patient", "doctor"])
+    if display:
         utils.pretty_print_records(display, ["aptID", "patient", "date", "time", "doctor", "status"])
     else:
         print("No matching appointments found.")
@@ -326,52 +422,75 @@ def view_appointments():
 # ---------------------------------------------------
 # VIEW INCOME REPORT
 # ---------------------------------------------------
-def view_income():
-    records = utils.read_records(income_source)
-    appointments = utils.read_records(appointment_source)
+def bills_with_status(status):
+    """Stream income records with the given status, bill columns only."""
+    return partitions.iter_records(income_source, ["inID", "patient", "amount", "status"],
+                                   lambda r: r.get("status") == status)
+
+
+def paid_bills():
+    """Paid bills with patient names attached."""
+    return attach_user_names(bills_with_status("paid"), load_user_map(), ["patient"])
+
+
+def unpaid_bills():
+    """Return (unpaid bills, their patients' appointments), names attached."""
+    # Bill -> appointments of the same patient, via the patient indexes
+    pairs = [(bill, apts) for bill, apts in partitions.join_records(
+                 income_source, {"status": "unpaid"}, appointment_source, "patient")
+             if bill.get("status") == "unpaid"]
+
+    related_appointments = []
+    seen = set()
+    for _, apts in pairs:
+        for a in apts:
+            if a.get("aptID") not in seen:
+                seen.add(a.get("aptID"))
+                related_appointments.append(a)
+
     user_map = load_user_map()
+    return (attach_user_names([bill for bill, _ in pairs], user_map, ["patient"]),
+            attach_user_names(related_appointments, user_map, ["patient", "doctor"]))
+
+
+def view_income():
+    # Summary figures are kept up to date by the aggregates module
+    summary = aggregates.get(income_source)
+    total_income = summary["total_income"]
+    paid_count = summary["paid_bills"]
+    unpaid_count = summary["unpaid_bills"]
 
-    if not records:
+    if not summary["total_bills"]:
         print("No income records found.")
         input("\nPress Enter to continue...")
         return
 
-    paid = [r for r in records if r.get("status") == "paid"]
-    unpaid = [r for r in records if r.get("status") == "unpaid"]
-
-    total_income = sum(float(r.get("amount", 0)) for r in paid)
-
     print("\n--- Income Summary ---")
     print("Total Income Collected: RM", total_income)
-    print("Paid Bills:", len(paid))
-    print("Unpaid Bills:", len(unpaid))
+    print("Paid Bills:", paid_count)
+    print("Unpaid Bills:", unpaid_count)
 
     detail = input("\nShow detailed records? (paid/unpaid): ").strip().lower()
+    if detail not in ("paid", "unpaid"):
+        print("Invalid option.")
+        input("\nPress Enter to continue...")
+        return
 
     # ---- PAID ----
     if detail == "paid":
         print("\n--- Paid Bills ---")
-        display_paid = attach_user_names(paid, user_map, ["patient"])
-        utils.pretty_print_records(display_paid, ["inID", "patient", "amount", "status"])
+        utils.pretty_print_records(paid_bills(), ["inID", "patient", "amount", "status"])
         input("\nPress Enter to continue...")
         return
 
     # ---- UNPAID + RELATED APPOINTMENTS ----
     if detail == "unpaid":
         print("\n--- Unpaid Bills ---")
-        display_unpaid = attach_user_names(unpaid, user_map, ["patient"])
+        display_unpaid, display_app = unpaid_bills()
         utils.pretty_print_records(display_unpaid, ["inID", "patient", "amount", "status"])
 
         print("\n--- Related Appointments for Unpaid Bills ---")
-        unpaid_patient_ids = [b.get("patient") for b in unpaid if b.get("patient")]
-
-        related_appointments = [
-            a for a in appointments
-            if a.get("patient") in unpaid_patient_ids
-        ]
-
-        if related_appointments:
-            display_app = attach_user_names(related_appointments, user_map, ["patient", "doctor"])
+        if display_app:
             utils.pretty_print_records(
                 display_app,
                 ["aptID", "patient", "date", "time", "doctor", "status"]
@@ -380,30 +499,24 @@ def view_income():
             print("No appointments found for unpaid bills.")
 
         input("\nPress Enter to continue...")
-        return
-
-    print("Invalid option.")
-    input("\nPress Enter to continue...")
 
 
 # ---------------------------------------------------
 # STAFF SUMMARY (non-patients)
 # ---------------------------------------------------
+def staff_members():
+    """ID, username and role of every staff user."""
+    return list(utils.scan_fields(
+        user_source,
+        ["userID", "username", "role"],
+        {"role": set(aggregates.STAFF_ROLES)}
+    ))
+
+
 def staff_summary():
-    records = utils.read_records(user_source)
-    staff = [
-        r for r in records
-        if r.get("role") in [
-            "administrator",
-            "doctor",
-            "pharmacist",
-            "accounts personnel",
-            "accountant",           # old data compatibility
-            "receptionist"
-        ]
-    ]
-
-    print("\nTotal Staff:", len(staff))
+    staff = staff_members()
+
+    print("\nTotal Staff:", aggregates.get(user_source, "staff_count"))
     utils.pretty_print_records(staff, ["userID", "username", "role"])
     input("Press Enter to continue...")
 
@@ -411,21 +524,27 @@ def staff_summary():
 # ---------------------------------------------------
 # MEDICINE SUMMARY
 # ---------------------------------------------------
-def medicine_summary():
-    records = utils.read_records(medicine_source)
+def medicine_records():
+    return list(utils.scan_fields(medicine_source, ["medID", "name", "stock", "price"]))
+
+
+def low_stock_medicines():
+    """Medicines with stock under aggregates.LOW_STOCK_LIMIT."""
+    stock = columnar.load_table(medicine_source, ["medID", "name", "stock"])
+    return columnar.select_rows(
+        stock, columnar.mask_compare(stock, "stock", "<", aggregates.LOW_STOCK_LIMIT))
 
-    if not records:
+
+def medicine_summary():
+    if not aggregates.get(medicine_source, "total_medicines"):
         print("No medicine records found.")
         input("\nPress Enter to continue...")
         return
 
     print("\n--- Medicine Summary ---")
-    print("Total Medicine Items:", len(records))
-    utils.pretty_print_records(records, ["medID", "name", "stock", "price"])
-    # Convert stock to int for comparison
-    records = [{**m, "stock": int(m.get("stock", 0))} for m in records]
-
-    low_stock = [m for m in records if m.get("stock", 0) < 20]
+    print("Total Medicine Items:", aggregates.get(medicine_source, "total_medicines"))
+    utils.pretty_print_records(medicine_records(), ["medID", "name", "stock", "price"])
+    low_stock = low_stock_medicines()
 
     print("\n--- Low Stock Medicines (stock < 20) ---")
     if low_stock:
@@ -441,7 +560,7 @@ def medicine_summary():
 # ---------------------------------------------------
 def manage_users_menu():
     while True:
-        os.system('cls||clear')
+        utils.clear_screen()
         print("\n--- Manage Clinic Users ---")
         print("1. Add User")
         print("2. Remove User")
@@ -465,7 +584,7 @@ def manage_users_menu():
 
 def view_reports_menu():
     while True:
-        os.system('cls||clear')
+        utils.clear_screen()
         print("\n--- Reports ---")
         print("1. Total Patients")
         print("2. Appointments")
@@ -489,7 +608,7 @@ def view_reports_menu():
 
 def generate_summary_menu():
     while True:
-        os.system('cls||clear')
+        utils.clear_screen()
         print("\n--- Clinic Summary ---")
         print("1. Staff Summary")
         print("2. Medicine Summary")
@@ -513,7 +632,7 @@ def generate_summary_menu():
 # ---------------------------------------------------
 def admin_menu():
     while True:
-        os.system('cls||clear')
+        utils.clear_screen()
         print("\n--- Administrator Menu ---")
         print("1. Manage Users")
         print("2. View Reports")
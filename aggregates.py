@@ -0,0 +1,191 @@
+'''
+Materialized report aggregates
+- The counters and sums behind the admin reports: total patients, staff
+  count, confirmed appointments, paid income, paid/unpaid bills and
+  low-stock medicines
+- Updated from utils change notifications on every add/update/delete
+  and stored in "<table>.agg" next to each data file
+- Only trusted while the stored table stamp matches the data file, so
+  edits made behind utils' back lead to one full recompute
+- A partitioned table (see partitions.py) keeps one .agg per month;
+  get() adds them up
+'''
+
+import json
+import math
+import os
+import threading
+
+import locking
+import partitions
+import utils
+
+STAFF_ROLES = [
+    "administrator",
+    "doctor",
+    "pharmacist",
+    "accounts personnel",
+    "accountant",           # old data compatibility
+    "receptionist"
+]
+
+LOW_STOCK_LIMIT = 20
+
+
+def _number(value, convert):
+    try:
+        return convert(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# Data file name -> {aggregate name: contribution of one record}
+# Every aggregate is a plain sum, so an update is "minus old, plus new".
+AGGREGATES = {
+    "user.txt": {
+        "total_patients": lambda r: r.get("role") == "patient",
+        "staff_count": lambda r: r.get("role") in STAFF_ROLES,
+    },
+    "appointment.txt": {
+        "confirmed_appointments": lambda r: r.get("status") == "confirmed",
+    },
+    "income.txt": {
+        "total_bills": lambda r: 1,
+        "paid_bills": lambda r: r.get("status") == "paid",
+        "unpaid_bills": lambda r: r.get("status") == "unpaid",
+        "total_income": lambda r: _number(r.get("amount"), float) if r.get("status") == "paid" else 0,
+    },
+    "medicine.txt": {
+        "total_medicines": lambda r: 1,
+        "low_stock_medicines": lambda r: _number(r.get("stock"), int) < LOW_STOCK_LIMIT,
+    },
+}
+
+# abs path -> {"stamp": ..., "values": {...}} as last read or written
+_state = {}
+
+
+def _specs(path):
+    return AGGREGATES.get(os.path.basename(path))
+
+
+def _agg_path(path):
+    return os.path.splitext(path)[0] + ".agg"
+
+
+def _normalize(stamp):
+    # Stamps are stored as JSON, so compare them in their JSON shape
+    return json.loads(json.dumps(stamp))
+
+
+def _tidy(values):
+    # Repeated +/- on floats drifts, amounts only need cents anyway
+    return {k: round(v, 6) if isinstance(v, float) else int(v) for k, v in values.items()}
+
+
+def _read_state(path):
+    try:
+        with open(_agg_path(path), "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_state(path, state):
+    _state[path] = state
+    # Own temp name: other threads and processes may store the same state
+    temp = f"{_agg_path(path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, "w") as file:
+        json.dump(state, file, indent=4)
+    os.replace(temp, _agg_path(path))
+
+
+def _state_for(path, stamp):
+    """Stored state valid for stamp, from memory or disk, else None."""
+    stamp = _normalize(stamp)
+    for state in (_state.get(path), _read_state(path)):
+        if state is not None and state.get("stamp") == stamp:
+            _state[path] = state
+            return state
+    return None
+
+
+# ---------------------------------------------------
+# Full recompute
+# ---------------------------------------------------
+def compute(source):
+    """Scan source once and return fresh values for its aggregates."""
+    path = os.path.abspath(source)
+    specs = _specs(path)
+    values = dict.fromkeys(specs, 0)
+    for record in partitions.iter_records(path):
+        for name, contribution in specs.items():
+            values[name] += contribution(record)
+    return _tidy(values)
+
+
+def recompute(source):
+    """Recompute and store the aggregates of source."""
+    path = os.path.abspath(source)
+    with locking.shared_lock(path):
+        stamp = utils.table_stamp(path)
+        values = compute(path)
+    _write_state(path, {"stamp": _normalize(stamp), "values": values})
+    return values
+
+
+# ---------------------------------------------------
+# Reading
+# ---------------------------------------------------
+def get(source, name=None):
+    """Return one aggregate (or all of them as a dict) for source."""
+    values = dict.fromkeys(_specs(os.path.abspath(source)), 0)
+    for path in partitions.partition_sources(source):
+        state = _state_for(path, utils.table_stamp(path))
+        part = state["values"] if state is not None else recompute(path)
+        for key, value in part.items():
+            values[key] += value
+    values = _tidy(values)
+    return values if name is None else values[name]
+
+
+def verify(sources):
+    """Compare stored aggregates with a full recompute.
+
+    Returns {source: {name: (stored, recomputed)}} for every mismatch;
+    an empty dict means everything agrees.
+    """
+    problems = {}
+    for source in sources:
+        stored = get(source)
+        fresh = compute(source)
+        bad = {name: (stored.get(name), value) for name, value in fresh.items()
+               if not math.isclose(stored.get(name, 0), value, abs_tol=1e-6)}
+        if bad:
+            problems[source] = bad
+    return problems
+
+
+# ---------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------
+def on_change(path, old_stamp, new_stamp, changes):
+    specs = _specs(path)
+    if specs is None:
+        return
+
+    state = _state_for(path, old_stamp)
+    if state is None:
+        return  # Nothing current to build on, the next get() recomputes
+
+    values = dict(state["values"])
+    for old, new in changes:
+        for name, contribution in specs.items():
+            if old is not None:
+                values[name] -= contribution(old)
+            if new is not None:
+                values[name] += contribution(new)
+    _write_state(path, {"stamp": _normalize(new_stamp), "values": _tidy(values)})
+
+
+utils.add_listener(on_change)
@@ -0,0 +1,198 @@
+'''
+Password hashing and login
+- Passwords are stored as salted PBKDF2-SHA256 hashes:
+  "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>"
+- HASH_ITERATIONS sets the cost of new hashes; stored hashes keep the
+  cost they were made with and are upgraded on the next good login
+- Plaintext passwords from older user.txt files still log in once and
+  are replaced by a hash right away; "python auth.py migrate" hashes
+  them all in one batch
+- Hashing many passwords at once (migrate, bulk import) goes through
+  hash_many, which spreads the PBKDF2 work over a process pool
+- Logins look the user up through the utils username index and keep a
+  small cache of recent successful verifications, so a repeat login
+  costs neither a table scan nor another round of PBKDF2
+
+Usage: python auth.py migrate [path/to/user.txt]
+'''
+
+import argparse
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import utils
+
+ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = 200_000
+SALT_BYTES = 16
+# Fewer passwords than this are hashed in-process; starting the pool
+# would cost more than it saves
+POOL_MIN_PASSWORDS = 8
+
+# (stored hash, keyed digest of the password) of recent good logins
+VERIFY_CACHE_SIZE = 1024
+_verified = OrderedDict()
+# Cache keys never hold the password itself, only an HMAC of it under a
+# key that lives as long as the process
+_cache_key = secrets.token_bytes(32)
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + "$")
+
+
+def hash_password(password, iterations=None):
+    """Return a new salted hash string for password."""
+    iterations = iterations or HASH_ITERATIONS
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def hash_many(passwords, workers=None):
+    """hash_password for each password, in order, on one worker per CPU."""
+    passwords = list(passwords)
+    if len(passwords) < POOL_MIN_PASSWORDS:
+        return [hash_password(p) for p in passwords]
+    # Spawned workers start clean (no inherited data connections) and
+    # get the cost explicitly, as they do not share this module's globals
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        return list(pool.map(hash_password, passwords, repeat(HASH_ITERATIONS), chunksize=64))
+
+
+def _cost(stored):
+    try:
+        return int(stored.split("$")[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(stored):
+    """True for plaintext and for hashes made with a lower cost than now."""
+    return not is_hashed(stored) or _cost(stored) < HASH_ITERATIONS
+
+
+def verify_password(password, stored):
+    """Check password against a stored hash (or a legacy plaintext value)."""
+    if stored is None:
+        return False
+    stored = str(stored)
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+
+    key = (stored, hmac.new(_cache_key, password.encode(), "sha256").digest())
+    if key in _verified:
+        _verified.move_to_end(key)
+        return True
+
+    try:
+        _, iterations, salt, expected = stored.split("$")
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(),
+                                     bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    if not hmac.compare_digest(digest.hex(), expected):
+        return False
+
+    _verified[key] = True
+    if len(_verified) > VERIFY_CACHE_SIZE:
+        _verified.popitem(last=False)
+    return True
+
+
+def clear_verify_cache():
+    _verified.clear()
+
+
+def _unique_id(source, user):
+    # Updates go by ID, so a user sharing its ID would get the new hash too
+    same = utils.find_record(source, "and", {"userID": user.get("userID")})
+    return len(same) == 1
+
+
+def find_user(source, username):
+    """The user record with exactly this username, or None."""
+    # Index lookup is case-insensitive, the credentials check is not
+    candidates = utils.find_record(source, "and", {"username": username})
+    return next((u for u in candidates if u.get("username") == username), None)
+
+
+def upgrade_password(source, user, new_hash):
+    """Store new_hash for user if its password is plaintext or under-cost.
+
+    new_hash is made by the caller, so callers that must not block (the
+    server) can run the PBKDF2 somewhere else.
+    """
+    if not needs_rehash(user.get("password")) or not _unique_id(source, user):
+        return
+    try:
+        utils.update_record(source, user["userID"], {"password": new_hash},
+                            expected_version=utils.record_version(user), quiet=True)
+    except utils.ConflictError:
+        pass  # Changed meanwhile; the next login tries again
+
+
+def authenticate(source, username, password):
+    """Return the user record for a correct username/password, else None.
+
+    Plaintext or under-cost passwords are rehashed after a good login.
+    """
+    user = find_user(source, username)
+    if user is None or not verify_password(password, user.get("password")):
+        return None
+    if needs_rehash(user.get("password")):
+        upgrade_password(source, user, hash_password(password))
+    return user
+
+
+def migrate_passwords(source):
+    """Hash every plaintext password in source. Returns how many changed.
+
+    Users sharing a userID cannot be updated one by one and are left
+    as they are (they still log in with the plaintext password).
+    """
+    users = [u for u in utils.iter_records(source) if "userID" in u]
+    seen = {}
+    for u in users:
+        seen[u["userID"]] = seen.get(u["userID"], 0) + 1
+
+    todo = []
+    for u in users:
+        if u.get("password") is None or is_hashed(u["password"]):
+            continue
+        if seen[u["userID"]] > 1:
+            print(f"Skipping {u.get('username')}: userID {u['userID']} is not unique")
+            continue
+        todo.append(u)
+    if not todo:
+        return 0
+    hashes = hash_many(str(u["password"]) for u in todo)
+    return utils.update_records(source, [(u["userID"], {"password": hashed})
+                                         for u, hashed in zip(todo, hashes)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="hash plaintext passwords in place")
+    migrate.add_argument("path", nargs="?", help="user file (default data/user.txt)")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "data", "user.txt")
+    start = time.perf_counter()
+    count = migrate_passwords(path)
+    print(f"Hashed {count} password(s) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
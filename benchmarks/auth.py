@@ -0,0 +1,87 @@
+'''
+Cost of a login
+- For N users, times the old login (scan every record, compare
+  plaintext) against auth.authenticate (username index + hash check),
+  with the verification cache cold and warm
+- Prints how long one hash takes at a few costs, to help pick
+  auth.HASH_ITERATIONS
+
+Usage: python benchmarks/auth.py [--sizes 1000 10000 100000] [--logins 20]
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+import utils
+
+
+def write_users(path, n, stored):
+    users = [{"userID": f"U{i}", "username": f"user{i}", "password": stored(i),
+              "role": "patient"} for i in range(n)]
+    with open(path, "w") as file:
+        json.dump(users, file)
+    utils.clear_cache()
+
+
+def old_login(source, username, password):
+    # What main.login used to do
+    records = utils.read_records(source)
+    return next((u for u in records
+                 if u.get("username") == username and u.get("password") == password), None)
+
+
+def per_login(func, names):
+    start = time.perf_counter()
+    for name in names:
+        assert func(name) is not None
+    return (time.perf_counter() - start) / len(names) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--logins", type=int, default=20)
+    args = parser.parse_args()
+
+    print("Hash cost:")
+    for iterations in (50_000, 100_000, 200_000, 600_000):
+        start = time.perf_counter()
+        auth.hash_password("secret", iterations)
+        print(f"  {iterations:>7} iterations: {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+    # Every user gets the same hash so building big tables stays quick
+    shared_hash = auth.hash_password("secret")
+    print(f"\nms per login (HASH_ITERATIONS={auth.HASH_ITERATIONS}):")
+    print(f"{'users':>8} {'old scan':>10} {'cold hash':>10} {'cached':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "user.txt")
+        for n in args.sizes:
+            names = [f"user{random.randrange(n)}" for _ in range(args.logins)]
+
+            write_users(source, n, lambda i: f"pw{i}")
+            utils.read_records(source)  # Both versions start from a warm cache
+            old = per_login(lambda name: old_login(source, name, "pw" + name[4:]), names)
+
+            write_users(source, n, lambda i: shared_hash)
+            utils.read_records(source)
+            auth.clear_verify_cache()
+            cold = 0
+            for name in names:
+                auth.clear_verify_cache()
+                cold += per_login(lambda name: auth.authenticate(source, name, "secret"), [name])
+            cold /= len(names)
+            warm = per_login(lambda name: auth.authenticate(source, name, "secret"), names)
+            print(f"{n:>8} {old:>10.3f} {cold:>10.1f} {warm:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
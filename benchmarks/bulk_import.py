@@ -0,0 +1,94 @@
+'''
+Throughput of bulk user import
+- Writes a synthetic roster of N users as CSV
+- Imports it once with one utils.add_record call per row (the old way,
+  only for the smaller sizes) and once through bulk_import.import_file
+- Passwords are hashed at the real auth.HASH_ITERATIONS cost, which is
+  most of the time of a user import: the per-row way hashes in-process,
+  import_file on a process pool, so its rows/s grows with the CPU count
+- Prints rows/s for each
+
+Usage: python benchmarks/bulk_import.py [--sizes 100 1000 5000]
+'''
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+import bulk_import
+import utils
+
+PER_ROW_LIMIT = 1000  # Per-row import is O(N^2) and hashes serially, skip it above this
+
+
+def write_roster(path, n):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["username", "password", "age", "role", "phone"])
+        for i in range(n):
+            writer.writerow([f"user{i}", f"pw{i}", 20 + i % 60,
+                             "patient" if i % 10 else "doctor", f"012-{i:07d}"])
+
+
+def fresh_source(folder):
+    source = os.path.join(folder, "user.txt")
+    with open(source, "w") as file:
+        json.dump([], file)
+    utils.clear_cache()
+    return source
+
+
+def time_per_row(folder, roster):
+    source = fresh_source(folder)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i, row in enumerate(bulk_import.read_rows(roster), 1):
+            row = bulk_import.clean_row("users", row)
+            bulk_import.hash_passwords([row])
+            utils.add_record(source, {"userID": f"U{i}", **row})
+    return time.perf_counter() - start
+
+
+def time_batch(folder, roster):
+    bulk_import.TABLES["users"]["source"] = fresh_source(folder)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        added, _, _ = bulk_import.import_file("users", roster)
+    return time.perf_counter() - start, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    auth.hash_password("x")
+    print(f"{os.cpu_count()} CPU(s), {(time.perf_counter() - start) * 1000:.0f} ms per hash "
+          f"(HASH_ITERATIONS={auth.HASH_ITERATIONS})\n")
+    print(f"{'rows':>8} | {'per-row add_record':>20} | {'bulk import':>20}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            roster = os.path.join(folder, "roster.csv")
+            write_roster(roster, n)
+
+            per_row = "skipped"
+            if n <= PER_ROW_LIMIT:
+                per_row = f"{n / time_per_row(folder, roster):,.0f} rows/s"
+
+            elapsed, added = time_batch(folder, roster)
+            assert added == n, (added, n)
+            print(f"{n:>8} | {per_row:>20} | {n / elapsed:>13,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+'''
+Network reports: one process per clinic vs one clinic after another
+- Generates CLINICS clinics of USERS users each with datagen.py and a
+  clinics.json for them
+- Times clinics.network_summary, network_staff and network_bills
+  ("unpaid") with --workers 1 (serial, in this process) and with one
+  worker per core, from cold caches: the record caches are emptied and
+  the stored aggregates removed before every run
+- Speed-up is bounded by the core count (os.cpu_count())
+
+Usage: python benchmarks/clinics.py [--clinics 8] [--users 20000] [--workers N]
+'''
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aggregates
+import clinics
+import columnar
+import utils
+from datagen import generate
+
+REPORTS = {
+    "network_summary": lambda registry, workers: clinics.network_summary(registry, workers),
+    "network_staff": lambda registry, workers: clinics.network_staff(registry, workers),
+    "network_bills unpaid": lambda registry, workers: clinics.network_bills("unpaid", registry,
+                                                                            workers),
+}
+
+
+def cold(folder):
+    utils.clear_cache()
+    columnar._tables.clear()
+    aggregates._state.clear()
+    for path in glob.glob(os.path.join(folder, "*", "*.agg")):
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clinics", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--workers", type=int, help="pool size (default: one per core)")
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as folder:
+        names = {f"clinic{i}": f"clinic{i}" for i in range(args.clinics)}
+        for i, name in enumerate(names):
+            generate(os.path.join(folder, name), args.users, seed=i)
+        with open(os.path.join(folder, "clinics.json"), "w") as file:
+            json.dump(names, file)
+        registry = clinics.load_clinics(os.path.join(folder, "clinics.json"))
+
+        workers = args.workers or min(cores, args.clinics)
+        print(f"{args.clinics} clinics x {args.users} users, {cores} core(s)")
+        print(f"{'report':<22} {'serial s':>10} {f'{workers} workers s':>12} {'speed-up':>9}")
+        for name, report in REPORTS.items():
+            times = []
+            for count in (1, workers):
+                cold(folder)
+                start = time.perf_counter()
+                report(registry, count)
+                times.append(time.perf_counter() - start)
+            print(f"{name:<22} {times[0]:>10.2f} {times[1]:>12.2f} {times[0] / times[1]:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
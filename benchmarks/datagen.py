@@ -0,0 +1,179 @@
+'''
+Synthetic clinic data at any scale
+- Users: mostly patients, about one doctor per 50 patients plus a few
+  receptionists, pharmacists, accounts personnel and administrators;
+  unique usernames, ages spread like a clinic population
+- Appointments: every patient and doctor ID exists; a fifth of the
+  patients make half of the visits; no doctor is booked twice for one
+  slot; past visits are mostly confirmed, future ones mostly pending
+- Income: one bill per past confirmed appointment, for that patient and
+  dated like it, with log-normal amounts; about a quarter unpaid
+- Medicines: name x strength catalogue, about one in ten below the low
+  stock limit
+- Same seed, same data. Files are written through utils, so they land
+  in whichever storage backend is configured.
+
+Usage: python benchmarks/datagen.py OUT_DIR [--users 10000] [--seed 1]
+'''
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+FIRST_NAMES = ["ali", "siti", "john", "mary", "ahmad", "lee", "chen", "wei", "nur",
+               "aisyah", "kumar", "raj", "tan", "lim", "wong", "muthu", "fatimah",
+               "hafiz", "daniel", "sarah", "farah", "arun", "mei", "ling", "omar"]
+LAST_NAMES = ["abdullah", "tan", "lim", "lee", "ng", "wong", "rahman", "singh",
+              "kaur", "ismail", "chong", "yusof", "das", "ho", "teo", "hassan"]
+STAFF_MIX = [("receptionist", 0.004), ("pharmacist", 0.003),
+             ("accounts personnel", 0.002), ("administrator", 0.001)]
+MEDICINES = ["Paracetamol", "Amoxicillin", "Ibuprofen", "Cetirizine", "Omeprazole",
+             "Metformin", "Amlodipine", "Salbutamol", "Loratadine", "Vitamin C",
+             "Cough Syrup", "Antacid", "Azithromycin", "Prednisolone", "Simvastatin"]
+STRENGTHS = ["50mg", "100mg", "250mg", "500mg", "5ml", "10ml", "1g"]
+SLOTS = [f"{h:02d}:{m:02d}" for h in range(8, 17) for m in (0, 30)]
+
+
+def make_users(rnd, n):
+    doctors = max(1, n // 50)
+    roles = ["doctor"] * doctors
+    for role, share in STAFF_MIX:
+        roles += [role] * max(1, int(n * share))
+    roles += ["patient"] * max(0, n - len(roles))
+    rnd.shuffle(roles)
+
+    users = []
+    for i, role in enumerate(roles[:n], 1):
+        name = f"{rnd.choice(FIRST_NAMES)}_{rnd.choice(LAST_NAMES)}{i}"
+        if role == "patient":
+            age = min(95, max(1, int(rnd.gauss(40, 18))))
+        else:
+            age = rnd.randint(24, 64)
+        users.append({
+            "userID": f"U{i}",
+            "username": name,
+            "password": f"pw{i}",
+            "age": str(age),
+            "role": role,
+            "status": "active" if rnd.random() < 0.97 else "inactive",
+            "phone": f"01{rnd.randint(0, 9)}-{rnd.randint(1000000, 9999999)}",
+        })
+    return users
+
+
+def make_appointments(rnd, users, n, today, days_back=180, days_ahead=30):
+    patients = [u["userID"] for u in users if u["role"] == "patient"]
+    doctors = [u["userID"] for u in users if u["role"] == "doctor"]
+    if not patients or not doctors:
+        return []
+    frequent = patients[:max(1, len(patients) // 5)]
+    days = days_back + days_ahead + 1
+    n = min(n, len(doctors) * days * len(SLOTS))
+
+    taken = set()
+    appointments = []
+    while len(appointments) < n:
+        doctor = rnd.choice(doctors)
+        offset = rnd.randint(-days_back, days_ahead)
+        slot = (doctor, offset, rnd.choice(SLOTS))
+        if slot in taken:
+            continue
+        taken.add(slot)
+
+        roll = rnd.random()
+        if offset < 0:
+            status = "confirmed" if roll < 0.8 else "cancelled"
+        else:
+            status = "pending" if roll < 0.6 else "confirmed" if roll < 0.9 else "cancelled"
+        patient = rnd.choice(frequent if rnd.random() < 0.5 else patients)
+        appointments.append({
+            "aptID": f"A{len(appointments) + 1}",
+            "patient": patient,
+            "doctor": doctor,
+            "date": (today + timedelta(days=offset)).strftime("%Y-%m-%d"),
+            "time": slot[2],
+            "status": status,
+        })
+    return appointments
+
+
+def make_income(rnd, appointments, today):
+    today = today.strftime("%Y-%m-%d")
+    bills = []
+    for a in appointments:
+        if a["status"] != "confirmed" or a["date"] >= today:
+            continue
+        bills.append({
+            "inID": f"B{len(bills) + 1}",
+            "patient": a["patient"],
+            "amount": round(min(2000.0, rnd.lognormvariate(4.3, 0.5)), 2),
+            "status": "paid" if rnd.random() < 0.75 else "unpaid",
+            "date": a["date"],
+        })
+    return bills
+
+
+def make_medicines(rnd, n):
+    medicines = []
+    for i in range(1, n + 1):
+        name = f"{MEDICINES[(i - 1) % len(MEDICINES)]} {STRENGTHS[(i - 1) // len(MEDICINES) % len(STRENGTHS)]}"
+        if i > len(MEDICINES) * len(STRENGTHS):
+            name += f" ({i})"
+        stock = rnd.randint(0, 19) if rnd.random() < 0.1 else rnd.randint(20, 500)
+        medicines.append({
+            "medID": f"M{i}",
+            "name": name,
+            "stock": stock,
+            "price": round(rnd.lognormvariate(2.0, 0.6), 2),
+        })
+    return medicines
+
+
+def generate(folder, users=10000, appointments=None, medicines=None, seed=1, today=None):
+    """Write user/appointment/income/medicine tables into folder.
+
+    appointments defaults to three per user and medicines to one per
+    20 users (at least 50). Returns {file name: row count}.
+    """
+    rnd = random.Random(seed)
+    today = today or date.today()
+    appointments = users * 3 if appointments is None else appointments
+    medicines = max(50, users // 20) if medicines is None else medicines
+
+    os.makedirs(folder, exist_ok=True)
+    user_rows = make_users(rnd, users)
+    appointment_rows = make_appointments(rnd, user_rows, appointments, today)
+    tables = {
+        "user.txt": user_rows,
+        "appointment.txt": appointment_rows,
+        "income.txt": make_income(rnd, appointment_rows, today),
+        "medicine.txt": make_medicines(rnd, medicines),
+    }
+    for name, rows in tables.items():
+        utils.replace_records(os.path.join(folder, name), rows)
+    return {name: len(rows) for name, rows in tables.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--appointments", type=int, help="default 3 per user")
+    parser.add_argument("--medicines", type=int, help="default 1 per 20 users")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    counts = generate(args.folder, args.users, args.appointments, args.medicines, args.seed)
+    for name, count in counts.items():
+        print(f"{name}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
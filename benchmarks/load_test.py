@@ -0,0 +1,181 @@
+'''
+Load test for the HTTP service (server.py)
+- Starts a local server on a synthetic data set (or targets a running
+  one with --port and --username/--password)
+- N keep-alive connections send report and user lookups for a fixed
+  time, with an occasional user update to exercise the write lock
+- Prints requests/s and p50/p99 latency, overall and per endpoint
+
+Usage: python benchmarks/load_test.py [--users 10000] [--connections 32] [--seconds 10]
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (method, path, weight); {user} is replaced with a random user ID
+MIX = [
+    ("GET", "/reports/staff", 3),
+    ("GET", "/reports/patients", 3),
+    ("GET", "/reports/income", 3),
+    ("GET", "/reports/appointments?status=pending&from=2025-01-01&to=2025-01-07", 2),
+    ("GET", "/reports/medicine", 2),
+    ("GET", "/users?q={user}", 5),
+    ("PATCH", "/users/{user}", 1),
+]
+
+
+def write_data(folder, n):
+    rnd = random.Random(1)
+    users = [{"userID": "U0", "username": "admin", "password": "admin",
+              "age": "40", "role": "administrator", "status": "active", "phone": ""}]
+    for i in range(1, n):
+        users.append({"userID": f"U{i}", "username": f"user{i}", "password": f"pw{i}",
+                      "age": str(20 + i % 60), "role": "patient" if i % 10 else "doctor",
+                      "status": "active", "phone": f"012-{i:07d}"})
+    appointments = [{"aptID": f"A{i}", "patient": f"U{rnd.randrange(1, n)}",
+                     "doctor": f"U{rnd.randrange(1, n // 10 + 1) * 10 % n}",
+                     "date": f"2025-01-{rnd.randint(1, 28):02d}",
+                     "time": f"{rnd.randint(8, 17):02d}:00",
+                     "status": rnd.choice(["pending", "confirmed", "cancelled"])}
+                    for i in range(n)]
+    income = [{"inID": f"B{i}", "patient": f"U{rnd.randrange(1, n)}",
+               "amount": float(rnd.randint(20, 300)), "status": rnd.choice(["paid", "unpaid"])}
+              for i in range(n // 2)]
+    medicines = [{"medID": f"M{i}", "name": f"Medicine {i}", "stock": rnd.randint(0, 300),
+                  "price": float(rnd.randint(1, 50))} for i in range(200)]
+    for name, rows in (("user.txt", users), ("appointment.txt", appointments),
+                       ("income.txt", income), ("medicine.txt", medicines)):
+        with open(os.path.join(folder, name), "w") as file:
+            json.dump(rows, file)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def request(reader, writer, method, path, token=None, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write(head.encode() + b"\r\n" + payload)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def client(port, token, users, deadline, latencies, errors):
+    rnd = random.Random()
+    paths = [(m, p) for m, p, w in MIX for _ in range(w)]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            method, path = rnd.choice(paths)
+            name = path.split("?")[0]
+            path = path.format(user=f"U{rnd.randrange(1, users)}")
+            body = {"age": str(rnd.randint(20, 80))} if method == "PATCH" else None
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, method, path, token, body)
+            latencies.setdefault(f"{method} {name}", []).append(time.perf_counter() - start)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def run(port, username, password, users, connections, seconds):
+    reader, writer = await wait_for_server(port)
+    status, login = await request(reader, writer, "POST", "/login",
+                                  body={"username": username, "password": password})
+    writer.close()
+    if status != 200:
+        sys.exit(f"Login failed: {login}")
+
+    latencies, errors = {}, {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, login["token"], users, start + seconds,
+                                  latencies, errors) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    everything = [t for values in latencies.values() for t in values]
+    print(f"{len(everything)} requests in {elapsed:.1f}s over {connections} connections")
+    print(f"{'endpoint':<28} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in sorted(latencies.items()):
+        print(f"{name:<28} {len(values):>7} {percentile(values, 0.5):>8.2f} "
+              f"{percentile(values, 0.99):>8.2f}")
+    print(f"{'total':<28} {len(everything):>7} {percentile(everything, 0.5):>8.2f} "
+          f"{percentile(everything, 0.99):>8.2f}")
+    print(f"Throughput: {len(everything) / elapsed:.0f} requests/s")
+    if errors:
+        print("Errors by status:", errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="synthetic data size")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, help="test a server already running here")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    args = parser.parse_args()
+
+    if args.port:
+        asyncio.run(run(args.port, args.username, args.password, args.users,
+                        args.connections, args.seconds))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_data(folder, args.users)
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"),
+                                   "--port", str(port), "--data-dir", folder],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(run(port, args.username, args.password, args.users,
+                            args.connections, args.seconds))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+'''
+Single-file tables vs monthly partitions
+- Generates a clinic with datagen.py, runs the date-bound reports on it,
+  splits appointment.txt and income.txt with partitions.split and runs
+  them again
+- Cold: the record cache is emptied before every run, so the time
+  includes reading the files, which is what partitioning saves
+- Warm: the tables are already in the cache
+- Journal mode is on, as in server.py
+
+Usage: python benchmarks/partitions.py [--users 100000] [--repeat 5]
+'''
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import partitions
+import utils
+from datagen import generate
+
+
+def cases(today):
+    week = ((today + timedelta(days=1)).strftime("%Y-%m-%d"),
+            (today + timedelta(days=7)).strftime("%Y-%m-%d"))
+    return {
+        "appointment outlook": lambda: admin.appointment_outlook(today),
+        "filter, pending next week": lambda: admin.filter_appointments(
+            "pending", *week, "00:00", "23:59"),
+        "appointments next week": lambda: list(partitions.iter_records(
+            admin.appointment_source, date_from=week[0], date_to=week[1])),
+    }
+
+
+def measure(func, repeat, cold):
+    times = []
+    for _ in range(repeat):
+        if cold:
+            utils.clear_cache()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def run(repeat, today):
+    result = {}
+    for name, func in cases(today).items():
+        func()  # Loads the user map and sorted indexes once
+        result[name] = (measure(func, repeat, True), measure(func, repeat, False))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    utils.JOURNAL_MODE = True
+    today = date.today()
+
+    with tempfile.TemporaryDirectory() as folder:
+        counts = generate(folder, args.users, today=today)
+        admin.set_data_dir(folder)
+        single = run(args.repeat, today)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            months = partitions.split(admin.appointment_source)
+            partitions.split(admin.income_source)
+        split = run(args.repeat, today)
+
+    print(f"{counts['appointment.txt']} appointments in {len(months)} months (median ms)")
+    print(f"{'report':<28} {'cold single':>12} {'cold split':>11} "
+          f"{'warm single':>12} {'warm split':>11}")
+    for name in single:
+        print(f"{name:<28} {single[name][0]:>12.2f} {split[name][0]:>11.2f} "
+              f"{single[name][1]:>12.2f} {split[name][1]:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+'''
+Benchmark suite for the data layer and the admin reports
+- For each scale, generates a clinic with datagen.py (same seed, same
+  data) in a temporary folder and points admin at it
+- Times every case REPEAT times and keeps the median and the best;
+  one more run under tracemalloc gives the peak memory (kept apart, as
+  tracing slows the code down)
+- "cold" cases clear the record cache first, like a fresh process;
+  "warm" cases run once beforehand so caches and indexes are built
+- Mutations write to the generated tables, each repeat on a different
+  record
+- --output saves the results as JSON; --compare OLD NEW lists the
+  cases whose time or peak memory grew by more than --threshold and
+  exits with status 1 if there are any
+
+Usage: python benchmarks/run.py [--users 1000 10000] [--repeat 5] [--output results.json]
+       python benchmarks/run.py --compare old.json new.json [--threshold 1.25]
+'''
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import utils
+from datagen import generate
+
+NOISE_MS = 1.0  # Time changes smaller than this never count as a regression
+
+
+# ------------------------------
+# Cases
+# ------------------------------
+# (name, mode, setup) where setup(ctx) returns the function to time.
+# ctx has the table paths, some existing IDs/names and today's date.
+def _each(values):
+    # A different value on every call, so repeats do not hit one record
+    return itertools.cycle(values).__next__
+
+
+def _case_find_by_id(ctx):
+    ids = _each(ctx["user_ids"])
+    return lambda: utils.find_record(ctx["users"], "and", {"userID": ids()})
+
+
+def _case_find_by_name(ctx):
+    names = _each(ctx["usernames"])
+    return lambda: utils.find_record(ctx["users"], "or", {"username": names()})
+
+
+def _case_add(ctx):
+    numbers = itertools.count(1)
+    return lambda: utils.add_record(ctx["users"], {
+        "userID": f"UB{next(numbers)}", "username": "bench", "password": "x",
+        "age": "30", "role": "patient", "status": "active", "phone": "012-0000000"})
+
+
+def _case_update(ctx):
+    ids = _each(ctx["user_ids"])
+    return lambda: utils.update_record(ctx["users"], ids(), {"phone": "019-9999999"})
+
+
+def _case_delete(ctx):
+    ids = iter(ctx["doomed_ids"])
+    return lambda: utils.delete_record(ctx["appointments"], next(ids))
+
+
+def _case_add_many(ctx):
+    batches = itertools.count(1)
+
+    def run():
+        batch = next(batches)
+        utils.add_records(ctx["medicines"], [
+            {"medID": f"MB{batch}_{i}", "name": "Bench", "stock": 100, "price": 1.0}
+            for i in range(100)])
+    return run
+
+
+def _case_update_many(ctx):
+    ids = _each(ctx["user_ids"])
+    return lambda: utils.update_records(
+        ctx["users"], [(ids(), {"status": "active"}) for _ in range(100)])
+
+
+def _case_filter(ctx):
+    first = (ctx["today"] - timedelta(days=30)).strftime("%Y-%m-%d")
+    last = ctx["today"].strftime("%Y-%m-%d")
+    return lambda: admin.filter_appointments("confirmed", first, last, "09:00", "12:00")
+
+
+CASES = [
+    ("read_records", "cold", lambda ctx: lambda: utils.read_records(ctx["appointments"])),
+    ("read_records", "warm", lambda ctx: lambda: utils.read_records(ctx["appointments"])),
+    ("iter_records", "cold", lambda ctx: lambda: utils.iter_records(ctx["appointments"])),
+    ("scan_fields", "cold",
+     lambda ctx: lambda: utils.scan_fields(ctx["users"], ["userID", "role"])),
+    ("find_record id", "cold", _case_find_by_id),
+    ("find_record id", "warm", _case_find_by_id),
+    ("find_record username", "warm", _case_find_by_name),
+    ("find_range", "warm", lambda ctx: lambda: utils.find_range(
+        ctx["appointments"], ("date", "time"), (ctx["first_day"],), (ctx["last_day"],))),
+    ("add_record", "warm", _case_add),
+    ("update_record", "warm", _case_update),
+    ("delete_record", "warm", _case_delete),
+    ("add_records x100", "warm", _case_add_many),
+    ("update_records x100", "warm", _case_update_many),
+    ("report patient_records", "cold", lambda ctx: admin.patient_records),
+    ("report appointment_outlook", "warm",
+     lambda ctx: lambda: admin.appointment_outlook(ctx["today"])),
+    ("report filter_appointments", "warm", _case_filter),
+    ("report paid_bills", "cold", lambda ctx: admin.paid_bills),
+    ("report unpaid_bills", "cold", lambda ctx: admin.unpaid_bills),
+    ("report staff_members", "warm", lambda ctx: admin.staff_members),
+    ("report medicine_records", "cold", lambda ctx: admin.medicine_records),
+    ("report low_stock_medicines", "warm", lambda ctx: admin.low_stock_medicines),
+]
+
+
+# ------------------------------
+# Measuring
+# ------------------------------
+def _call(func):
+    result = func()
+    if hasattr(result, "__next__"):
+        deque(result, maxlen=0)  # Generators only do their work when consumed
+
+
+def measure(func, mode, repeat):
+    """Return {"median_ms", "best_ms", "peak_kib"} for one case."""
+    cold = mode == "cold"
+    if not cold:
+        _call(func)
+
+    times = []
+    for _ in range(repeat):
+        if cold:
+            utils.clear_cache()
+        start = time.perf_counter()
+        _call(func)
+        times.append((time.perf_counter() - start) * 1000)
+
+    if cold:
+        utils.clear_cache()
+    tracemalloc.start()
+    try:
+        _call(func)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": round(statistics.median(times), 3),
+            "best_ms": round(min(times), 3),
+            "peak_kib": round(peak / 1024, 1)}
+
+
+def _context(folder, today):
+    users = os.path.join(folder, "user.txt")
+    appointments = os.path.join(folder, "appointment.txt")
+    user_rows = utils.read_records(users)
+    appointment_rows = utils.read_records(appointments)
+    step = max(1, len(user_rows) // 50)
+    return {
+        "users": users,
+        "appointments": appointments,
+        "medicines": os.path.join(folder, "medicine.txt"),
+        "user_ids": [u["userID"] for u in user_rows[::step]],
+        "usernames": [u["username"] for u in user_rows[step // 2::step]],
+        "doomed_ids": [a["aptID"] for a in appointment_rows[::-1]],
+        "today": today,
+        "first_day": (today + timedelta(days=1)).strftime("%Y-%m-%d"),
+        "last_day": (today + timedelta(days=7)).strftime("%Y-%m-%d"),
+    }
+
+
+def run_scale(users, repeat, seed, only=None):
+    """Generate a clinic of this many users and measure every case on it."""
+    today = date.today()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        counts = generate(folder, users, seed=seed, today=today)
+        utils.clear_cache()
+        admin.set_data_dir(folder)
+        ctx = _context(folder, today)
+        for name, mode, setup in CASES:
+            if only and not any(word in name for word in only):
+                continue
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                numbers = measure(setup(ctx), mode, repeat)
+            results.append({"users": users, "case": name, "mode": mode, **numbers})
+            print(f"{users:>8} {name:<28} {mode:<5} {numbers['median_ms']:>10.2f} "
+                  f"{numbers['best_ms']:>10.2f} {numbers['peak_kib']:>10.1f}")
+        utils.clear_cache()
+    return counts, results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        return ""
+
+
+# ------------------------------
+# Comparing two runs
+# ------------------------------
+def _key(result):
+    return (result["users"], result["case"], result["mode"])
+
+
+def compare(old, new, threshold):
+    """Return the regressions of new against old, printing a table of both."""
+    before = {_key(r): r for r in old["results"]}
+    regressions = []
+    print(f"{'users':>8} {'case':<28} {'mode':<5} {'old ms':>10} {'new ms':>10} "
+          f"{'ratio':>7} {'mem ratio':>10}")
+    for r in new["results"]:
+        o = before.get(_key(r))
+        if o is None:
+            continue
+        ratio = r["median_ms"] / o["median_ms"] if o["median_ms"] else 1.0
+        mem_ratio = r["peak_kib"] / o["peak_kib"] if o["peak_kib"] else 1.0
+        slower = ratio > threshold and r["median_ms"] - o["median_ms"] > NOISE_MS
+        bigger = mem_ratio > threshold
+        flag = "  <-- regression" if slower or bigger else ""
+        print(f"{r['users']:>8} {r['case']:<28} {r['mode']:<5} {o['median_ms']:>10.2f} "
+              f"{r['median_ms']:>10.2f} {ratio:>7.2f} {mem_ratio:>10.2f}{flag}")
+        if flag:
+            regressions.append(_key(r))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="+", help="run cases whose name contains one of these")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="ratio above which a case counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path) as file:
+                runs.append(json.load(file))
+        regressions = compare(runs[0], runs[1], args.threshold)
+        print(f"\n{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
+
+    print(f"{'users':>8} {'case':<28} {'mode':<5} {'median ms':>10} {'best ms':>10} "
+          f"{'peak KiB':>10}")
+    report = {
+        "meta": {
+            "when": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": utils.STORAGE_BACKEND,
+            "journal": utils.JOURNAL_MODE,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "rows": {},
+        },
+        "results": [],
+    }
+    for users in args.users:
+        counts, results = run_scale(users, args.repeat, args.seed, args.only)
+        report["meta"]["rows"][str(users)] = counts
+        report["results"] += results
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
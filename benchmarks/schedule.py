@@ -0,0 +1,104 @@
+'''
+Cost of the scheduling engine
+- Journal mode is on, as in server.py, unless --no-journal
+- For each size, generates a clinic with datagen.py (about one doctor
+  per 50 users and three appointments per user)
+- Times building the per-doctor index from a cold cache, one conflict
+  check against a scan of every appointment, the next 10 free slots
+  for one doctor and for any doctor, a week of availability for every
+  doctor, and book() followed by cancel()
+
+Usage: python benchmarks/schedule.py [--sizes 10000 100000] [--checks 200] [--no-journal]
+'''
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schedule
+import utils
+from datagen import SLOTS, generate
+
+
+def scan_conflicts(source, doctor, day, time_):
+    # What a check costs without the index: look at every appointment
+    start = schedule._minute(day, time_)
+    return [r["aptID"] for r in utils.read_records(source)
+            if r.get("doctor") == doctor and r.get("status") not in schedule.FREE_STATUSES
+            and abs(schedule._minute(r.get("date"), r.get("time")) - start)
+            < schedule.APPOINTMENT_MINUTES]
+
+
+def per_op(func, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1000
+
+
+def run(folder, users, checks):
+    today = date.today()
+    counts = generate(folder, users, today=today)
+    source = os.path.join(folder, "appointment.txt")
+    doctors = schedule.doctor_ids(os.path.join(folder, "user.txt"))
+    rnd = random.Random(7)
+    probes = [(rnd.choice(doctors),
+               (today + timedelta(days=rnd.randint(-30, 30))).strftime("%Y-%m-%d"),
+               rnd.choice(SLOTS)) for _ in range(checks)]
+
+    utils.clear_cache()
+    schedule._indexes.clear()
+    result = {"build index (cold)": per_op(lambda: schedule._get_index(source), [()])}
+    utils.read_records(source)
+    result["conflict, scan"] = per_op(lambda *p: scan_conflicts(source, *p), probes[:10])
+    result["conflict, index"] = per_op(lambda *p: schedule.conflicts(source, *p), probes)
+
+    now = datetime.combine(today, datetime.min.time())
+    result["next 10, one doctor"] = per_op(
+        lambda d: schedule.next_free_slots(source, 10, doctor=d, after=now),
+        [(p[0],) for p in probes[:20]])
+    result["next 10, any doctor"] = per_op(
+        lambda: schedule.next_free_slots(source, 10, after=now, doctors=doctors), [()] * 5)
+    week = (today.strftime("%Y-%m-%d"), (today + timedelta(days=6)).strftime("%Y-%m-%d"))
+    result["7 days, all doctors"] = per_op(
+        lambda: schedule.availability(source, *week, doctors), [()])
+
+    def book_and_cancel(doctor):
+        slot = schedule.next_free_slots(source, 1, doctor=doctor, after=now)[0]
+        record = schedule.book(source, "U1", doctor, slot["date"], slot["time"])
+        schedule.cancel(source, record["aptID"])
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        book_and_cancel(probes[0][0])  # Builds the aptID index cancel() looks up
+        result["book + cancel"] = per_op(book_and_cancel, [(p[0],) for p in probes[:5]])
+    return counts, len(doctors), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--no-journal", action="store_true",
+                        help="rewrite appointment.txt on every booking")
+    args = parser.parse_args()
+    utils.JOURNAL_MODE = not args.no_journal
+
+    for users in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            counts, doctors, result = run(folder, users, args.checks)
+        print(f"\n{users} users, {doctors} doctors, "
+              f"{counts['appointment.txt']} appointments (ms per operation)")
+        for name, ms in result.items():
+            print(f"  {name:<22} {ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
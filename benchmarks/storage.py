@@ -0,0 +1,80 @@
+'''
+JSON files vs SQLite storage backend
+- Builds an N-row user table in each backend (utils.replace_records)
+- Times, with the record cache cleared first as in a fresh process:
+  one find_record by ID, one update_record, one add_record and a full
+  read_records; then a find_record once the table and its index are
+  in memory
+- Prints milliseconds per operation for each size and backend
+
+Usage: python benchmarks/storage.py [--sizes 1000 100000 1000000]
+'''
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+BACKENDS = ("json", "sqlite")
+
+
+def make_users(n):
+    return [{"userID": f"U{i}", "username": f"user{i}", "password": f"pw{i}",
+             "age": str(20 + i % 60), "role": "patient" if i % 10 else "doctor",
+             "status": "active", "phone": f"012-{i:07d}"} for i in range(n)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def cold(func):
+    utils.clear_cache()
+    return timed(func)
+
+
+def run(folder, backend, n, users):
+    utils.STORAGE_BACKEND = backend
+    source = os.path.join(folder, backend, "user.txt")
+    os.makedirs(os.path.dirname(source), exist_ok=True)
+    target = f"U{n // 2}"
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = {"build": timed(lambda: utils.replace_records(source, users))}
+        result["find (cold)"] = cold(lambda: utils.find_record(source, "and", {"userID": target}))
+        result["update (cold)"] = cold(lambda: utils.update_record(source, target, {"age": "99"}))
+        result["add (cold)"] = cold(lambda: utils.add_record(
+            source, {"userID": f"U{n}", "username": "new", "role": "patient"}))
+        result["read all (cold)"] = cold(lambda: utils.read_records(source))
+        utils.find_record(source, "and", {"username": "user7"})  # Builds the index
+        result["find (warm)"] = timed(lambda: utils.find_record(source, "and", {"username": "user8"}))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n in args.sizes:
+            users = make_users(n)
+            results = {backend: run(os.path.join(folder, str(n)), backend, n, users)
+                       for backend in BACKENDS}
+            print(f"\n{n} rows (ms)")
+            print(f"{'operation':<18}" + "".join(f"{b:>12}" for b in BACKENDS))
+            for op in results["json"]:
+                print(f"{op:<18}" + "".join(f"{results[b][op]:>12.2f}" for b in BACKENDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+'''
+Stress test for several sessions sharing one data directory
+- Each process adds its own records and increments one shared counter
+  record using optimistic retries on utils.ConflictError
+- Afterwards checks that no add and no increment was lost, and reports
+  throughput and conflict counts
+
+Usage: python benchmarks/stress_locking.py [--procs 8] [--ops 200] [--journal]
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+def worker(task):
+    source, worker_id, ops, journal = task
+    utils.JOURNAL_MODE = journal
+    conflicts = 0
+
+    # utils prints a line per write, keep the benchmark output readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(ops):
+            utils.add_record(source, {"recID": f"W{worker_id}-{i}", "worker": worker_id})
+
+            while True:
+                counter = utils.find_record(source, "and", {"recID": "COUNTER"})[0]
+                try:
+                    utils.update_record(source, "COUNTER", {"count": counter["count"] + 1},
+                                        expected_version=utils.record_version(counter))
+                    break
+                except utils.ConflictError:
+                    conflicts += 1
+    return conflicts
+
+
+def run(procs, ops, journal):
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "stress.txt")
+        with open(source, "w") as file:
+            json.dump([{"recID": "COUNTER", "count": 0}], file)
+
+        start = time.perf_counter()
+        with Pool(procs) as pool:
+            conflicts = sum(pool.map(worker, [(source, w, ops, journal) for w in range(procs)]))
+        elapsed = time.perf_counter() - start
+
+        utils.compact_journal(source)
+        with open(source) as file:
+            records = json.load(file)  # Fails loudly if the file was torn
+
+    added = [r for r in records if r["recID"] != "COUNTER"]
+    counter = next(r for r in records if r["recID"] == "COUNTER")
+    expected = procs * ops
+
+    print(f"mode: {'journal' if journal else 'rewrite'}, {procs} processes x {ops} ops")
+    print(f"  added records : {len(added)} / {expected}"
+          f" (unique ids: {len({r['recID'] for r in added})})")
+    print(f"  counter value : {counter['count']} / {expected}")
+    print(f"  conflicts     : {conflicts} optimistic retries")
+    print(f"  elapsed       : {elapsed:.2f}s,"
+          f" {2 * expected / elapsed:.0f} writes/s")
+
+    ok = len(added) == expected and counter["count"] == expected
+    print("  result        :", "OK, no lost writes" if ok else "LOST WRITES")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procs", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--journal", action="store_true",
+                        help="use the write-ahead journal instead of full rewrites")
+    args = parser.parse_args()
+
+    ok = run(args.procs, args.ops, args.journal)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+'''
+Bulk import of users, appointments, medicines and income
+- Reads CSV (header row) or JSONL (one JSON object per line) files
+- New rows go in through utils.add_records, so a whole file costs one
+  write instead of one full rewrite per row
+- With update mode, rows whose ID already exists become one
+  utils.update_records batch
+- Appointments and income may be split by month (partitions.py); rows
+  are then routed to the partition of their date
+- User passwords are stored hashed (see auth.py); values that already
+  are auth hashes are kept as they are. PBKDF2 is the slow part of a
+  user import (~90 ms a row), so the rows that will be written are
+  hashed together on a process pool (auth.hash_many)
+
+Usage: python bulk_import.py users roster.csv [--update]
+'''
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import admin
+import auth
+import partitions
+import utils
+
+TABLES = {
+    "users": {"source": admin.user_source, "id": "userID", "prefix": "U"},
+    "appointments": {"source": admin.appointment_source, "id": "aptID", "prefix": "A"},
+    "medicines": {"source": admin.medicine_source, "id": "medID", "prefix": "M"},
+    "income": {"source": admin.income_source, "id": "inID", "prefix": "B"},
+}
+
+# CSV gives strings; these fields are stored as numbers in the data files
+NUMBER_FIELDS = {"amount": float, "price": float, "stock": int}
+
+
+# ---------------------------------------------------
+# Reading input files
+# ---------------------------------------------------
+def read_rows(path):
+    """Yield one dict per row of a .csv or .jsonl file."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                yield {k.strip(): (v or "").strip() for k, v in row.items() if k}
+    else:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def clean_row(table, row):
+    """Normalise one input row. Returns None if it cannot be imported."""
+    row = {k: v for k, v in row.items() if v != ""}
+    for field, convert in NUMBER_FIELDS.items():
+        if field in row:
+            try:
+                row[field] = convert(row[field])
+            except ValueError:
+                print(f"Skipping row with invalid {field}: {row}")
+                return None
+
+    if table == "users" and "role" in row:
+        role = str(row["role"]).strip().lower()
+        if role not in admin.role_map:
+            print(f"Skipping user with invalid role: {row.get('username', row)}")
+            return None
+        row["role"] = admin.role_map[role]
+    return row
+
+
+def hash_passwords(rows, workers=None):
+    """Replace plaintext "password" values in rows by auth hashes, in place."""
+    todo = [row for row in rows if "password" in row and not auth.is_hashed(row["password"])]
+    hashes = auth.hash_many((str(row["password"]) for row in todo), workers)
+    for row, hashed in zip(todo, hashes):
+        row["password"] = hashed
+
+
+# ---------------------------------------------------
+# Import
+# ---------------------------------------------------
+def import_file(table, path, update=False):
+    """Import a file into one table. Returns (added, updated, skipped)."""
+    config = TABLES[table]
+    source, id_field, prefix = config["source"], config["id"], config["prefix"]
+
+    new_rows = []
+    changes = []
+    skipped = 0
+
+    for row in read_rows(path):
+        row = clean_row(table, row)
+        if row is None:
+            skipped += 1
+            continue
+
+        record_id = row.get(id_field)
+        if record_id and partitions.find_record(source, "and", {id_field: record_id}):
+            if update:
+                changes.append((record_id, {k: v for k, v in row.items() if k != id_field}))
+            else:
+                print(f"Skipping existing {id_field} {record_id}")
+                skipped += 1
+            continue
+
+        if table == "users":
+            if "role" not in row:
+                print(f"Skipping new user without a role: {row.get('username', row)}")
+                skipped += 1
+                continue
+            row.setdefault("status", "active")
+
+        new_rows.append(row)
+
+    # One reservation for every row that came without an ID
+    missing = [i for i, row in enumerate(new_rows) if not row.get(id_field)]
+    if missing:
+        new_ids = utils.next_ids(source, prefix, len(missing))
+        for i, new_id in zip(missing, new_ids):
+            new_rows[i] = {id_field: new_id, **new_rows[i]}
+
+    if table == "users":
+        hash_passwords(new_rows + [updates for _, updates in changes])
+
+    added = partitions.add_records(source, new_rows) if new_rows else 0
+    updated = partitions.update_records(source, changes) if changes else 0
+    return added, updated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("path", help="CSV or JSONL file to import")
+    parser.add_argument("--update", action="store_true",
+                        help="update records whose ID already exists")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} not found")
+
+    start = time.perf_counter()
+    added, updated, skipped = import_file(args.table, args.path, args.update)
+    elapsed = time.perf_counter() - start
+    print(f"Added {added}, updated {updated}, skipped {skipped} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+'''
+Non-interactive command line for the administrator functions
+- Reports and user management without login prompts or menus, built on
+  the same admin.py functions the menus use
+- Output as tables (default) or JSON (--json)
+- "batch" runs many commands from a file (or - for stdin) in one
+  process, so the data files are parsed once and stay cached
+- --clinic picks one clinic from clinics.json; "network" reports cover
+  every clinic at once, one worker process per clinic (see clinics.py)
+
+Usage:
+  python cli.py report patients [--details]
+  python cli.py report appointments [--status pending --from 2025-01-01 --to 2025-01-31]
+  python cli.py report income [--detail paid|unpaid]
+  python cli.py report staff
+  python cli.py report medicine
+  python cli.py user add --username ali --password secret --role doctor
+  python cli.py user update ali --role receptionist --age 40
+  python cli.py user remove U12
+  python cli.py schedule slots [--doctor U3] [-n 5] [--after "2025-03-01 09:00"]
+  python cli.py schedule availability --from 2025-03-01 --to 2025-03-07
+  python cli.py schedule book --patient U6 --doctor U3 --date 2025-03-01 --time 09:30
+  python cli.py export users --output users.jsonl
+  python cli.py export filtered-appointments --status pending --from 2025-03-01 --output apts.csv
+  python cli.py export unpaid-bills --format csv
+  python cli.py --clinic north report staff
+  python cli.py network summary|staff [--workers 8]
+  python cli.py network income --detail unpaid
+  python cli.py --json batch commands.txt
+'''
+
+import argparse
+import contextlib
+import json
+import shlex
+import sys
+from datetime import datetime
+
+import admin
+import aggregates
+import clinics
+import export
+import profiling
+import schedule
+import utils
+
+DEFAULT_DATA_DIR = admin.data_dir
+
+APPOINTMENT_COLUMNS = ["aptID", "patient", "date", "time", "doctor", "status"]
+BILL_COLUMNS = ["inID", "patient", "amount", "status"]
+
+
+class CommandError(Exception):
+    """A command that ran but could not do what was asked."""
+
+
+# ---------------------------------------------------
+# Reports
+# ---------------------------------------------------
+def report_patients(args):
+    result = {"total_patients": aggregates.get(admin.user_source, "total_patients")}
+    if args.details:
+        result["patients"] = [admin.public_user(u) for u in admin.patient_records()]
+    return result
+
+
+def report_appointments(args):
+    result = {
+        "confirmed_appointments": aggregates.get(admin.appointment_source,
+                                                 "confirmed_appointments"),
+        "next_7_days": admin.appointment_outlook(),
+    }
+    if args.status:
+        result["appointments"] = admin.filter_appointments(
+            args.status.lower(), args.date_from, args.date_to, args.time_from, args.time_to)
+    return result
+
+
+def report_income(args):
+    result = dict(aggregates.get(admin.income_source))
+    if args.detail == "paid":
+        result["paid"] = admin.paid_bills()
+    elif args.detail == "unpaid":
+        result["unpaid"], result["related_appointments"] = admin.unpaid_bills()
+    return result
+
+
+def report_staff(args):
+    return {"staff_count": aggregates.get(admin.user_source, "staff_count"),
+            "staff": admin.staff_members()}
+
+
+def report_medicine(args):
+    return {"total_medicines": aggregates.get(admin.medicine_source, "total_medicines"),
+            "medicines": admin.medicine_records(),
+            "low_stock": admin.low_stock_medicines()}
+
+
+# ---------------------------------------------------
+# User management
+# ---------------------------------------------------
+def user_add(args):
+    try:
+        return admin.public_user(admin.create_user(args.username, args.password, args.age,
+                                                   args.phone, args.role))
+    except ValueError as e:
+        raise CommandError(str(e))
+
+
+def user_update(args):
+    user = admin.get_user_by_name(args.username)
+    if user is None:
+        raise CommandError(f"User not found: {args.username}")
+
+    updates = {}
+    if args.password:
+        updates["password"] = args.password
+    if args.role:
+        if args.role.lower() not in admin.role_map:
+            raise CommandError(f"Invalid role: {args.role!r}")
+        updates["role"] = admin.role_map[args.role.lower()]
+    if args.age:
+        updates["age"] = args.age
+    if not updates:
+        raise CommandError("Nothing to update")
+
+    try:
+        return admin.public_user(admin.change_user(user, updates))
+    except utils.ConflictError as e:
+        raise CommandError(str(e))
+
+
+def user_remove(args):
+    try:
+        user = admin.delete_user(args.user_id)
+    except utils.ConflictError as e:
+        raise CommandError(str(e))
+    if user is None:
+        raise CommandError(f"User not found: {args.user_id}")
+    return admin.public_user(user)
+
+
+# ---------------------------------------------------
+# Scheduling
+# ---------------------------------------------------
+def _doctors(args):
+    return args.doctor or schedule.doctor_ids(admin.user_source)
+
+
+def schedule_slots(args):
+    try:
+        after = datetime.strptime(args.after, "%Y-%m-%d %H:%M") if args.after else None
+    except ValueError:
+        raise CommandError(f"Bad --after, expected YYYY-MM-DD HH:MM: {args.after!r}")
+    return {"slots": schedule.next_free_slots(admin.appointment_source, args.n,
+                                              after=after, doctors=_doctors(args))}
+
+
+def schedule_availability(args):
+    try:
+        free = schedule.availability(admin.appointment_source, args.date_from,
+                                     args.date_to, _doctors(args))
+    except ValueError as e:
+        raise CommandError(str(e))
+    return {"free_slots": [{"doctor": doctor, "date": day, "free": len(times),
+                            "times": " ".join(times)}
+                           for doctor, days in free.items() for day, times in days.items()]}
+
+
+def schedule_book(args):
+    try:
+        return schedule.book(admin.appointment_source, args.patient, args.doctor,
+                             args.date, args.time)
+    except (schedule.SlotTakenError, ValueError) as e:
+        raise CommandError(str(e))
+
+
+# ---------------------------------------------------
+# Export
+# ---------------------------------------------------
+def export_report(args):
+    """Stream a report or table to CSV or JSON lines (see export.py)."""
+    try:
+        count = export.export(args.report, args.output, args.format, args.stdout,
+                              status=args.status, date_from=args.date_from,
+                              date_to=args.date_to, time_from=args.time_from,
+                              time_to=args.time_to)
+    except OSError as e:
+        raise CommandError(str(e))
+    return {"report": args.report, "rows": count, "output": args.output or "-"}
+
+
+# ---------------------------------------------------
+# Network (every clinic)
+# ---------------------------------------------------
+CLINIC_COLUMNS = ["total_patients", "staff_count", "confirmed_appointments",
+                  "total_income", "unpaid_bills", "low_stock_medicines"]
+
+
+def network_summary(args):
+    report = clinics.network_summary(workers=args.workers)
+    network = report["network"]
+    result = {"clinics": len(report["clinics"])}
+    result.update({k: v for k, v in network.items() if not isinstance(v, (dict, list))})
+    result["per_clinic"] = [{"clinic": name, **{c: figures.get(c, 0) for c in CLINIC_COLUMNS}}
+                            for name, figures in report["clinics"].items()]
+    result["staff_by_role"] = [{"role": role, "count": n}
+                               for role, n in sorted(network["staff_by_role"].items())]
+    result["appointments_by_status"] = [
+        {"status": status, "count": n}
+        for status, n in sorted(network["appointments_by_status"].items())]
+    result["next_7_days"] = network["next_7_days"]
+    return result
+
+
+def network_staff(args):
+    staff = clinics.network_staff(workers=args.workers)
+    return {"staff_count": len(staff), "staff": staff}
+
+
+def network_income(args):
+    figures = clinics.network_summary(workers=args.workers)["network"]
+    result = {k: figures[k] for k in ("total_income", "total_bills", "paid_bills", "unpaid_bills")}
+    if args.detail:
+        result[args.detail] = clinics.network_bills(args.detail, workers=args.workers)
+    return result
+
+
+# ---------------------------------------------------
+# Output
+# ---------------------------------------------------
+def print_table(result):
+    """Scalars as a box, lists of records as tables under a heading."""
+    if isinstance(result, list):
+        utils.pretty_print_records(result)
+        return
+    scalars = {k: v for k, v in result.items() if not isinstance(v, list)}
+    if scalars:
+        utils.pretty_print_box(scalars)
+    for key, value in result.items():
+        if isinstance(value, list):
+            print(f"\n--- {key.replace('_', ' ').title()} ---")
+            headers = None
+            if key in ("appointments", "related_appointments"):
+                headers = APPOINTMENT_COLUMNS
+            elif key in ("paid", "unpaid"):
+                headers = BILL_COLUMNS
+            if headers and value and "clinic" in value[0]:
+                headers = ["clinic"] + headers
+            utils.pretty_print_records(value, headers)
+
+
+def use_clinic(name):
+    """Point admin at a clinic's folder (None: the default data folder)."""
+    try:
+        admin.set_data_dir(clinics.clinic_dir(name) if name else DEFAULT_DATA_DIR)
+    except ValueError as e:
+        raise CommandError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--clinic", help="clinic name from clinics.json (default: data/)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="admin reports")
+    reports = report.add_subparsers(dest="report", required=True)
+    patients = reports.add_parser("patients")
+    patients.add_argument("--details", action="store_true", help="list every patient")
+    patients.set_defaults(func=report_patients)
+    appointments = reports.add_parser("appointments")
+    appointments.add_argument("--status", choices=["pending", "cancelled", "confirmed"],
+                              help="also list appointments with this status")
+    appointments.add_argument("--from", dest="date_from", default="0000-00-00")
+    appointments.add_argument("--to", dest="date_to", default="9999-99-99")
+    appointments.add_argument("--time-from", default="00:00")
+    appointments.add_argument("--time-to", default="99:99")
+    appointments.set_defaults(func=report_appointments)
+    income = reports.add_parser("income")
+    income.add_argument("--detail", choices=["paid", "unpaid"])
+    income.set_defaults(func=report_income)
+    reports.add_parser("staff").set_defaults(func=report_staff)
+    reports.add_parser("medicine").set_defaults(func=report_medicine)
+
+    user = commands.add_parser("user", help="add, update or remove users")
+    users = user.add_subparsers(dest="action", required=True)
+    add = users.add_parser("add")
+    add.add_argument("--username", required=True)
+    add.add_argument("--password", required=True)
+    add.add_argument("--role", required=True, help="doctor, receptionist, patient, ... or a shortcut")
+    add.add_argument("--age", default="")
+    add.add_argument("--phone", default="")
+    add.set_defaults(func=user_add)
+    update = users.add_parser("update")
+    update.add_argument("username")
+    update.add_argument("--password")
+    update.add_argument("--role")
+    update.add_argument("--age")
+    update.set_defaults(func=user_update)
+    remove = users.add_parser("remove")
+    remove.add_argument("user_id", help="exact user ID")
+    remove.set_defaults(func=user_remove)
+
+    plan = commands.add_parser("schedule", help="free slots and bookings")
+    plans = plan.add_subparsers(dest="action", required=True)
+    slots = plans.add_parser("slots", help="next free slots")
+    slots.add_argument("--doctor", action="append", help="doctor ID (repeatable, default all)")
+    slots.add_argument("-n", type=int, default=5)
+    slots.add_argument("--after", help="YYYY-MM-DD HH:MM (default now)")
+    slots.set_defaults(func=schedule_slots)
+    free = plans.add_parser("availability", help="free slots per doctor and day")
+    free.add_argument("--from", dest="date_from", required=True)
+    free.add_argument("--to", dest="date_to", required=True)
+    free.add_argument("--doctor", action="append", help="doctor ID (repeatable, default all)")
+    free.set_defaults(func=schedule_availability)
+    book = plans.add_parser("book", help="book an appointment if the slot is free")
+    for name in ("--patient", "--doctor", "--date", "--time"):
+        book.add_argument(name, required=True)
+    book.set_defaults(func=schedule_book)
+
+    dump = commands.add_parser("export", help="write a report or table to CSV or JSON lines")
+    dump.add_argument("report", choices=list(export.EXPORTS))
+    dump.add_argument("--output", help="file to write (default stdout)")
+    dump.add_argument("--format", choices=["csv", "jsonl"],
+                      help="default: csv for .csv outputs, else jsonl")
+    dump.add_argument("--status", choices=["pending", "cancelled", "confirmed"])
+    dump.add_argument("--from", dest="date_from")
+    dump.add_argument("--to", dest="date_to")
+    dump.add_argument("--time-from")
+    dump.add_argument("--time-to")
+    dump.set_defaults(func=export_report)
+
+    network = commands.add_parser("network", help="reports over every clinic")
+    networks = network.add_subparsers(dest="report", required=True)
+    for name, func in (("summary", network_summary), ("staff", network_staff),
+                       ("income", network_income)):
+        sub = networks.add_parser(name)
+        sub.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+        if name == "income":
+            sub.add_argument("--detail", choices=["paid", "unpaid"])
+        sub.set_defaults(func=func)
+
+    batch = commands.add_parser("batch", help="run one command per line from a file")
+    batch.add_argument("path", help="command file, or - for stdin")
+    return parser
+
+
+def run(parser, argv, as_json):
+    """Run one command line; return 0 on success, 1 on failure."""
+    args = parser.parse_args(argv)
+    args.stdout = sys.stdout
+    try:
+        use_clinic(args.clinic)
+        # utils prints progress messages, keep stdout for the result
+        with contextlib.redirect_stdout(sys.stderr):
+            result = args.func(args)
+    except CommandError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.func is export_report and args.output is None:
+        return 0  # The records already went to stdout
+    if as_json or args.json:
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print_table(result)
+    return 0
+
+
+def run_batch(parser, path, as_json):
+    """Run each non-empty, non-# line of path; return how many failed."""
+    file = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    failures = 0
+    try:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            argv = shlex.split(line)
+            if argv[0] == "batch":
+                print("Error: batch cannot be nested", file=sys.stderr)
+                failures += 1
+                continue
+            try:
+                failures += run(parser, argv, as_json)
+            except SystemExit as e:
+                failures += bool(e.code)  # argparse rejected the line
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    return failures
+
+
+def main(argv=None):
+    profiling.enable_from_env()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        return 1 if run_batch(parser, args.path, args.json) else 0
+    return run(parser, argv if argv is not None else sys.argv[1:], args.json)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+'''
+Several clinics, one data folder each
+- clinics.json (next to this file, or the file named by
+  HEALTHPLUS_CLINICS) maps clinic names to data folders; relative
+  folders are taken from the file's own folder:
+      {"central": "data", "north": "/srv/healthplus/north"}
+  Without it there is a single clinic, "main", using admin's data folder
+- Network reports run one task per clinic in a process pool. Each worker
+  points admin at its clinic and returns that clinic's partial figures
+  or rows; the parent only merges them, so the work spreads over the
+  cores instead of going through every clinic's files one by one
+- Workers are spawned, not forked: a forked child would inherit the
+  parent's open SQLite connections and file locks. They are handed the
+  storage settings (utils.STORAGE_BACKEND, utils.JOURNAL_MODE) instead
+- Every merged figure is a sum (counts per status/role, per day of the
+  appointment outlook), so merging costs nothing next to the scans
+'''
+
+import json
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import admin
+import aggregates
+import columnar
+import partitions
+import utils
+
+current_path = os.path.dirname(os.path.abspath(__file__))
+CLINICS_FILE = os.environ.get("HEALTHPLUS_CLINICS", os.path.join(current_path, "clinics.json"))
+
+
+# ---------------------------------------------------
+# Registry
+# ---------------------------------------------------
+def load_clinics(path=None):
+    """{clinic name: absolute data folder}, in the order of the file."""
+    path = path or CLINICS_FILE
+    try:
+        with open(path, "r") as file:
+            entries = json.load(file)
+    except FileNotFoundError:
+        return {"main": os.path.abspath(admin.data_dir)}
+    base = os.path.dirname(os.path.abspath(path))
+    return {name: os.path.abspath(os.path.join(base, folder))
+            for name, folder in entries.items()}
+
+
+def clinic_dir(name, clinics=None):
+    clinics = clinics if clinics is not None else load_clinics()
+    if name not in clinics:
+        raise ValueError(f"Unknown clinic {name!r} (known: {', '.join(clinics)})")
+    return clinics[name]
+
+
+# ---------------------------------------------------
+# Running per clinic
+# ---------------------------------------------------
+def _start_worker(backend, journal_mode):
+    utils.STORAGE_BACKEND, utils.JOURNAL_MODE = backend, journal_mode
+
+
+def _in_clinic(folder, func, args):
+    # Runs in a worker process; workers are reused, so always switch
+    admin.set_data_dir(folder)
+    return func(*args)
+
+
+def run_per_clinic(func, clinics=None, args=(), workers=None):
+    """{clinic name: func(*args)} with admin pointed at each clinic.
+
+    func must be a module-level function (it is pickled by name).
+    workers defaults to one per core, at most one per clinic; with one
+    worker everything runs here, in this process.
+    """
+    clinics = clinics if clinics is not None else load_clinics()
+    workers = workers or min(len(clinics), os.cpu_count() or 1)
+
+    if workers <= 1:
+        saved = admin.data_dir
+        try:
+            return {name: _in_clinic(folder, func, args) for name, folder in clinics.items()}
+        finally:
+            admin.set_data_dir(saved)
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_start_worker,
+                             initargs=(utils.STORAGE_BACKEND, utils.JOURNAL_MODE)) as pool:
+        futures = {name: pool.submit(_in_clinic, folder, func, args)
+                   for name, folder in clinics.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# ---------------------------------------------------
+# Partial figures of one clinic
+# ---------------------------------------------------
+def clinic_figures(today=None):
+    """The numbers behind the admin reports, for admin's current clinic."""
+    figures = {}
+    for source in (admin.user_source, admin.appointment_source,
+                   admin.income_source, admin.medicine_source):
+        figures.update(aggregates.get(source))
+
+    roles = columnar.load_table(admin.user_source, ["role"])
+    figures["staff_by_role"] = {role: n for role, n in columnar.group_count(roles, "role").items()
+                                if role in aggregates.STAFF_ROLES}
+    by_status = Counter()
+    for path in partitions.partition_sources(admin.appointment_source):
+        by_status.update(columnar.group_count(columnar.load_table(path, ["status"]), "status"))
+    figures["appointments_by_status"] = dict(by_status)
+    figures["next_7_days"] = admin.appointment_outlook(today)
+    return figures
+
+
+def merge_figures(partials):
+    """Add up clinic_figures() results from several clinics."""
+    total = {}
+    outlook = {}
+    for figures in partials:
+        for key, value in figures.items():
+            if key == "next_7_days":
+                for day in value:
+                    merged = outlook.setdefault(day["date"], Counter())
+                    merged.update({"pending": day["pending"], "cancelled": day["cancelled"]})
+            elif isinstance(value, dict):
+                total.setdefault(key, Counter()).update(value)
+            else:
+                total[key] = total.get(key, 0) + value
+    for key, value in total.items():
+        if isinstance(value, Counter):
+            total[key] = dict(value)
+    if "total_income" in total:
+        total["total_income"] = round(total["total_income"], 2)
+    total["next_7_days"] = [{"date": day, "pending": c["pending"], "cancelled": c["cancelled"]}
+                            for day, c in sorted(outlook.items())]
+    return total
+
+
+# ---------------------------------------------------
+# Network reports
+# ---------------------------------------------------
+def network_summary(clinics=None, workers=None, today=None):
+    """{"clinics": {name: figures}, "network": merged figures}."""
+    # Every clinic counts the same week, even if a worker starts after midnight
+    per_clinic = run_per_clinic(clinic_figures, clinics, (today or date.today(),), workers)
+    return {"clinics": per_clinic, "network": merge_figures(per_clinic.values())}
+
+
+def _tagged(per_clinic):
+    return [{"clinic": name, **row} for name, rows in per_clinic.items() for row in rows]
+
+
+def network_staff(clinics=None, workers=None):
+    """Every clinic's staff_members() rows, with a "clinic" column."""
+    return _tagged(run_per_clinic(admin.staff_members, clinics, (), workers))
+
+
+def _unpaid_bills():
+    return admin.unpaid_bills()[0]
+
+
+def network_bills(status, clinics=None, workers=None):
+    """Paid or unpaid bills of every clinic, names attached, with a "clinic" column."""
+    if status not in ("paid", "unpaid"):
+        raise ValueError(f"Bill status must be paid or unpaid, not {status!r}")
+    func = admin.paid_bills if status == "paid" else _unpaid_bills
+    return _tagged(run_per_clinic(func, clinics, (), workers))
@@ -0,0 +1,178 @@
+'''
+Columnar tables for report aggregation
+- Numeric columns (amount, stock, price) are stored in compact arrays
+- String columns (status, role, patient, doctor, ...) are dictionary encoded
+- Filters produce byte masks (1 = row selected) that can be combined,
+  counted, summed over and grouped without building a dict per row
+'''
+
+import operator
+import os
+from array import array
+from itertools import compress, repeat
+
+import utils
+
+# Column name -> array typecode for numeric columns, everything else is
+# dictionary encoded as a string column
+NUMERIC_COLUMNS = {
+    "amount": "d",
+    "price": "d",
+    "stock": "q",
+}
+
+# Loaded tables, reused until the data file changes
+_tables = {}
+
+
+# ---------------------------------------------------
+# Loading
+# ---------------------------------------------------
+def _to_number(value, typecode):
+    try:
+        return int(value) if typecode == "q" else float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def load_table(source, columns):
+    """Load the given columns of source into a columnar table.
+
+    Table layout:
+        {"length": n,
+         "numeric": {name: array},
+         "strings": {name: {"codes": array, "values": [..], "lookup": {value: code}}}}
+    """
+    columns = tuple(columns)
+    stamp = utils.table_stamp(source)
+    key = (os.path.abspath(source), columns)
+    cached = _tables.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    numeric = {c: array(NUMERIC_COLUMNS[c]) for c in columns if c in NUMERIC_COLUMNS}
+    strings = {c: {"codes": [], "values": [], "lookup": {}}
+               for c in columns if c not in NUMERIC_COLUMNS}
+
+    length = 0
+    for record in utils.scan_fields(source, columns):
+        length += 1
+        for name, arr in numeric.items():
+            arr.append(_to_number(record[name], arr.typecode))
+        for name, col in strings.items():
+            value = str(record[name])
+            code = col["lookup"].get(value)
+            if code is None:
+                code = col["lookup"][value] = len(col["values"])
+                col["values"].append(value)
+            col["codes"].append(code)
+
+    # One byte per row when there are few distinct values (status, role),
+    # which lets the filters below run through bytes.translate
+    for col in strings.values():
+        typecode = "B" if len(col["values"]) <= 256 else "I"
+        col["codes"] = array(typecode, col["codes"])
+
+    table = {"length": length, "numeric": numeric, "strings": strings}
+    _tables[key] = (stamp, table)
+    return table
+
+
+# ---------------------------------------------------
+# Filters (masks)
+# ---------------------------------------------------
+def _mask_from_codes(col, wanted_codes):
+    codes = col["codes"]
+    if codes.typecode == "B":
+        table = bytes(1 if code in wanted_codes else 0 for code in range(256))
+        return codes.tobytes().translate(table)
+    return bytes(1 if code in wanted_codes else 0 for code in codes)
+
+
+def mask_equals(table, column, value):
+    """Rows where a string column equals value (or any of a list of values)."""
+    col = table["strings"][column]
+    values = value if isinstance(value, (list, tuple, set)) else [value]
+    wanted = {col["lookup"][str(v)] for v in values if str(v) in col["lookup"]}
+    if not wanted:
+        return bytes(table["length"])
+    return _mask_from_codes(col, wanted)
+
+
+def mask_compare(table, column, op, value):
+    """Rows where a numeric column compares true, op is one of < <= > >= == !=."""
+    compare = {
+        "<": operator.lt, "<=": operator.le,
+        ">": operator.gt, ">=": operator.ge,
+        "==": operator.eq, "!=": operator.ne,
+    }[op]
+    return bytes(map(compare, table["numeric"][column], repeat(value)))
+
+
+def mask_and(*masks):
+    n = len(masks[0])
+    result = int.from_bytes(masks[0], "little")
+    for mask in masks[1:]:
+        result &= int.from_bytes(mask, "little")
+    return result.to_bytes(n, "little")
+
+
+def mask_or(*masks):
+    n = len(masks[0])
+    result = 0
+    for mask in masks:
+        result |= int.from_bytes(mask, "little")
+    return result.to_bytes(n, "little")
+
+
+# ---------------------------------------------------
+# Aggregates
+# ---------------------------------------------------
+def count(table, mask=None):
+    if mask is None:
+        return table["length"]
+    return mask.count(1)
+
+
+def sum_column(table, column, mask=None):
+    values = table["numeric"][column]
+    if mask is None:
+        return sum(values)
+    return sum(compress(values, mask))
+
+
+def group_count(table, column, mask=None):
+    """Return {value: row count} for a string column."""
+    col = table["strings"][column]
+    codes = col["codes"]
+    if mask is not None:
+        codes = array(codes.typecode, compress(codes, mask))
+
+    if codes.typecode == "B":
+        raw = codes.tobytes()
+        counts = {value: raw.count(code) for value, code in col["lookup"].items()}
+    else:
+        counts = dict.fromkeys(col["values"], 0)
+        for code in codes:
+            counts[col["values"][code]] += 1
+    return {value: n for value, n in counts.items() if n}
+
+
+def select_rows(table, mask, columns=None):
+    """Decode the selected rows back into dicts, for display."""
+    numeric = table["numeric"]
+    strings = table["strings"]
+    if columns is None:
+        columns = list(numeric) + list(strings)
+
+    rows = []
+    for i in compress(range(table["length"]), mask):
+        row = {}
+        for name in columns:
+            if name in numeric:
+                row[name] = numeric[name][i]
+            else:
+                col = strings[name]
+                row[name] = col["values"][col["codes"][i]]
+        rows.append(row)
+    return rows
@@ -0,0 +1,256 @@
+'''
+Export the admin reports and tables to CSV or JSON lines
+- One entry in EXPORTS per admin report (patients, appointment outlook,
+  filtered appointments, paid/unpaid bills and their appointments,
+  staff, low-stock medicines) plus the raw tables; the users table
+  leaves out the password field (admin.PRIVATE_USER_FIELDS)
+- Rows are streamed from the data layer (utils/partitions iterators,
+  which read big tables straight from disk) and written CHUNK_ROWS at a
+  time, so memory stays flat however long the table is; only the user
+  map for the "Uid - name" columns is held in full
+- Filtered appointments read only the months in the date range when the
+  table is split by month (see partitions.py)
+- Files are written next to the target and renamed into place, so a
+  failed export never leaves half a file behind
+- Follows admin's data folder, so cli.py --clinic exports that clinic
+
+Usage: python export.py REPORT [--output FILE] [--format csv|jsonl] [--data-dir data]
+       python export.py filtered-appointments --status pending --from 2025-01-01 --output apts.csv
+'''
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+import admin
+import aggregates
+import partitions
+import utils
+
+CHUNK_ROWS = 10000               # Rows per write
+WRITE_BUFFER = 1024 * 1024       # Bytes buffered by the file object
+
+PATIENT_COLUMNS = ["userID", "username", "age", "phone", "status"]
+APPOINTMENT_COLUMNS = ["aptID", "patient", "date", "time", "doctor", "status"]
+BILL_COLUMNS = ["inID", "patient", "amount", "status"]
+STAFF_COLUMNS = ["userID", "username", "role"]
+MEDICINE_COLUMNS = ["medID", "name", "stock", "price"]
+OUTLOOK_COLUMNS = ["date", "pending", "cancelled"]
+
+
+# ---------------------------------------------------
+# Row sources
+# ---------------------------------------------------
+def _project(records, columns):
+    for record in records:
+        yield {c: record.get(c, "") for c in columns}
+
+
+def _with_names(records, fields):
+    """Yield copies with "Uid" fields turned into "Uid - name"."""
+    user_map = admin.load_user_map()
+    for record in records:
+        record = dict(record)
+        for field in fields:
+            if record.get(field):
+                record[field] = admin.format_user_id_with_name(record[field], user_map)
+        yield record
+
+
+def patients(options):
+    return _project(admin.patient_records(), PATIENT_COLUMNS)
+
+
+def outlook(options):
+    return iter(admin.appointment_outlook())
+
+
+def filtered_appointments(options):
+    """Appointments in the status/date/time window, in file order."""
+    status = options.get("status")
+    time_from = options.get("time_from") or "00:00"
+    time_to = options.get("time_to") or "99:99"
+
+    def wanted(record):
+        return ((status is None or record.get("status") == status)
+                and time_from <= record.get("time", "") <= time_to)
+
+    records = partitions.iter_records(admin.appointment_source, APPOINTMENT_COLUMNS, wanted,
+                                      options.get("date_from"), options.get("date_to"))
+    return _with_names(records, ["patient", "doctor"])
+
+
+def paid_bills(options):
+    return _with_names(admin.bills_with_status("paid"), ["patient"])
+
+
+def unpaid_bills(options):
+    return _with_names(admin.bills_with_status("unpaid"), ["patient"])
+
+
+def unpaid_appointments(options):
+    """Appointments of every patient with an unpaid bill."""
+    owing = {bill["patient"] for bill in admin.bills_with_status("unpaid")}
+    records = partitions.iter_records(admin.appointment_source, APPOINTMENT_COLUMNS,
+                                      lambda r: r.get("patient") in owing)
+    return _with_names(records, ["patient", "doctor"])
+
+
+def staff(options):
+    return utils.scan_fields(admin.user_source, STAFF_COLUMNS,
+                             {"role": set(aggregates.STAFF_ROLES)})
+
+
+def _is_low(stock):
+    try:
+        return int(stock or 0) < aggregates.LOW_STOCK_LIMIT
+    except (TypeError, ValueError):
+        return True  # Counted as 0 in stock, like the aggregates do
+
+
+def low_stock(options):
+    return utils.scan_fields(admin.medicine_source, MEDICINE_COLUMNS, {"stock": _is_low})
+
+
+def users(options):
+    """The user table without PRIVATE_USER_FIELDS (passwords)."""
+    return (admin.public_user(u) for u in utils.iter_records(admin.user_source))
+
+
+def _table(attribute):
+    def rows(options):
+        return partitions.iter_records(getattr(admin, attribute))
+    return rows
+
+
+# Name -> (CSV columns, None to take them from the first row; row source)
+EXPORTS = {
+    "patients": (PATIENT_COLUMNS, patients),
+    "outlook": (OUTLOOK_COLUMNS, outlook),
+    "filtered-appointments": (APPOINTMENT_COLUMNS, filtered_appointments),
+    "paid-bills": (BILL_COLUMNS, paid_bills),
+    "unpaid-bills": (BILL_COLUMNS, unpaid_bills),
+    "unpaid-appointments": (APPOINTMENT_COLUMNS, unpaid_appointments),
+    "staff": (STAFF_COLUMNS, staff),
+    "low-stock": (MEDICINE_COLUMNS, low_stock),
+    "users": (None, users),
+    "appointments": (None, _table("appointment_source")),
+    "medicines": (None, _table("medicine_source")),
+    "income": (None, _table("income_source")),
+}
+
+
+# ---------------------------------------------------
+# Writers
+# ---------------------------------------------------
+def write_jsonl(rows, file, chunk_rows=CHUNK_ROWS):
+    """Write one JSON object per line. Returns the row count."""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == chunk_rows:
+            file.write("\n".join(chunk) + "\n")
+            count += len(chunk)
+            chunk.clear()
+    if chunk:
+        file.write("\n".join(chunk) + "\n")
+        count += len(chunk)
+    return count
+
+
+def write_csv(rows, file, columns=None, chunk_rows=CHUNK_ROWS):
+    """Write a header and one line per row. Returns the row count.
+
+    Without columns, the first row's keys are used; fields the other
+    rows have beyond those are left out.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        if columns:
+            file.write(",".join(columns) + "\r\n")
+        return 0
+    columns = columns or list(first)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    writer.writerow([first.get(c, "") for c in columns])
+    count = 1
+    for row in rows:
+        writer.writerow([row.get(c, "") for c in columns])
+        count += 1
+        if count % chunk_rows == 0:
+            file.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+    file.write(buffer.getvalue())
+    return count
+
+
+def guess_format(output):
+    return "csv" if output and output.lower().endswith(".csv") else "jsonl"
+
+
+def export(name, output=None, fmt=None, stdout=None, **options):
+    """Write one export to output (None: stdout). Returns the row count.
+
+    options are the filters of the export, e.g. status, date_from,
+    date_to, time_from and time_to for filtered-appointments.
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export {name!r} (known: {', '.join(EXPORTS)})")
+    columns, source = EXPORTS[name]
+    fmt = fmt or guess_format(output)
+    rows = source(options)
+
+    def write(file):
+        if fmt == "csv":
+            return write_csv(rows, file, columns)
+        return write_jsonl(rows, file)
+
+    if output is None:
+        return write(stdout or sys.stdout)
+
+    temp = output + ".tmp"
+    try:
+        with open(temp, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER) as file:
+            count = write(file)
+        os.replace(temp, output)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("report", choices=list(EXPORTS))
+    parser.add_argument("--output", help="file to write (default stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"],
+                        help="default: csv for .csv outputs, else jsonl")
+    parser.add_argument("--data-dir", help="folder with user.txt, appointment.txt, ...")
+    parser.add_argument("--status", choices=["pending", "cancelled", "confirmed"])
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--time-from")
+    parser.add_argument("--time-to")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        admin.set_data_dir(args.data_dir)
+    start = time.perf_counter()
+    count = export(args.report, args.output, args.format, status=args.status,
+                   date_from=args.date_from, date_to=args.date_to,
+                   time_from=args.time_from, time_to=args.time_to)
+    print(f"{count} row(s) exported in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
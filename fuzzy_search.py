@@ -0,0 +1,164 @@
+'''
+Fuzzy search index for usernames (or any other text field)
+- Trigram index over the field values, built once per data file and
+  kept in sync through utils change notifications
+- Suggestions are scored like difflib.get_close_matches (SequenceMatcher
+  ratio, same 0.4 cutoff), but only for the few candidates sharing the
+  most trigrams with the query instead of every user
+- Queries with too few trigram matches score at most MAX_FALLBACK more
+  values, taken from the lengths closest to the query's; a query may
+  then get fewer than n suggestions rather than a scan of every user
+'''
+
+import heapq
+import math
+import os
+from collections import Counter
+from difflib import SequenceMatcher
+
+import utils
+
+# How many trigram candidates get a full SequenceMatcher score
+MAX_CANDIDATES = 200
+# Trigrams shared by more values than this say little, skip them
+MAX_BUCKET = 5000
+# Extra values scored when the trigram candidates give too few matches
+MAX_FALLBACK = 1000
+
+# (abs path, field) -> {"stamp", "values": {value: [records]},
+#                       "grams": {gram: set(values)}, "lengths": {length: set(values)}}
+_indexes = {}
+
+
+def _grams(value):
+    padded = f"  {value.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _add(index, value, record):
+    holders = index["values"].setdefault(value, [])
+    holders.append(record)
+    if len(holders) == 1:
+        for gram in _grams(value):
+            index["grams"].setdefault(gram, set()).add(value)
+        index["lengths"].setdefault(len(value), set()).add(value)
+
+
+def _remove(index, value, record):
+    holders = index["values"].get(value)
+    if not holders:
+        return
+    if record in holders:
+        holders.remove(record)
+    if not holders:
+        del index["values"][value]
+        for gram in _grams(value):
+            bucket = index["grams"].get(gram)
+            if bucket is not None:
+                bucket.discard(value)
+                if not bucket:
+                    del index["grams"][gram]
+        same_length = index["lengths"][len(value)]
+        same_length.discard(value)
+        if not same_length:
+            del index["lengths"][len(value)]
+
+
+def _get_index(source, field):
+    path = os.path.abspath(source)
+    stamp = utils.table_stamp(path)
+    index = _indexes.get((path, field))
+    if index is None or index["stamp"] != stamp:
+        index = {"stamp": stamp, "values": {}, "grams": {}, "lengths": {}}
+        for record in utils.iter_records(path):
+            if field in record:
+                _add(index, str(record[field]), record)
+        _indexes[(path, field)] = index
+    return index
+
+
+def on_change(path, old_stamp, new_stamp, changes):
+    for (index_path, field), index in _indexes.items():
+        if index_path != path:
+            continue
+        if index["stamp"] != old_stamp:
+            continue  # Already stale, rebuilt on next use
+        for old, new in changes:
+            if old is not None and field in old:
+                _remove(index, str(old[field]), old)
+            if new is not None and field in new:
+                _add(index, str(new[field]), new)
+        index["stamp"] = new_stamp
+
+
+def _candidates(index, word):
+    buckets = [index["grams"][g] for g in _grams(word) if g in index["grams"]]
+    useful = [b for b in buckets if len(b) <= MAX_BUCKET]
+    if not useful and buckets:
+        useful = [min(buckets, key=len)]
+
+    shared = Counter()
+    for bucket in useful:
+        shared.update(bucket)
+    return [value for value, _ in shared.most_common(MAX_CANDIDATES)]
+
+
+def _fallback(index, word, cutoff, skip):
+    """Up to MAX_FALLBACK values not in skip, nearest to word in length.
+
+    ratio() is 2*matches/(len(a)+len(b)) and matches <= the shorter
+    length, so values outside [low, high] can never reach cutoff.
+    """
+    size = len(word)
+    low = math.ceil(size * cutoff / (2 - cutoff))
+    high = math.floor(size * (2 - cutoff) / cutoff) if cutoff else math.inf
+    lengths = sorted((n for n in index["lengths"] if low <= n <= high),
+                     key=lambda n: abs(n - size))
+    picked = []
+    for n in lengths:
+        for value in index["lengths"][n]:
+            if value not in skip:
+                picked.append(value)
+                if len(picked) == MAX_FALLBACK:
+                    return picked
+    return picked
+
+
+def close_matches(source, word, n=3, cutoff=0.4, field="username"):
+    """difflib.get_close_matches over the field values, trigram narrowed.
+
+    The best match is the same as a full scan in practice; lower ranked
+    suggestions may differ when many values tie on shared trigrams.
+    If the candidates give fewer than n matches, up to MAX_FALLBACK
+    values of similar length are scored as well, so a query sharing no
+    trigram with anything still gets suggestions from small tables.
+    """
+    index = _get_index(source, field)
+    matcher = SequenceMatcher()
+    matcher.set_seq2(word)
+
+    def score(values):
+        result = []
+        for value in values:
+            matcher.set_seq1(value)
+            if (matcher.real_quick_ratio() >= cutoff
+                    and matcher.quick_ratio() >= cutoff
+                    and matcher.ratio() >= cutoff):
+                result.append((matcher.ratio(), value))
+        return result
+
+    candidates = _candidates(index, word)
+    result = score(candidates)
+    if len(result) < n:
+        result += score(_fallback(index, word, cutoff, set(candidates)))
+    return [value for _, value in heapq.nlargest(n, result)]
+
+
+def suggest(source, word, n=3, cutoff=0.4, field="username"):
+    """Return the first record for each of the closest field values."""
+    index = _get_index(source, field)
+    return [index["values"][value][0]
+            for value in close_matches(source, word, n, cutoff, field)]
+
+
+utils.add_listener(on_change)
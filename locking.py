@@ -0,0 +1,85 @@
+'''
+File locking for the data files
+- Shared locks for reads, exclusive locks for writes
+- One "<table>.lock" file next to each data file is what gets locked,
+  so the data file itself can be replaced atomically while locked
+- Locks are re-entrant within a thread: holding the exclusive lock
+  covers any shared lock taken further down the call stack. Other
+  threads and processes open their own lock handle and wait normally
+'''
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Per thread: lock path -> {"fd", "mode", "depth"} for locks it holds
+_local = threading.local()
+
+
+def lock_path(source):
+    return os.path.splitext(os.path.abspath(source))[0] + ".lock"
+
+
+def _acquire(fd, exclusive):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    else:
+        # msvcrt only has exclusive locks, so readers serialise too
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _release(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _lock(source, exclusive):
+    path = lock_path(source)
+    if not hasattr(_local, "held"):
+        _local.held = {}
+
+    held = _local.held.get(path)
+    if held is not None:
+        if exclusive and held["mode"] == "shared":
+            raise RuntimeError("Cannot upgrade a shared lock to exclusive.")
+        held["depth"] += 1
+    else:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _acquire(fd, exclusive)
+        except BaseException:
+            os.close(fd)
+            raise
+        held = _local.held[path] = {
+            "fd": fd,
+            "mode": "exclusive" if exclusive else "shared",
+            "depth": 1,
+        }
+    try:
+        yield
+    finally:
+        held["depth"] -= 1
+        if held["depth"] == 0:
+            del _local.held[path]
+            _release(held["fd"])
+            os.close(held["fd"])
+
+
+def shared_lock(source):
+    """Context manager holding a shared (read) lock on source."""
+    return _lock(source, exclusive=False)
+
+
+def exclusive_lock(source):
+    """Context manager holding an exclusive (write) lock on source."""
+    return _lock(source, exclusive=True)
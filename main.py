@@ -1,19 +1,19 @@
 # main.py
 import utils
 import admin
+import auth
 import os
+import profiling
 
 ##login
 ##current file path
 current_path = os.path.dirname(os.path.abspath(__file__))
-user_data = os.path.join(current_path, "data/user.txt")
+user_data = admin.user_source  # data/user.txt unless HEALTHPLUS_DATA_DIR says otherwise
 #global record variable
 current_user_record = {}
 
 #login function
 def login():
-    records = utils.read_records(user_data)
-
     for attempt in range(3):
         if attempt > 0:
             print(f"Attempt {attempt+1} of 3.")
@@ -21,11 +21,8 @@ def login():
         username = input("Enter username: ").strip()
         password = input("Enter password: ").strip()
 
-        user = next(
-            (u for u in records
-             if u.get("username") == username and u.get("password") == password),
-            None
-        )
+        # Username index lookup plus a salted hash check
+        user = auth.authenticate(user_data, username, password)
 
         if user:
             global current_user
@@ -41,7 +38,7 @@ def login():
 
 #run..... of course we're going to run the main program
 def main_menu():
-    os.system('cls||clear')
+    utils.clear_screen()
     print("HealthPlus Management System")
     login_success = login()
     if login_success:
@@ -56,6 +53,7 @@ def main_menu():
             print("You do not have permission to access the system.")
 
 if __name__ == "__main__":
+    profiling.enable_from_env()
     while True:
         main_menu()
         restart = input("Do you want to login again? (yes/no): ")
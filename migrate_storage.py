@@ -0,0 +1,68 @@
+'''
+Copy the clinic tables between storage backends
+- to-sqlite: data/*.txt JSON files -> tables of data/healthplus.db
+- to-json: the other way round
+- The source side is left as it was; switch over by setting
+  HEALTHPLUS_STORAGE=sqlite (or json) afterwards
+- Tables split by month (partitions.py) are copied partition by
+  partition, each into its own month folder
+
+Usage: python migrate_storage.py to-sqlite [--data-dir data]
+'''
+
+import argparse
+import os
+import time
+
+import partitions
+import utils
+
+TABLE_FILES = ("user.txt", "appointment.txt", "medicine.txt", "income.txt")
+
+
+def migrate(folder, target):
+    """Copy every table in folder into the target backend.
+
+    Returns {file name: records copied}; tables missing on the source
+    side are skipped.
+    """
+    origin = "json" if target == "sqlite" else "sqlite"
+    saved = utils.STORAGE_BACKEND
+    copied = {}
+    try:
+        paths = [path for name in TABLE_FILES
+                 for path in partitions.partition_sources(os.path.join(folder, name))]
+        for path in paths:
+            name = os.path.relpath(path, folder)
+            utils.STORAGE_BACKEND = origin
+            if utils.table_stamp(path) is None:
+                continue
+            records = utils.read_records(path)
+
+            utils.STORAGE_BACKEND = target
+            copied[name] = utils.replace_records(path, records)
+            if len(utils.read_records(path)) != len(records):
+                raise RuntimeError(f"{name}: copy has a different record count")
+    finally:
+        utils.STORAGE_BACKEND = saved
+        utils.clear_cache()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("direction", choices=["to-sqlite", "to-json"])
+    parser.add_argument("--data-dir", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    copied = migrate(args.data_dir, args.direction[3:])
+    for name, count in copied.items():
+        print(f"{name}: {count} record(s)")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+'''
+Monthly partitions for appointment.txt and income.txt
+- Optional layout: data/appointment.txt becomes one table per month,
+  data/appointment.parts/2025-03/appointment.txt and so on, listed in
+  data/appointment.parts/manifest.json together with the date field
+  they are split on. Records without a usable date go to an "undated"
+  partition
+- Every partition is an ordinary utils table with the original file
+  name, so the cache, journal, indexes, aggregates and SQLite backend
+  work on each one unchanged
+- The functions below take the original source path and work for both
+  layouts: unpartitioned tables go straight to utils. Date range queries
+  (find_range/count_by on a date field, iter_records with date_from /
+  date_to) only open the months overlapping the range
+- Income records have no date of their own: bills that carry a "date"
+  are routed by it, older bills stay in "undated" and are read by every
+  income query (there is no range to prune by there)
+- "python partitions.py split" migrates the single files (the old file
+  is kept as <table>.txt.unpartitioned); "join" goes back
+
+Usage: python partitions.py split|join [--data-dir data] [--tables appointment income]
+'''
+
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+
+import locking
+import sqlite_store
+import utils
+
+DEFAULT_FIELD = "date"
+UNDATED = "undated"
+_MONTH = re.compile(r"\d{4}-\d{2}")
+_ID_PREFIX = re.compile(r"([A-Za-z]+)\d+$")
+
+# manifest path -> (file stamp, manifest)
+_manifests = {}
+
+
+# ---------------------------------------------------
+# Layout
+# ---------------------------------------------------
+def parts_dir(source):
+    return os.path.splitext(os.path.abspath(source))[0] + ".parts"
+
+
+def _manifest_path(source):
+    return os.path.join(parts_dir(source), "manifest.json")
+
+
+def partition_source(source, key):
+    """Path of one partition's table, e.g. .../appointment.parts/2025-03/appointment.txt."""
+    return os.path.join(parts_dir(source), key, os.path.basename(source))
+
+
+def partition_key(value):
+    """"2025-03" for any value starting with a YYYY-MM month, else UNDATED."""
+    value = str(value or "")
+    return value[:7] if _MONTH.match(value) else UNDATED
+
+
+def read_manifest(source):
+    """The manifest of source, None when the table is not partitioned."""
+    path = _manifest_path(source)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _manifests.pop(path, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _manifests.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, "r") as file:
+            cached = _manifests[path] = (stamp, json.load(file))
+    return cached[1]
+
+
+def _write_manifest(source, manifest):
+    path = _manifest_path(source)
+    temp = path + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(temp, path)
+
+
+def is_partitioned(source):
+    return read_manifest(source) is not None
+
+
+def partition_sources(source, date_from=None, date_to=None):
+    """Table paths holding source's records, oldest month first.
+
+    With a date range, only months overlapping it (and no undated
+    partition). For an unpartitioned table, just [source].
+    """
+    manifest = read_manifest(source)
+    if manifest is None:
+        return [os.path.abspath(source)]
+    keys = sorted(manifest["partitions"])
+    if date_from is not None or date_to is not None:
+        low = str(date_from or "")[:7]
+        high = str(date_to or "9999-99")[:7]
+        keys = [k for k in keys if k != UNDATED and low <= k <= high]
+    else:
+        # Undated rows first, as they are the oldest
+        keys = [k for k in keys if k == UNDATED] + [k for k in keys if k != UNDATED]
+    return [partition_source(source, k) for k in keys]
+
+
+def table_stamps(source):
+    """{table path: utils stamp} of every partition (or of source itself)."""
+    return {path: utils.table_stamp(path) for path in partition_sources(source)}
+
+
+def owner(path):
+    """The original source of a partition path, None for other paths."""
+    folder = os.path.dirname(os.path.dirname(path))
+    if not folder.endswith(".parts"):
+        return None
+    return os.path.join(os.path.dirname(folder),
+                        os.path.basename(folder)[:-len(".parts")] + os.path.splitext(path)[1])
+
+
+# ---------------------------------------------------
+# Reading
+# ---------------------------------------------------
+def iter_records(source, headers=None, predicate=None, date_from=None, date_to=None):
+    """utils.iter_records over the partitions, optionally within a date range.
+
+    The range applies to the manifest's date field, both ends inclusive
+    and compared as strings like find_range does.
+    """
+    manifest = read_manifest(source)
+    if date_from is not None or date_to is not None:
+        field = manifest["field"] if manifest else DEFAULT_FIELD
+        inner = predicate
+
+        def predicate(record):
+            value = str(record.get(field, ""))
+            return ((date_from is None or value >= str(date_from))
+                    and (date_to is None or value <= str(date_to))
+                    and (inner is None or inner(record)))
+
+    for path in partition_sources(source, date_from, date_to):
+        yield from utils.iter_records(path, headers, predicate)
+
+
+def read_records(source, headers=None):
+    return list(iter_records(source, headers))
+
+
+def find_record(source, mode, filters):
+    return [r for path in partition_sources(source)
+            for r in utils.find_record(path, mode, filters)]
+
+
+def _range_sources(source, fields, low, high):
+    # The months to open: fields before the date field must be pinned to
+    # one value (low == high there) for the date bounds to mean anything
+    manifest = read_manifest(source)
+    if manifest is None:
+        return [os.path.abspath(source)]
+    field = manifest["field"]
+    if field not in fields:
+        return partition_sources(source)
+    at = list(fields).index(field)
+    if len(low) <= at or len(high) <= at or tuple(low[:at]) != tuple(high[:at]):
+        return partition_sources(source)
+    return partition_sources(source, low[at], high[at])
+
+
+def find_range(source, fields, low, high):
+    """utils.find_range over the months overlapping the date bounds.
+
+    Results are in field order when the date field comes first after
+    the pinned fields (e.g. ("status", "date", "time") with one status).
+    """
+    return [r for path in _range_sources(source, fields, low, high)
+            for r in utils.find_range(path, fields, low, high)]
+
+
+def count_by(source, fields, low, high, group_fields):
+    counts = Counter()
+    for path in _range_sources(source, fields, low, high):
+        counts.update(utils.count_by(path, fields, low, high, group_fields))
+    return counts
+
+
+def join_records(left_source, left_filters, right_source, on):
+    """utils.join_records for sources that may be partitioned."""
+    if not is_partitioned(left_source) and not is_partitioned(right_source):
+        return utils.join_records(left_source, left_filters, right_source, on)
+    lefts = find_record(left_source, "and", left_filters)
+    keys = {left.get(on) for left in lefts if left.get(on)}
+    matches = {}
+    for record in iter_records(right_source, predicate=lambda r: r.get(on) in keys):
+        matches.setdefault(record[on], []).append(record)
+    return [(left, matches.get(left.get(on), []) if left.get(on) else []) for left in lefts]
+
+
+# ---------------------------------------------------
+# Writing
+# ---------------------------------------------------
+def _route(source, manifest, record):
+    """Partition path for record, adding the month to the manifest if new."""
+    key = partition_key(record.get(manifest["field"]))
+    if key not in manifest["partitions"]:
+        manifest["partitions"].append(key)
+        manifest["partitions"].sort()
+        os.makedirs(os.path.dirname(partition_source(source, key)), exist_ok=True)
+        _write_manifest(source, manifest)
+    return partition_source(source, key)
+
+
+def add_records(source, records, quiet=False):
+    """Add records, each to the partition of its month. Returns how many."""
+    with locking.exclusive_lock(source):
+        manifest = read_manifest(source)
+        if manifest is None:
+            return utils.add_records(source, records, quiet)
+        records = list(records)
+        groups = {}
+        for record in records:
+            groups.setdefault(_route(source, manifest, record), []).append(record)
+        count = sum(utils.add_records(path, rows, quiet) for path, rows in groups.items())
+        utils.advance_ids(source, records)  # The sequences live with the table
+        return count
+
+
+def add_record(source, values, quiet=False):
+    with locking.exclusive_lock(source):
+        manifest = read_manifest(source)
+        if manifest is None:
+            return utils.add_record(source, values, quiet)
+        utils.add_record(_route(source, manifest, values), values, quiet)
+        utils.advance_ids(source, [values])
+
+
+def _locate(source, record_id):
+    """(partition path, record) holding record_id, newest month first."""
+    manifest = read_manifest(source)
+    for path in reversed(partition_sources(source)):
+        found = utils.find_record(path, "and", {manifest["id_field"]: record_id})
+        found = [r for r in found if r.get(manifest["id_field"]) == record_id]
+        if found:
+            return path, found[0]
+    return None, None
+
+
+def _moves(manifest, path, updates):
+    """Does an update change the month of the record stored at path?"""
+    field = manifest["field"]
+    return (field in updates
+            and partition_key(updates[field]) != os.path.basename(os.path.dirname(path)))
+
+
+def _move(source, manifest, path, record, updates):
+    """Apply updates to record and move it to the partition of its new month.
+
+    The record is added there before it is deleted here: a crash in
+    between leaves a duplicate (the old copy has the lower version),
+    never a lost record.
+    """
+    moved = {k: updates.get(k, v) for k, v in record.items()}
+    moved[utils.VERSION_FIELD] = utils.record_version(record) + 1
+    utils.add_record(_route(source, manifest, moved), moved, quiet=True)
+    utils.delete_record(path, record[manifest["id_field"]], quiet=True)
+
+
+def update_record(source, record_id, updates, expected_version=None, quiet=False):
+    """utils.update_record; a changed date moves the record to its new month."""
+    with locking.exclusive_lock(source):
+        manifest = read_manifest(source)
+        if manifest is None:
+            return utils.update_record(source, record_id, updates, expected_version, quiet)
+        path, record = _locate(source, record_id)
+        if path is None:
+            if not quiet:
+                print("Record not found!")
+            return 0
+        if not _moves(manifest, path, updates):
+            return utils.update_record(path, record_id, updates, expected_version, quiet)
+
+        if expected_version is not None and utils.record_version(record) != expected_version:
+            raise utils.ConflictError(
+                f"Record {record_id} is at version {utils.record_version(record)}, "
+                f"expected {expected_version}.")
+        _move(source, manifest, path, record, updates)
+        if not quiet:
+            print("Record updated successfully!")
+        return 1
+
+
+def _update_batches(groups, quiet):
+    count = sum(utils.update_records(path, batch, quiet) for path, batch in groups.items())
+    groups.clear()
+    return count
+
+
+def update_records(source, changes, quiet=False):
+    """utils.update_records, one batch per partition; changed months move records."""
+    with locking.exclusive_lock(source):
+        manifest = read_manifest(source)
+        if manifest is None:
+            return utils.update_records(source, changes, quiet)
+        count = 0
+        groups = {}  # partition path -> [(record ID, updates)] not written yet
+        for record_id, updates in changes:
+            path, _ = _locate(source, record_id)
+            if path is None:
+                continue
+            if not _moves(manifest, path, updates):
+                groups.setdefault(path, []).append((record_id, updates))
+                continue
+            # Earlier updates in the batch land first, the move then copies
+            # the record as they left it
+            count += _update_batches(groups, quiet)
+            path, record = _locate(source, record_id)
+            _move(source, manifest, path, record, updates)
+            count += 1
+        return count + _update_batches(groups, quiet)
+
+
+def delete_record(source, record_id, expected_version=None, quiet=False):
+    with locking.exclusive_lock(source):
+        if not is_partitioned(source):
+            return utils.delete_record(source, record_id, expected_version, quiet)
+        path, _ = _locate(source, record_id)
+        if path is None:
+            if not quiet:
+                print("Record not found!")
+            return 0
+        return utils.delete_record(path, record_id, expected_version, quiet)
+
+
+# ---------------------------------------------------
+# Migration
+# ---------------------------------------------------
+def split(source, field=DEFAULT_FIELD):
+    """Move a single-file table into monthly partitions.
+
+    Returns {partition key: record count}. The ID sequences are seeded
+    from the table first, so new IDs keep counting from the old ones.
+    """
+    path = os.path.abspath(source)
+    with locking.exclusive_lock(path):
+        if is_partitioned(path):
+            raise ValueError(f"{path} is already partitioned")
+        utils.compact_journal(path)
+        records = utils.read_records(path)
+        if not records:
+            raise ValueError(f"{path} has no records to partition")
+
+        id_field = next((k for r in records for k in r if k.lower().endswith("id")), None)
+        prefixes = {m.group(1) for r in records
+                    for m in [_ID_PREFIX.match(str(r.get(id_field, "")))] if m}
+        for prefix in sorted(prefixes):
+            utils.next_ids(path, prefix, 0)
+
+        groups = {}
+        for record in records:
+            groups.setdefault(partition_key(record.get(field)), []).append(record)
+        for key, rows in groups.items():
+            os.makedirs(os.path.dirname(partition_source(path, key)), exist_ok=True)
+            utils.replace_records(partition_source(path, key), rows)
+
+        _write_manifest(path, {"field": field, "id_field": id_field,
+                               "partitions": sorted(groups)})
+        _retire(path)
+    return {key: len(rows) for key, rows in sorted(groups.items())}
+
+
+def _retire(path):
+    # The single file is no longer read; keep it next to the partitions
+    if utils.STORAGE_BACKEND == "sqlite":
+        utils.replace_records(path, [])
+    elif os.path.exists(path):
+        os.replace(path, path + ".unpartitioned")
+    utils.clear_cache(path)
+
+
+def join(source):
+    """Put the partitions back into one table. Returns the record count."""
+    path = os.path.abspath(source)
+    with locking.exclusive_lock(path):
+        if not is_partitioned(path):
+            raise ValueError(f"{path} is not partitioned")
+        parts = partition_sources(path)
+        records = list(itertools.chain.from_iterable(utils.iter_records(p) for p in parts))
+        utils.replace_records(path, records)
+        os.remove(_manifest_path(path))
+        _manifests.pop(_manifest_path(path), None)
+        for part in parts:
+            utils.clear_cache(part)
+        sqlite_store.close_all()  # Each month folder has its own database
+        shutil.rmtree(parts_dir(path))
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["split", "join"])
+    parser.add_argument("--data-dir", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data"))
+    parser.add_argument("--tables", nargs="+", default=["appointment", "income"])
+    args = parser.parse_args()
+
+    for table in args.tables:
+        source = os.path.join(args.data_dir, table + ".txt")
+        start = time.perf_counter()
+        try:
+            if args.action == "split":
+                counts = split(source)
+                print(f"{table}: {sum(counts.values())} record(s) in {len(counts)} partition(s)")
+            else:
+                print(f"{table}: {join(source)} record(s) back in {table}.txt")
+        except ValueError as e:
+            print(f"{table}: {e}")
+            continue
+        print(f"  done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+'''
+Opt-in profiling of the data layer and the admin reports
+- enable() swaps the functions of utils and admin (and any other module
+  named) for timing wrappers; disable() puts the originals back, so
+  nothing is measured, and nothing costs extra, unless it is on
+- Per function: calls, inclusive and self wall time, and the bytes and
+  records read from disk, written to disk and scanned by queries while
+  it ran (reported by utils through its _trace hook)
+- Generators are timed while they run, not while they wait for the
+  caller, so iter_records and pretty_print_records are charged fairly
+- summary() gives a table for the session; write_trace() saves it as
+  JSON, and "python profiling.py compare OLD NEW" lines two up
+- HEALTHPLUS_PROFILE=trace.json turns it on for main.py, cli.py and
+  server.py and writes the trace (plus a summary on stderr) at exit
+
+Usage: python profiling.py compare old.json new.json [--limit 30]
+       python profiling.py show trace.json [--sort self]
+'''
+
+import argparse
+import atexit
+import functools
+import importlib
+import inspect
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+
+import utils
+
+MODULES = ("utils", "admin")
+# Private utils functions worth seeing on their own: disk, journal, indexes
+HOT_PATHS = {
+    "utils": ("_load_entry", "_load_entry_sqlite", "_save_records", "_append_journal",
+              "_read_journal", "_mutate", "_stream_table", "_get_index", "_get_sorted_index"),
+}
+# Called once per record as filters; wrapping them would drown the rest
+SKIP = {
+    "admin": ("is_patient", "format_user_id_with_name"),
+    "utils": ("record_version", "clear_screen"),
+}
+COUNTERS = ("bytes_read", "bytes_written", "records_read", "records_written",
+            "records_scanned")
+_EVENT_COUNTERS = {
+    "read": ("bytes_read", "records_read"),
+    "write": ("bytes_written", "records_written"),
+    "scan": (None, "records_scanned"),
+}
+
+_originals = {}  # (module name, function name) -> original function
+_stats = {}      # "module.function" -> {"calls", "total", "self", counters...}
+_totals = dict.fromkeys(COUNTERS, 0)
+_local = threading.local()  # Per thread: stack of open frames
+_session = {"started": None}
+
+
+# ---------------------------------------------------
+# Frames
+# ---------------------------------------------------
+# A frame is [name, start time, time spent in wrapped callees, counters].
+# Counters collect everything reported while the frame is open, callees
+# included; self time leaves the callees out.
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _enter(name):
+    frame = [name, time.perf_counter(), 0.0, dict.fromkeys(COUNTERS, 0)]
+    _stack().append(frame)
+    return frame
+
+
+def _leave(frame, count_call):
+    elapsed = time.perf_counter() - frame[1]
+    stack = _stack()
+    stack.pop()
+    if stack:
+        stack[-1][2] += elapsed
+        parent = stack[-1][3]
+        for key, value in frame[3].items():
+            parent[key] += value
+
+    stats = _stats.get(frame[0])
+    if stats is None:
+        stats = _stats[frame[0]] = {"calls": 0, "total": 0.0, "self": 0.0,
+                                    **dict.fromkeys(COUNTERS, 0)}
+    stats["calls"] += count_call
+    stats["total"] += elapsed
+    stats["self"] += elapsed - frame[2]
+    for key, value in frame[3].items():
+        stats[key] += value
+
+
+def _on_trace(event, nbytes, records):
+    byte_key, record_key = _EVENT_COUNTERS[event]
+    stack = _stack()
+    counters = stack[-1][3] if stack else _totals
+    if byte_key:
+        counters[byte_key] += nbytes
+    counters[record_key] += records
+    if stack:
+        # Frames pass their counters up when they close; the session
+        # totals are counted here, once
+        if byte_key:
+            _totals[byte_key] += nbytes
+        _totals[record_key] += records
+
+
+def _wrap(name, func):
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            # Each resume is a frame of its own; only the first counts a call
+            frame = _enter(name)
+            try:
+                gen = func(*args, **kwargs)
+            finally:
+                _leave(frame, True)
+            try:
+                sent = None
+                while True:
+                    frame = _enter(name)
+                    try:
+                        item = gen.send(sent)
+                    except StopIteration as stop:
+                        return stop.value
+                    finally:
+                        _leave(frame, False)
+                    sent = yield item
+            finally:
+                gen.close()  # A caller stopping early releases files and locks now
+        return generator
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        frame = _enter(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _leave(frame, True)
+    return wrapper
+
+
+# ---------------------------------------------------
+# Switching on and off
+# ---------------------------------------------------
+def _targets(module):
+    name = module.__name__
+    hot = HOT_PATHS.get(name, ())
+    skip = SKIP.get(name, ())
+    for attr, value in list(vars(module).items()):
+        if not inspect.isfunction(value) or value.__module__ != name or attr in skip:
+            continue
+        if attr.startswith("_") and attr not in hot:
+            continue
+        yield attr, value
+
+
+def enable(modules=MODULES):
+    """Start profiling the functions of the named modules."""
+    if _session["started"] is None:
+        _session["started"] = datetime.now().isoformat(timespec="seconds")
+    for module_name in modules:
+        module = importlib.import_module(module_name)
+        for attr, func in _targets(module):
+            if (module_name, attr) in _originals:
+                continue
+            _originals[(module_name, attr)] = func
+            setattr(module, attr, _wrap(f"{module_name}.{attr}", func))
+    utils._trace = _on_trace
+
+
+def disable():
+    """Put the original functions back; the numbers so far are kept."""
+    utils._trace = None
+    for (module_name, attr), func in _originals.items():
+        setattr(sys.modules[module_name], attr, func)
+    _originals.clear()
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def reset():
+    """Forget the numbers collected so far."""
+    _stats.clear()
+    _totals.update(dict.fromkeys(COUNTERS, 0))
+    _session["started"] = datetime.now().isoformat(timespec="seconds") if _originals else None
+
+
+# ---------------------------------------------------
+# Reporting
+# ---------------------------------------------------
+def results():
+    """{"meta", "totals", "functions": {name: stats}} with times in ms."""
+    functions = {}
+    for name, stats in _stats.items():
+        functions[name] = {
+            **stats,
+            "total": round(stats["total"] * 1000, 3),
+            "self": round(stats["self"] * 1000, 3),
+        }
+    return {
+        "meta": {
+            "started": _session["started"],
+            "written": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": utils.STORAGE_BACKEND,
+            "journal": utils.JOURNAL_MODE,
+        },
+        "totals": dict(_totals),
+        "functions": functions,
+    }
+
+
+def write_trace(path):
+    with open(path, "w") as file:
+        json.dump(results(), file, indent=4)
+
+
+def _kib(value):
+    return f"{value / 1024:.1f}"
+
+
+def format_summary(trace, sort="total", limit=30):
+    """Table of the functions in a results() dict, slowest first."""
+    rows = sorted(trace["functions"].items(), key=lambda item: item[1][sort], reverse=True)
+    lines = [f"{'function':<34} {'calls':>8} {'total ms':>10} {'self ms':>10} "
+             f"{'read KiB':>10} {'wrote KiB':>10} {'rec read':>9} {'scanned':>9}"]
+    for name, s in rows[:limit]:
+        lines.append(f"{name:<34} {s['calls']:>8} {s['total']:>10.2f} {s['self']:>10.2f} "
+                     f"{_kib(s['bytes_read']):>10} {_kib(s['bytes_written']):>10} "
+                     f"{s['records_read']:>9} {s['records_scanned']:>9}")
+    totals = trace["totals"]
+    lines.append(f"\nread {_kib(totals['bytes_read'])} KiB / {totals['records_read']} records, "
+                 f"wrote {_kib(totals['bytes_written'])} KiB / {totals['records_written']} "
+                 f"records, scanned {totals['records_scanned']} records")
+    return "\n".join(lines)
+
+
+def summary(sort="total", limit=30):
+    return format_summary(results(), sort, limit)
+
+
+def format_comparison(old, new, limit=30):
+    """Per function total ms and calls of two traces, biggest change first."""
+    names = set(old["functions"]) | set(new["functions"])
+    empty = {"calls": 0, "total": 0.0, "records_scanned": 0}
+    rows = []
+    for name in names:
+        o = old["functions"].get(name, empty)
+        n = new["functions"].get(name, empty)
+        rows.append((abs(n["total"] - o["total"]), name, o, n))
+    rows.sort(reverse=True)
+
+    lines = [f"{'function':<34} {'old ms':>10} {'new ms':>10} {'ratio':>7} "
+             f"{'old calls':>9} {'new calls':>9} {'old scan':>9} {'new scan':>9}"]
+    for _, name, o, n in rows[:limit]:
+        ratio = f"{n['total'] / o['total']:.2f}" if o["total"] else "new"
+        lines.append(f"{name:<34} {o['total']:>10.2f} {n['total']:>10.2f} {ratio:>7} "
+                     f"{o['calls']:>9} {n['calls']:>9} "
+                     f"{o['records_scanned']:>9} {n['records_scanned']:>9}")
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------
+# HEALTHPLUS_PROFILE
+# ---------------------------------------------------
+def _finish(path):
+    disable()
+    write_trace(path)
+    print(f"\n--- Profile (trace written to {path}) ---", file=sys.stderr)
+    print(summary(), file=sys.stderr)
+
+
+def enable_from_env():
+    """Profile this process if HEALTHPLUS_PROFILE names a trace file."""
+    path = os.environ.get("HEALTHPLUS_PROFILE")
+    if not path or is_enabled():
+        return
+    enable()
+    atexit.register(_finish, os.path.abspath(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="summary table of a trace file")
+    show.add_argument("trace")
+    show.add_argument("--sort", default="total", choices=["total", "self", "calls"] + list(COUNTERS))
+    show.add_argument("--limit", type=int, default=30)
+    compare = commands.add_parser("compare", help="two trace files side by side")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        with open(args.trace) as file:
+            print(format_summary(json.load(file), args.sort, args.limit))
+        return
+    traces = []
+    for path in (args.old, args.new):
+        with open(path) as file:
+            traces.append(json.load(file))
+    print(format_comparison(*traces, limit=args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+'''
+Doctor availability and double-booking checks
+- Per doctor, the start times of their live (not cancelled)
+  appointments are kept sorted, as minutes since year 1; every
+  appointment lasts APPOINTMENT_MINUTES
+- A conflict check is two bisects into one doctor's list; free slots
+  come from walking the slot grid alongside that list
+- Built once per appointment file and kept in sync through utils change
+  notifications, like the fuzzy search index
+- book() checks and adds under the table's exclusive lock, so two
+  sessions cannot take the same slot
+- Works on monthly partitions too (see partitions.py): one index covers
+  every month, with a stamp per partition
+'''
+
+import heapq
+import itertools
+import os
+from bisect import bisect_left, insort
+from datetime import date, datetime
+
+import locking
+import partitions
+import utils
+
+APPOINTMENT_MINUTES = 30
+DAY_START = "08:00"  # First slot of the day
+DAY_END = "17:00"    # Every appointment ends by then
+SEARCH_DAYS = 90     # How far ahead next_free_slots looks
+FREE_STATUSES = {"cancelled"}  # Appointments that do not hold their slot
+
+# abs path -> {"stamp": {table path: stamp}, "doctors": {doctor ID: sorted [(start minute, aptID)]}}
+_indexes = {}
+
+
+class SlotTakenError(Exception):
+    """The doctor already has an appointment overlapping that slot."""
+
+
+# ---------------------------------------------------
+# Time helpers
+# ---------------------------------------------------
+def _clock(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _minute(day, time):
+    """Minutes since year 1 of "YYYY-MM-DD", "HH:MM"; None if malformed."""
+    try:
+        return (date(int(day[0:4]), int(day[5:7]), int(day[8:10])).toordinal() * 1440
+                + _clock(time))
+    except (TypeError, ValueError):
+        return None
+
+
+def _format(minute):
+    day, clock = divmod(minute, 1440)
+    return date.fromordinal(day).strftime("%Y-%m-%d"), f"{clock // 60:02d}:{clock % 60:02d}"
+
+
+def _grid():
+    first, last = _clock(DAY_START), _clock(DAY_END) - APPOINTMENT_MINUTES
+    return range(first, last + 1, APPOINTMENT_MINUTES)
+
+
+# ---------------------------------------------------
+# Index
+# ---------------------------------------------------
+def _entry(record):
+    """(doctor, (start, aptID)) for a slot-holding appointment, else None."""
+    if record.get("status") in FREE_STATUSES or record.get("doctor") is None:
+        return None
+    start = _minute(record.get("date"), record.get("time"))
+    if start is None:
+        return None
+    return str(record["doctor"]), (start, str(record.get("aptID", "")))
+
+
+def _get_index(source):
+    path = os.path.abspath(source)
+    stamp = partitions.table_stamps(path)
+    index = _indexes.get(path)
+    if index is None or index["stamp"] != stamp:
+        doctors = {}
+        for record in partitions.iter_records(path):
+            item = _entry(record)
+            if item is not None:
+                doctors.setdefault(item[0], []).append(item[1])
+        for bookings in doctors.values():
+            bookings.sort()
+        index = _indexes[path] = {"stamp": stamp, "doctors": doctors}
+    return index
+
+
+def _remove(bookings, item):
+    i = bisect_left(bookings, item)
+    if i < len(bookings) and bookings[i] == item:
+        del bookings[i]
+
+
+def on_change(path, old_stamp, new_stamp, changes):
+    index = _indexes.get(partitions.owner(path) or path)
+    if index is None or index["stamp"].get(path) != old_stamp:
+        return  # Not built or already stale, rebuilt on next use
+    doctors = index["doctors"]
+    for old, new in changes:
+        item = _entry(old) if old is not None else None
+        if item is not None and item[0] in doctors:
+            _remove(doctors[item[0]], item[1])
+        item = _entry(new) if new is not None else None
+        if item is not None:
+            insort(doctors.setdefault(item[0], []), item[1])
+    index["stamp"][path] = new_stamp
+
+
+utils.add_listener(on_change)
+
+
+# ---------------------------------------------------
+# Queries
+# ---------------------------------------------------
+def conflicts(source, doctor, day, time, ignore=None):
+    """aptIDs of the doctor's appointments overlapping a slot at day/time.
+
+    ignore is an aptID to leave out, e.g. the appointment being moved.
+    """
+    start = _minute(day, time)
+    if start is None:
+        raise ValueError(f"Bad date/time: {day!r} {time!r}")
+    bookings = _get_index(source)["doctors"].get(str(doctor), [])
+    # Equal lengths: overlap means starting less than one length apart
+    low = bisect_left(bookings, (start - APPOINTMENT_MINUTES + 1,))
+    high = bisect_left(bookings, (start + APPOINTMENT_MINUTES,))
+    return [apt_id for _, apt_id in bookings[low:high] if apt_id != ignore]
+
+
+def is_free(source, doctor, day, time):
+    return not conflicts(source, doctor, day, time)
+
+
+def _free_minutes(bookings, start, end):
+    """Yield the free grid slots of one doctor from start to before end."""
+    grid = _grid()
+    i = bisect_left(bookings, (start - APPOINTMENT_MINUTES + 1,))
+    for day in range(start // 1440, (end - 1) // 1440 + 1):
+        for clock in grid:
+            slot = day * 1440 + clock
+            if slot < start:
+                continue
+            if slot >= end:
+                return
+            while i < len(bookings) and bookings[i][0] <= slot - APPOINTMENT_MINUTES:
+                i += 1
+            if i < len(bookings) and bookings[i][0] < slot + APPOINTMENT_MINUTES:
+                continue
+            yield slot
+
+
+def _tagged(bookings, start, end, doctor):
+    for slot in _free_minutes(bookings, start, end):
+        yield slot, doctor
+
+
+def _now_minute(after):
+    after = after or datetime.now()
+    return after.toordinal() * 1440 + after.hour * 60 + after.minute
+
+
+def next_free_slots(source, n=5, doctor=None, after=None, doctors=None, days=SEARCH_DAYS):
+    """The n earliest free slots after a datetime (default now).
+
+    For one doctor, or else the earliest over every doctor in doctors
+    (default: every doctor with appointments; see doctor_ids).
+    Returns [{"doctor", "date", "time"}] in time order.
+    """
+    index = _get_index(source)["doctors"]
+    start = _now_minute(after)
+    end = (start // 1440 + days + 1) * 1440
+    if doctor is not None:
+        doctors = [doctor]
+    elif doctors is None:
+        doctors = sorted(index)
+
+    streams = [_tagged(index.get(str(d), []), start, end, d) for d in doctors]
+    result = []
+    for slot, d in itertools.islice(heapq.merge(*streams), n):
+        day, time = _format(slot)
+        result.append({"doctor": d, "date": day, "time": time})
+    return result
+
+
+def availability(source, date_from, date_to, doctors=None):
+    """{doctor: {date: [free times]}} for every day from date_from to date_to.
+
+    Days without a free slot are left out. doctors defaults to every
+    doctor with appointments.
+    """
+    index = _get_index(source)["doctors"]
+    start = _minute(date_from, "00:00")
+    end = _minute(date_to, "00:00")
+    if start is None or end is None:
+        raise ValueError(f"Bad date range: {date_from!r} to {date_to!r}")
+    end += 1440
+    if doctors is None:
+        doctors = sorted(index)
+
+    # Each date and time string is made once, not once per doctor
+    day_names, clock_names = {}, {}
+    result = {}
+    for d in doctors:
+        days = result[d] = {}
+        for slot in _free_minutes(index.get(str(d), []), start, end):
+            day, clock = divmod(slot, 1440)
+            if day not in day_names:
+                day_names[day] = date.fromordinal(day).strftime("%Y-%m-%d")
+            if clock not in clock_names:
+                clock_names[clock] = f"{clock // 60:02d}:{clock % 60:02d}"
+            days.setdefault(day_names[day], []).append(clock_names[clock])
+    return result
+
+
+def doctor_ids(user_source):
+    """IDs of the active doctors in user_source."""
+    return [u["userID"] for u in utils.find_record(user_source, "and", {"role": "doctor"})
+            if u.get("status", "active") == "active" and "userID" in u]
+
+
+# ---------------------------------------------------
+# Booking
+# ---------------------------------------------------
+def book(source, patient, doctor, day, time, status="pending"):
+    """Add an appointment if the doctor is free then; return the record.
+
+    Raises SlotTakenError if the slot overlaps another live appointment
+    of that doctor.
+    """
+    with locking.exclusive_lock(source):
+        clash = conflicts(source, doctor, day, time)
+        if clash:
+            raise SlotTakenError(f"{doctor} is already booked at {day} {time} ({', '.join(clash)})")
+        record = {
+            "aptID": utils.next_id(source, "A"),
+            "patient": patient,
+            "doctor": doctor,
+            "date": day,
+            "time": time,
+            "status": status,
+        }
+        partitions.add_record(source, record)
+    return record
+
+
+def cancel(source, apt_id):
+    """Mark an appointment cancelled, freeing its slot. Returns the match count."""
+    return partitions.update_record(source, apt_id, {"status": "cancelled"})
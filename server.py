@@ -0,0 +1,424 @@
+'''
+Local HTTP/JSON service for several front desks at once
+- asyncio server, one coroutine per connection, HTTP/1.1 keep-alive
+- The data files are parsed once by utils and shared from its in-memory
+  cache by every request
+- Reports and user listings run in worker threads, so a long report
+  does not hold up other requests and reads never wait for each other
+- Writes (add/update/delete user, password upgrades at login) take the
+  write side of a ReadWriteLock: one at a time, after the reads in
+  progress, so read-check-write steps cannot interleave and no report
+  sees the cached indexes half updated.
+  Other processes are kept out by the utils file locks as before.
+  The server writes in utils journal mode (one appended line per
+  change instead of rewriting the table) unless --no-journal is given.
+- PBKDF2 password hashing (~90 ms each) runs in a worker thread before
+  the write lock is taken, so it stalls neither other requests nor writes
+- Login gives a bearer token; like the terminal menu, only
+  administrators may use the rest of the API
+
+Endpoints (JSON in, JSON out):
+  POST   /login                     {"username", "password"} -> {"token"}
+  GET    /users?q=<name or ID>      matching users (user replies never
+                                    include the password hash)
+  POST   /users                     {"username", "password", "role", "age", "phone"}
+  GET    /users/<userID>
+  PATCH  /users/<userID>            {"password", "role", "age", "expected_version"}
+  DELETE /users/<userID>            optional ?expected_version=<n>
+  GET    /reports/patients          ?details=1
+  GET    /reports/appointments      ?status=&from=&to=&time_from=&time_to=
+  GET    /reports/income            ?detail=paid|unpaid
+  GET    /reports/staff
+  GET    /reports/medicine
+
+Usage: python server.py [--host 127.0.0.1] [--port 8080] [--data-dir data] [--no-journal]
+'''
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import secrets
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import admin
+import aggregates
+import auth
+import partitions
+import profiling
+import utils
+
+MAX_BODY_BYTES = 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized",
+               403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+# token -> userID of a logged in administrator
+_sessions = {}
+_lock = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds back new readers."""
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    @contextlib.asynccontextmanager
+    async def read(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writer and not self._waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def write(self):
+        async with self._condition:
+            self._waiting += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+def _read_handler(func):
+    """Run a blocking read-only handler in a worker thread, outside any write."""
+    @functools.wraps(func)
+    async def handler(*args):
+        async with _lock.read():
+            return await asyncio.to_thread(func, *args)
+    return handler
+
+
+def _get_user(user_id):
+    found = utils.find_record(admin.user_source, "and", {"userID": user_id})
+    user = next((u for u in found if u.get("userID") == user_id), None)
+    if user is None:
+        raise HTTPError(404, f"User not found: {user_id}")
+    return user
+
+
+def _role(value):
+    role = str(value).strip().lower()
+    if role not in admin.role_map:
+        raise HTTPError(400, f"Invalid role: {value!r}")
+    return admin.role_map[role]
+
+
+def _version(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "expected_version must be a number")
+
+
+# ---------------------------------------------------
+# Handlers: (query, body, user_id) -> (status, result)
+# ---------------------------------------------------
+async def login(query, body, user_id):
+    username = str(body.get("username", "")).strip()
+    password = str(body.get("password", "")).strip()
+    user = auth.find_user(admin.user_source, username)
+    if user is None or not await asyncio.to_thread(auth.verify_password, password,
+                                                   user.get("password")):
+        raise HTTPError(401, "Invalid username or password")
+    if auth.needs_rehash(user.get("password")):
+        new_hash = await asyncio.to_thread(auth.hash_password, password)
+        async with _lock.write():
+            auth.upgrade_password(admin.user_source, user, new_hash)
+    if user.get("role", "").lower() != "administrator":
+        raise HTTPError(403, "You do not have permission to access the system")
+
+    token = secrets.token_hex(16)
+    _sessions[token] = user["userID"]
+    return 200, {"token": token, "userID": user["userID"]}
+
+
+@_read_handler
+def list_users(query, body, user_id):
+    keyword = query.get("q")
+    if keyword:
+        return 200, [admin.public_user(u) for u in admin.find_users(keyword)]
+    return 200, [admin.public_user(u) for u in utils.iter_records(admin.user_source)]
+
+
+async def get_user(query, body, user_id, target):
+    return 200, admin.public_user(_get_user(target))
+
+
+async def add_user(query, body, user_id):
+    for field in ("username", "password", "role"):
+        if not body.get(field):
+            raise HTTPError(400, f"Missing field: {field}")
+    _role(body["role"])
+    password = await asyncio.to_thread(auth.hash_password, str(body["password"]))
+    async with _lock.write():
+        # quiet: utils prints a line per write, which would flood the server log
+        user = admin.create_user(str(body["username"]), password,
+                                 str(body.get("age", "")), str(body.get("phone", "")),
+                                 str(body["role"]), quiet=True)
+    return 201, admin.public_user(user)
+
+
+async def update_user(query, body, user_id, target):
+    updates = {}
+    if body.get("password"):
+        updates["password"] = await asyncio.to_thread(auth.hash_password,
+                                                      str(body["password"]))
+    if body.get("role"):
+        updates["role"] = _role(body["role"])
+    if body.get("age"):
+        updates["age"] = str(body["age"])
+    if not updates:
+        raise HTTPError(400, "Nothing to update")
+
+    expected = _version(body.get("expected_version"))
+    async with _lock.write():
+        user = _get_user(target)
+        if expected is not None and expected != utils.record_version(user):
+            raise HTTPError(409, "This user was changed in another session")
+        return 200, admin.public_user(admin.change_user(user, updates, quiet=True))
+
+
+async def delete_user(query, body, user_id, target):
+    expected = _version(query.get("expected_version"))
+    async with _lock.write():
+        user = admin.delete_user(target, expected_version=expected, quiet=True)
+    if user is None:
+        raise HTTPError(404, f"User not found: {target}")
+    return 200, admin.public_user(user)
+
+
+@_read_handler
+def report_patients(query, body, user_id):
+    result = {"total_patients": aggregates.get(admin.user_source, "total_patients")}
+    if query.get("details"):
+        result["patients"] = [admin.public_user(u) for u in admin.patient_records()]
+    return 200, result
+
+
+@_read_handler
+def report_appointments(query, body, user_id):
+    result = {
+        "confirmed_appointments": aggregates.get(admin.appointment_source,
+                                                 "confirmed_appointments"),
+        "next_7_days": admin.appointment_outlook(),
+    }
+    if query.get("status"):
+        result["appointments"] = admin.filter_appointments(
+            query["status"].lower(), query.get("from", "0000-00-00"),
+            query.get("to", "9999-99-99"), query.get("time_from", "00:00"),
+            query.get("time_to", "99:99"))
+    return 200, result
+
+
+@_read_handler
+def report_income(query, body, user_id):
+    result = dict(aggregates.get(admin.income_source))
+    if query.get("detail") == "paid":
+        result["paid"] = admin.paid_bills()
+    elif query.get("detail") == "unpaid":
+        result["unpaid"], result["related_appointments"] = admin.unpaid_bills()
+    return 200, result
+
+
+@_read_handler
+def report_staff(query, body, user_id):
+    return 200, {"staff_count": aggregates.get(admin.user_source, "staff_count"),
+                 "staff": admin.staff_members()}
+
+
+@_read_handler
+def report_medicine(query, body, user_id):
+    return 200, {"total_medicines": aggregates.get(admin.medicine_source, "total_medicines"),
+                 "medicines": admin.medicine_records(),
+                 "low_stock": admin.low_stock_medicines()}
+
+
+# (method, path) -> handler; "/users/" routes take the ID as an extra argument
+ROUTES = {
+    ("POST", "/login"): login,
+    ("GET", "/users"): list_users,
+    ("POST", "/users"): add_user,
+    ("GET", "/reports/patients"): report_patients,
+    ("GET", "/reports/appointments"): report_appointments,
+    ("GET", "/reports/income"): report_income,
+    ("GET", "/reports/staff"): report_staff,
+    ("GET", "/reports/medicine"): report_medicine,
+}
+USER_ROUTES = {"GET": get_user, "PATCH": update_user, "DELETE": delete_user}
+
+
+async def dispatch(method, target, headers, body):
+    url = urlsplit(target)
+    path = url.path.rstrip("/") or "/"
+    query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    if body:
+        try:
+            body = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+    else:
+        body = {}
+
+    extra = ()
+    handler = ROUTES.get((method, path))
+    if handler is None and path.startswith("/users/"):
+        handler = USER_ROUTES.get(method)
+        extra = (unquote(path[len("/users/"):]),)
+    if handler is None:
+        if any(p == path for _, p in ROUTES) or path.startswith("/users/"):
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    user_id = None
+    if handler is not login:
+        authorization = headers.get("authorization", "")
+        token = authorization[7:] if authorization.startswith("Bearer ") else None
+        user_id = _sessions.get(token)
+        if user_id is None:
+            raise HTTPError(401, "Login required")
+    return await handler(query, body, user_id, *extra)
+
+
+# ---------------------------------------------------
+# HTTP plumbing
+# ---------------------------------------------------
+async def read_request(reader):
+    """Return (method, target, version, headers, body) or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get("content-length", "").strip() or "0"
+    if not (length.isascii() and length.isdigit()):  # No signs, so never negative
+        raise HTTPError(400, f"Invalid Content-Length: {length!r}")
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+def write_response(writer, status, result, keep_alive):
+    payload = json.dumps(result, default=str).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode() + payload)
+
+
+async def handle_connection(reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HTTPError as e:
+                write_response(writer, e.status, {"error": str(e)}, False)
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if request is None:
+                break
+
+            method, target, version, headers, body = request
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+            try:
+                status, result = await dispatch(method, target, headers, body)
+            except HTTPError as e:
+                status, result = e.status, {"error": str(e)}
+            except utils.ConflictError as e:
+                status, result = 409, {"error": str(e)}
+            except Exception as e:
+                status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            write_response(writer, status, result, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+async def serve(host, port):
+    global _lock
+    _lock = ReadWriteLock()
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"HealthPlus service on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", help="folder with user.txt, appointment.txt, ...")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="rewrite the whole table on every change")
+    args = parser.parse_args()
+
+    profiling.enable_from_env()
+    if args.data_dir:
+        admin.set_data_dir(args.data_dir)
+    utils.JOURNAL_MODE = not args.no_journal
+    # Parse the tables up front so the first requests are not slow
+    for source in (admin.user_source, admin.appointment_source,
+                   admin.medicine_source, admin.income_source):
+        for path in partitions.partition_sources(source):
+            utils.read_records(path)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+'''
+Binary snapshot format for the data files
+- Lives next to each data/*.txt file as *.bin, the JSON stays the source
+  of truth and the snapshot is only trusted while it matches it
+- Rows are grouped in blocks. Each block stores the rows as one marshal
+  blob (fast full loads) and then one marshal blob per field holding a
+  list of that field's values, so a reader can decode just the fields
+  and blocks it needs
+- An offset table at the end of the file gives memory-mapped random
+  access to any block, and so to any row number
+
+File layout:
+    b"HPSNAP01" | u32 header length | header JSON
+    blocks: marshal.dumps(rows), then for each field marshal.dumps(values)
+    offset table: u64 start of every blob, plus the end offset
+    footer: u64 offset table position | u64 row count
+'''
+
+import json
+import marshal
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b"HPSNAP01"
+BLOCK_ROWS = 1024
+_FOOTER = struct.Struct("<QQ")
+_U32 = struct.Struct("<I")
+
+# Marks a field the record did not have (marshal can store Ellipsis)
+MISSING = ...
+
+
+# What decoding a damaged snapshot can raise (marshal, the mmap, short
+# or mistyped blocks); readers catch these and go back to the JSON file
+DECODE_ERRORS = (ValueError, EOFError, TypeError, IndexError, OSError)
+
+
+def snapshot_path(source):
+    return os.path.splitext(source)[0] + ".bin"
+
+
+# ---------------------------------------------------
+# Writing
+# ---------------------------------------------------
+def write_snapshot(path, records, fields, source_stamp, block_rows=BLOCK_ROWS):
+    """Write records (any iterable of dicts) to path atomically.
+
+    fields lists the columns stored for field-wise access.
+    source_stamp identifies the JSON file the snapshot was built from.
+    """
+    header = json.dumps({
+        "fields": list(fields),
+        "block_rows": block_rows,
+        "marshal": marshal.version,
+        "source": source_stamp,
+    }).encode("utf-8")
+
+    temp = path + ".tmp"
+    offsets = array("Q")
+    rows = 0
+    with open(temp, "wb") as file:
+        file.write(MAGIC)
+        file.write(_U32.pack(len(header)))
+        file.write(header)
+
+        def flush(block):
+            offsets.append(file.tell())
+            file.write(marshal.dumps(block))
+            for field in fields:
+                offsets.append(file.tell())
+                file.write(marshal.dumps([r.get(field, MISSING) for r in block]))
+
+        block = []
+        for record in records:
+            block.append(record)
+            rows += 1
+            if len(block) == block_rows:
+                flush(block)
+                block = []
+        if block:
+            flush(block)
+
+        offsets.append(file.tell())
+        table_pos = file.tell()
+        file.write(offsets.tobytes())
+        file.write(_FOOTER.pack(table_pos, rows))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+# ---------------------------------------------------
+# Reading
+# ---------------------------------------------------
+def open_snapshot(path):
+    """Memory-map a snapshot. Returns None if it is missing or unreadable."""
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    try:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        file.close()
+        return None  # Empty file
+
+    view = memoryview(mm)
+    try:
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError("bad magic")
+        (header_len,) = _U32.unpack_from(view, len(MAGIC))
+        start = len(MAGIC) + _U32.size
+        header = json.loads(bytes(view[start:start + header_len]))
+        if header["marshal"] > marshal.version:
+            raise ValueError("written by a newer Python")
+        table_pos, rows = _FOOTER.unpack_from(view, len(view) - _FOOTER.size)
+        offsets = view[table_pos:len(view) - _FOOTER.size].cast("Q")
+        blocks = -(-rows // header["block_rows"])
+        if len(offsets) != blocks * (len(header["fields"]) + 1) + 1:
+            offsets.release()
+            raise ValueError("offset table does not match the header")
+    except (ValueError, KeyError, TypeError, struct.error):
+        view.release()
+        mm.close()
+        file.close()
+        return None
+
+    return {
+        "file": file,
+        "mmap": mm,
+        "view": view,
+        "offsets": offsets,
+        "fields": header["fields"],
+        "block_rows": header["block_rows"],
+        "source": header["source"],
+        "rows": rows,
+    }
+
+
+def close_snapshot(snap):
+    snap["offsets"].release()
+    snap["view"].release()
+    snap["mmap"].close()
+    snap["file"].close()
+
+
+def block_count(snap):
+    return -(-snap["rows"] // snap["block_rows"])
+
+
+def _read_blob(snap, slot):
+    start, end = snap["offsets"][slot], snap["offsets"][slot + 1]
+    return marshal.loads(snap["view"][start:end])
+
+
+def read_column(snap, block, field):
+    """Decode one field of one block into a list (MISSING where absent)."""
+    k = snap["fields"].index(field)
+    return _read_blob(snap, block * (len(snap["fields"]) + 1) + 1 + k)
+
+
+def read_block(snap, block):
+    """Decode all rows of one block."""
+    return _read_blob(snap, block * (len(snap["fields"]) + 1))
+
+
+def get_row(snap, i):
+    """Return row number i as a dict."""
+    if not 0 <= i < snap["rows"]:
+        raise IndexError("snapshot row out of range")
+    block, pos = divmod(i, snap["block_rows"])
+    return read_block(snap, block)[pos]
+
+
+def load_rows(snap):
+    """Decode every row, in order."""
+    rows = []
+    for block in range(block_count(snap)):
+        rows.extend(read_block(snap, block))
+    if len(rows) != snap["rows"]:
+        raise ValueError("row count does not match the footer")
+    return rows
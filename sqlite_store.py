@@ -0,0 +1,216 @@
+'''
+SQLite storage engine (stdlib sqlite3)
+- One database per data folder ("healthplus.db"), one table per data
+  file: data/user.txt is table "user" in data/healthplus.db
+- Rows keep the whole record as JSON in insertion order (rowid), the
+  record ID, and a lowercased copy of each key field in its own indexed
+  "k_<field>" column, so ID and find_record lookups are index seeks
+  instead of whole-file reads
+- WAL journal: readers see a consistent snapshot and never block the
+  one writer; writers queue on BEGIN IMMEDIATE
+- "_tables" keeps a generation counter per table that every write bumps
+  in the same transaction, plus the total JSON bytes; utils uses them as
+  the table stamp and cache size
+
+This module only stores rows; record semantics (versions, which row an
+ID means, listeners) stay in utils.
+'''
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME = "healthplus.db"
+BUSY_TIMEOUT = 30.0  # Seconds to wait for another writer
+
+_local = threading.local()  # One connection per thread and database
+
+
+def db_path(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), DB_NAME)
+
+
+def table_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _open(db):
+    conn = sqlite3.connect(db, timeout=BUSY_TIMEOUT, isolation_level=None,
+                           check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS _tables ("
+                 "name TEXT PRIMARY KEY, token TEXT, generation INTEGER, bytes INTEGER)")
+    return conn
+
+
+def connect(path):
+    """Shared connection of this thread for the database next to path."""
+    db = db_path(path)
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(db)
+    if conn is None:
+        conn = conns[db] = _open(db)
+    return conn
+
+
+def close_all():
+    for conn in _local.__dict__.pop("conns", {}).values():
+        conn.close()
+
+
+@contextmanager
+def read(conn):
+    """Read transaction: everything inside sees the same snapshot."""
+    if conn.in_transaction:
+        yield conn  # Already inside a read or write
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("COMMIT")
+
+
+@contextmanager
+def write(conn):
+    """Write transaction, rolled back if the block raises."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def ensure_table(conn, table, key_fields, indexed=None):
+    """Create table if missing; indexed = key fields that get an index."""
+    exists = conn.execute("SELECT 1 FROM _tables WHERE name = ?", (table,)).fetchone()
+    if exists:
+        return
+    columns = "".join(f", {_quote('k_' + f)} TEXT" for f in key_fields)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ("
+                 f"rowid INTEGER PRIMARY KEY AUTOINCREMENT, id, data TEXT NOT NULL{columns})")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(table + '__id')} "
+                 f"ON {_quote(table)} (id)")
+    for field in (key_fields if indexed is None else indexed):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(table + '__' + field)} "
+                     f"ON {_quote(table)} ({_quote('k_' + field)})")
+    conn.execute("INSERT INTO _tables VALUES (?, ?, 0, 0)", (table, secrets.token_hex(8)))
+
+
+def key_columns(conn, table):
+    """Key fields that have a k_ column in table."""
+    return [row[1][2:] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")
+            if row[1].startswith("k_")]
+
+
+def stamp(conn, table):
+    """("sqlite", token, generation, bytes) of table, None if it does not exist.
+
+    token is new whenever the table is (re)created, so a stamp is never
+    reused even if the generation counter starts over.
+    """
+    row = conn.execute("SELECT token, generation, bytes FROM _tables WHERE name = ?",
+                       (table,)).fetchone()
+    return ("sqlite",) + tuple(row) if row else None
+
+
+def bump(conn, table, byte_delta):
+    """Record one write to table and return its new stamp."""
+    conn.execute("UPDATE _tables SET generation = generation + 1, bytes = bytes + ? "
+                 "WHERE name = ?", (byte_delta, table))
+    return stamp(conn, table)
+
+
+def rows(conn, table):
+    """Yield every record of table in insertion order."""
+    loads = json.loads
+    for (data,) in conn.execute(f"SELECT data FROM {_quote(table)} ORDER BY rowid"):
+        yield loads(data)
+
+
+def stream(path):
+    """Yield the records of path's table on a private connection.
+
+    The read snapshot stays fixed while the generator is alive, and the
+    shared connection stays free for writes meanwhile.
+    """
+    conn = _open(db_path(path))
+    table = table_name(path)
+    try:
+        conn.execute("BEGIN")
+        if stamp(conn, table) is None:
+            return
+        yield from rows(conn, table)
+    finally:
+        conn.close()
+
+
+def find(conn, table, keys, mode):
+    """Records whose k_ columns equal keys ({field: lowercased value})."""
+    joiner = " AND " if mode == "and" else " OR "
+    where = joiner.join(f"{_quote('k_' + f)} = ?" for f in keys)
+    sql = f"SELECT data FROM {_quote(table)} WHERE {where} ORDER BY rowid"
+    return [json.loads(data) for (data,) in conn.execute(sql, list(keys.values()))]
+
+
+def rows_by_id(conn, table, record_id):
+    """[(rowid, record)] for every row with this ID, oldest first."""
+    sql = f"SELECT rowid, data FROM {_quote(table)} WHERE id = ? ORDER BY rowid"
+    return [(rowid, json.loads(data)) for rowid, data in conn.execute(sql, (record_id,))]
+
+
+def insert(conn, table, record_id, record, keys):
+    """Append one record; returns the JSON byte count stored."""
+    data = json.dumps(record)
+    names = "".join(", " + _quote("k_" + f) for f in keys)
+    marks = ", ?" * len(keys)
+    conn.execute(f"INSERT INTO {_quote(table)} (id, data{names}) VALUES (?, ?{marks})",
+                 [record_id, data, *keys.values()])
+    return len(data)
+
+
+def insert_many(conn, table, items, key_fields):
+    """Append (record_id, record, keys) items in one statement; returns bytes stored."""
+    names = "".join(", " + _quote("k_" + f) for f in key_fields)
+    marks = ", ?" * len(key_fields)
+    total = 0
+
+    def params():
+        nonlocal total
+        for record_id, record, keys in items:
+            data = json.dumps(record)
+            total += len(data)
+            yield [record_id, data, *(keys[f] for f in key_fields)]
+
+    conn.executemany(f"INSERT INTO {_quote(table)} (id, data{names}) VALUES (?, ?{marks})",
+                     params())
+    return total
+
+
+def replace(conn, table, rowid, record_id, record, keys):
+    """Overwrite one row in place; returns the JSON byte count stored."""
+    data = json.dumps(record)
+    sets = "".join(f", {_quote('k_' + f)} = ?" for f in keys)
+    conn.execute(f"UPDATE {_quote(table)} SET id = ?, data = ?{sets} WHERE rowid = ?",
+                 [record_id, data, *keys.values(), rowid])
+    return len(data)
+
+
+def delete(conn, table, rowids):
+    conn.executemany(f"DELETE FROM {_quote(table)} WHERE rowid = ?",
+                     [(rowid,) for rowid in rowids])
+
+
+def drop_table(conn, table):
+    conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+    conn.execute("DELETE FROM _tables WHERE name = ?", (table,))
@@ -0,0 +1,88 @@
+'''
+Passwords: hashing, login with upgrade of old hashes, and the pooled
+migration of plaintext passwords
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+import utils
+
+
+class AuthTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, auth.HASH_ITERATIONS)
+        utils.STORAGE_BACKEND = "json"
+        auth.HASH_ITERATIONS = 1000  # Hashing speed is not under test here
+        auth.clear_verify_cache()
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, auth.HASH_ITERATIONS = self.saved
+        auth.clear_verify_cache()
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def test_hash_and_verify(self):
+        stored = auth.hash_password("secret")
+        self.assertTrue(auth.is_hashed(stored))
+        self.assertTrue(auth.verify_password("secret", stored))
+        self.assertFalse(auth.verify_password("Secret", stored))
+        self.assertNotEqual(auth.hash_password("secret"), stored)
+
+    def test_login_upgrades_plaintext_and_cheap_hashes(self):
+        utils.replace_records(self.source, [
+            {"userID": "U1", "username": "ann", "password": "plain"},
+            {"userID": "U2", "username": "bo", "password": auth.hash_password("pw", 500)},
+        ])
+        self.assertIsNone(auth.authenticate(self.source, "ann", "wrong"))
+        self.assertIsNone(auth.authenticate(self.source, "ANN", "plain"))
+        self.assertEqual(auth.authenticate(self.source, "ann", "plain")["userID"], "U1")
+        self.assertEqual(auth.authenticate(self.source, "bo", "pw")["userID"], "U2")
+        for user in utils.iter_records(self.source):
+            self.assertFalse(auth.needs_rehash(user["password"]), user)
+
+    def test_login_upgrade_prints_nothing(self):
+        utils.replace_records(self.source, [{"userID": "U1", "username": "ann",
+                                             "password": "plain"}])
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertIsNotNone(auth.authenticate(self.source, "ann", "plain"))
+        self.assertEqual(out.getvalue(), "")
+        self.assertTrue(auth.is_hashed(next(utils.iter_records(self.source))["password"]))
+
+    def test_migrate_on_the_pool(self):
+        count = auth.POOL_MIN_PASSWORDS + 2
+        utils.replace_records(self.source, [
+            {"userID": f"U{i}", "username": f"user{i}", "password": f"pw{i}"}
+            for i in range(count)
+        ] + [{"userID": "U0", "username": "twin", "password": "same id"}])
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(auth.migrate_passwords(self.source), count - 1)
+        self.assertIn("userID U0 is not unique", out.getvalue())
+        for user in utils.iter_records(self.source):
+            if user["userID"] == "U0":
+                self.assertFalse(auth.is_hashed(user["password"]))
+            else:
+                self.assertTrue(auth.verify_password("pw" + user["userID"][1:],
+                                                     user["password"]))
+                self.assertIn("$1000$", user["password"])
+
+    def test_hash_many_keeps_order(self):
+        passwords = [f"pw{i}" for i in range(auth.POOL_MIN_PASSWORDS)]
+        hashes = auth.hash_many(passwords, workers=2)
+        self.assertEqual(len(hashes), len(passwords))
+        for password, stored in zip(passwords, hashes):
+            self.assertTrue(auth.verify_password(password, stored))
+
+
+if __name__ == "__main__":
+    unittest.main()
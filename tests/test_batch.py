@@ -0,0 +1,123 @@
+'''
+Batch writes: one write per batch, the same result as the single-record
+calls, and bulk_import files going in through them
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import auth
+import bulk_import
+import utils
+
+
+def plain(records):
+    return [{k: v for k, v in r.items() if k != utils.VERSION_FIELD} for r in records]
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir,
+                      auth.HASH_ITERATIONS, bulk_import.TABLES)
+        utils.JOURNAL_MODE = False
+        utils.STORAGE_BACKEND = "json"
+        auth.HASH_ITERATIONS = 1000  # Hashing speed is not under test here
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        # The table paths were taken from admin when bulk_import was imported
+        bulk_import.TABLES = {
+            name: {**config, "source": os.path.join(self.folder,
+                                                    os.path.basename(config["source"]))}
+            for name, config in bulk_import.TABLES.items()
+        }
+
+    def tearDown(self):
+        (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir,
+         auth.HASH_ITERATIONS, bulk_import.TABLES) = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def fresh(self, name):
+        source = os.path.join(self.folder, name + ".txt")
+        utils.replace_records(source, [{"recID": f"R{i}", "n": i} for i in range(10)])
+        return source
+
+    def test_batches_match_single_calls(self):
+        for backend in ("json", "sqlite"):
+            for journal in (False, True):
+                utils.STORAGE_BACKEND, utils.JOURNAL_MODE = backend, journal
+                name = f"{backend}{int(journal)}"
+                single, batch = self.fresh(name + "a"), self.fresh(name + "b")
+
+                writes = []
+                with mock.patch.object(utils, "_trace",
+                                       lambda event, *_: writes.append(event)):
+                    self.assertEqual(utils.add_records(batch, [{"recID": "R10", "n": 10},
+                                                               {"recID": "R11", "n": 11}],
+                                                       quiet=True), 2)
+                    # Each change sees the earlier ones: R1 is renamed, then updated
+                    self.assertEqual(utils.update_records(batch, [
+                        ("R1", {"recID": "R20"}), ("R20", {"n": 99}), ("R404", {"n": 0})],
+                        quiet=True), 2)
+                    self.assertEqual(utils.delete_records(batch, ["R2", "R2", "R3"],
+                                                          quiet=True), 2)
+                self.assertEqual(writes.count("write"), 3, name)
+
+                for record in ({"recID": "R10", "n": 10}, {"recID": "R11", "n": 11}):
+                    utils.add_record(single, record, quiet=True)
+                utils.update_record(single, "R1", {"recID": "R20"}, quiet=True)
+                utils.update_record(single, "R20", {"n": 99}, quiet=True)
+                for record_id in ("R2", "R3"):
+                    utils.delete_record(single, record_id, quiet=True)
+
+                utils.clear_cache()
+                self.assertEqual(plain(utils.read_records(batch)),
+                                 plain(utils.read_records(single)), name)
+
+    def test_bulk_import(self):
+        utils.replace_records(admin.user_source, [
+            {"userID": "U1", "username": "ann", "password": "old", "role": "patient",
+             "age": "30"}])
+        roster = os.path.join(self.folder, "roster.csv")
+        with open(roster, "w") as file:
+            file.write("userID,username,password,role,age\n"
+                       "U1,ann,new-pw,patient,31\n"
+                       ",bo,bo-pw,Doctor,40\n"
+                       ",cy,cy-pw,wizard,20\n"
+                       ",di,di-pw,,50\n")
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(bulk_import.import_file("users", roster), (1, 0, 3))
+            self.assertEqual(bulk_import.import_file("users", roster, update=True), (1, 1, 2))
+        self.assertIn("invalid role", out.getvalue())
+
+        users = {u["username"]: u for u in utils.read_records(admin.user_source)}
+        self.assertEqual(sorted(users), ["ann", "bo"])
+        self.assertEqual((users["bo"]["role"], users["bo"]["status"]), ("doctor", "active"))
+        self.assertEqual(users["ann"]["age"], "31")
+        self.assertTrue(auth.verify_password("new-pw", users["ann"]["password"]))
+        self.assertTrue(auth.verify_password("bo-pw", users["bo"]["password"]))
+
+    def test_numbers_from_csv(self):
+        utils.replace_records(admin.medicine_source, [])
+        stock = os.path.join(self.folder, "stock.csv")
+        with open(stock, "w") as file:
+            file.write("name,price,stock\naspirin,2.5,40\nbad,x,1\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(bulk_import.import_file("medicines", stock), (1, 0, 1))
+        [medicine] = utils.read_records(admin.medicine_source)
+        self.assertEqual((medicine["medID"], medicine["price"], medicine["stock"]),
+                         ("M1", 2.5, 40))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+'''
+Command line: reports and user management end to end, and no password
+field in anything it prints
+'''
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import auth
+import cli
+import utils
+
+USERS = [
+    {"userID": "U1", "username": "boss", "password": "p1", "role": "administrator"},
+    {"userID": "U2", "username": "pat", "password": "p2", "role": "patient", "age": "30"},
+]
+
+
+class CliTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir,
+                      cli.DEFAULT_DATA_DIR, auth.HASH_ITERATIONS)
+        utils.STORAGE_BACKEND = "json"
+        auth.HASH_ITERATIONS = 1000  # Hashing speed is not under test here
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        cli.DEFAULT_DATA_DIR = self.folder
+        utils.replace_records(admin.user_source, USERS)
+        for name in ("appointment", "income", "medicine"):
+            utils.replace_records(os.path.join(self.folder, name + ".txt"), [])
+
+    def tearDown(self):
+        (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir,
+         cli.DEFAULT_DATA_DIR, auth.HASH_ITERATIONS) = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def run_cli(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            code = cli.main(["--json", *argv])
+        self.assertEqual(code, 0, err.getvalue())
+        self.assertNotIn("password", out.getvalue())
+        self.assertNotIn("pbkdf2", out.getvalue())
+        return json.loads(out.getvalue())
+
+    def test_patient_report_hides_passwords(self):
+        result = self.run_cli("report", "patients", "--details")
+        self.assertEqual(result["total_patients"], 1)
+        self.assertEqual([u["userID"] for u in result["patients"]], ["U2"])
+
+    def test_user_commands_hide_passwords(self):
+        added = self.run_cli("user", "add", "--username", "doc", "--password", "s3cret",
+                             "--role", "doctor")
+        self.assertEqual((added["userID"], added["role"]), ("U3", "doctor"))
+        stored = utils.find_record(admin.user_source, "and", {"userID": "U3"})[0]
+        self.assertTrue(auth.verify_password("s3cret", stored["password"]))
+
+        updated = self.run_cli("user", "update", "doc", "--password", "new", "--age", "41")
+        self.assertEqual(updated["age"], "41")
+        removed = self.run_cli("user", "remove", "U3")
+        self.assertEqual(removed["username"], "doc")
+        self.assertEqual(utils.find_record(admin.user_source, "and", {"userID": "U3"}), [])
+
+    def test_only_network_income_takes_detail(self):
+        parser = cli.build_parser()
+        self.assertEqual(parser.parse_args(["network", "income", "--detail", "paid"]).detail,
+                         "paid")
+        for report in ("summary", "staff"):
+            with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                parser.parse_args(["network", report, "--detail", "paid"])
+
+    def test_unknown_user_fails(self):
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.assertEqual(cli.main(["user", "remove", "U99"]), 1)
+        self.assertIn("User not found", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+'''
+Clinics: network reports give the same figures from the process pool as
+in-process, on both storage backends, and merge to the clinic totals
+'''
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import clinics
+import utils
+
+TODAY = date(2025, 3, 1)
+
+
+def clinic_data(n):
+    users = [{"userID": f"U{i}", "username": f"c{n}user{i}", "status": "active",
+              "role": ["patient", "doctor", "receptionist"][i % 3]} for i in range(1, 10 + n)]
+    appointments = [{"aptID": f"A{i}", "patient": "U1", "doctor": "U2",
+                     "date": f"2025-03-0{2 + i % 5}", "time": "09:00",
+                     "status": ["pending", "confirmed", "cancelled"][i % 3]}
+                    for i in range(5 * n)]
+    income = [{"inID": f"B{i}", "patient": "U1", "amount": 10.0 * n * i,
+               "status": "paid" if i % 2 else "unpaid"} for i in range(4 + n)]
+    medicine = [{"medID": f"M{i}", "name": f"med{i}", "stock": 10 * i, "price": 1.0}
+                for i in range(3 * n)]
+    return {"user.txt": users, "appointment.txt": appointments,
+            "income.txt": income, "medicine.txt": medicine}
+
+
+class ClinicsTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir)
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(self.folder, "clinics.json"), "w") as file:
+            json.dump({"north": "north", "south": os.path.join(self.folder, "south")}, file)
+        self.clinics = clinics.load_clinics(os.path.join(self.folder, "clinics.json"))
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def fill(self, backend):
+        utils.STORAGE_BACKEND = backend
+        for n, folder in enumerate(self.clinics.values(), 1):
+            os.makedirs(folder, exist_ok=True)
+            for name, records in clinic_data(n).items():
+                utils.replace_records(os.path.join(folder, name), records)
+
+    def test_registry(self):
+        self.assertEqual(list(self.clinics), ["north", "south"])
+        self.assertEqual(self.clinics["north"], os.path.join(self.folder, "north"))
+        with self.assertRaises(ValueError):
+            clinics.clinic_dir("east", self.clinics)
+
+    def test_pool_matches_in_process(self):
+        for backend in ("json", "sqlite"):
+            self.fill(backend)
+            before = admin.data_dir
+            serial = clinics.network_summary(self.clinics, workers=1, today=TODAY)
+            self.assertEqual(admin.data_dir, before)
+            pooled = clinics.network_summary(self.clinics, workers=2, today=TODAY)
+            self.assertEqual(pooled, serial, backend)
+
+            north, south = serial["clinics"]["north"], serial["clinics"]["south"]
+            network = serial["network"]
+            self.assertEqual(network["total_bills"], north["total_bills"] + south["total_bills"])
+            data = [clinic_data(1), clinic_data(2)]
+            users = [u for d in data for u in d["user.txt"]]
+            appointments = [a for d in data for a in d["appointment.txt"]]
+            self.assertEqual(network["total_patients"],
+                             sum(u["role"] == "patient" for u in users))
+            self.assertEqual(network["appointments_by_status"],
+                             dict(Counter(a["status"] for a in appointments)))
+            self.assertEqual(sum(day["pending"] for day in network["next_7_days"]),
+                             sum(a["status"] == "pending" for a in appointments))
+
+            bills = clinics.network_bills("unpaid", self.clinics, workers=2)
+            self.assertEqual(bills, clinics.network_bills("unpaid", self.clinics, workers=1))
+            self.assertEqual(sorted({b["clinic"] for b in bills}), ["north", "south"])
+            self.assertTrue(all(b["status"] == "unpaid" for b in bills))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+Columnar tables: masks, counts, sums and groups agree with the same
+work done over plain dicts, and tables reload when the file changes
+'''
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+import utils
+
+
+class ColumnarTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "income.txt")
+        rng = random.Random(6)
+        # 400 patients: more distinct values than fit in one-byte codes
+        self.records = [{"inID": f"I{i}", "patient": f"U{rng.randrange(400)}",
+                         "status": rng.choice(["paid", "unpaid"]),
+                         "amount": str(rng.randint(1, 500) / 4)} for i in range(1000)]
+        self.records[3]["amount"] = "n/a"
+        del self.records[5]["status"]
+        utils.replace_records(self.source, self.records)
+        self.table = columnar.load_table(self.source, ("status", "patient", "amount"))
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        columnar._tables.clear()
+        shutil.rmtree(self.folder)
+
+    def amount(self, record):
+        try:
+            return float(record["amount"])
+        except ValueError:
+            return 0
+
+    def test_codes_fit_the_values(self):
+        self.assertEqual(self.table["strings"]["status"]["codes"].typecode, "B")
+        self.assertEqual(self.table["strings"]["patient"]["codes"].typecode, "I")
+        self.assertEqual(columnar.count(self.table), len(self.records))
+
+    def test_masks_and_aggregates(self):
+        unpaid = columnar.mask_equals(self.table, "status", "unpaid")
+        large = columnar.mask_compare(self.table, "amount", ">=", 60)
+        patients = columnar.mask_equals(self.table, "patient", ["U1", "U2", "nobody"])
+        cases = [
+            (unpaid, lambda r: r.get("status") == "unpaid"),
+            (columnar.mask_and(unpaid, large),
+             lambda r: r.get("status") == "unpaid" and self.amount(r) >= 60),
+            (columnar.mask_or(patients, large),
+             lambda r: r["patient"] in ("U1", "U2") or self.amount(r) >= 60),
+            (columnar.mask_equals(self.table, "status", "refunded"), lambda r: False),
+            (columnar.mask_equals(self.table, "status", ""), lambda r: "status" not in r),
+        ]
+        for mask, test in cases:
+            rows = [r for r in self.records if test(r)]
+            self.assertEqual(columnar.count(self.table, mask), len(rows))
+            self.assertAlmostEqual(columnar.sum_column(self.table, "amount", mask),
+                                   sum(map(self.amount, rows)))
+            self.assertEqual(columnar.group_count(self.table, "patient", mask),
+                             dict(Counter(r["patient"] for r in rows)))
+            self.assertEqual([r["patient"] for r in columnar.select_rows(self.table, mask)],
+                             [r["patient"] for r in rows])
+        self.assertEqual(columnar.group_count(self.table, "status"),
+                         dict(Counter(r.get("status", "") for r in self.records)))
+
+    def test_reloads_after_a_write(self):
+        self.assertIs(columnar.load_table(self.source, ("status", "patient", "amount")),
+                      self.table)
+        utils.update_record(self.source, "I0", {"status": "refunded"}, quiet=True)
+        table = columnar.load_table(self.source, ("status", "patient", "amount"))
+        self.assertIsNot(table, self.table)
+        self.assertEqual(columnar.count(table, columnar.mask_equals(table, "status",
+                                                                    "refunded")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+Damaged data files raise instead of reading as empty tables
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+class CorruptFileTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def write(self, text):
+        with open(self.source, "w") as file:
+            file.write(text)
+        utils.clear_cache()
+
+    def assert_refused(self):
+        with self.assertRaises(utils.CorruptTableError):
+            utils.read_records(self.source)
+        with self.assertRaises(utils.CorruptTableError):
+            utils.add_record(self.source, {"userID": "U3"})
+        utils.CACHE_MAX_BYTES = 0  # Force the streaming reader
+        with self.assertRaises(utils.CorruptTableError):
+            list(utils.iter_records(self.source))
+
+    def test_truncated_file(self):
+        utils.replace_records(self.source, [{"userID": "U1"}, {"userID": "U2"}])
+        with open(self.source) as file:
+            text = file.read()
+        self.write(text[:len(text) // 2])
+        self.assert_refused()
+        with open(self.source) as file:
+            self.assertEqual(file.read(), text[:len(text) // 2])  # Not overwritten
+
+    def test_missing_closing_bracket(self):
+        self.write('[{"userID": "U1"}')
+        self.assert_refused()
+
+    def test_not_an_array(self):
+        self.write('{"userID": "U1"}')
+        self.assert_refused()
+
+    def test_whitespace_only(self):
+        self.write("  \n")
+        self.assert_refused()
+
+    def test_zero_length_file_is_empty(self):
+        self.write("")
+        self.assertEqual(utils.read_records(self.source), [])
+        utils.CACHE_MAX_BYTES = 0
+        self.assertEqual(list(utils.iter_records(self.source)), [])
+        utils.CACHE_MAX_BYTES = self.saved[2]
+        utils.add_record(self.source, {"userID": "U1"})
+        self.assertEqual(utils.read_records(self.source), [{"userID": "U1"}])
+
+    def test_journal_mode_write_refused(self):
+        utils.JOURNAL_MODE = True
+        self.write('[{"userID": "U1"},')
+        with self.assertRaises(utils.CorruptTableError):
+            utils.add_record(self.source, {"userID": "U3"})
+        self.assertFalse(os.path.exists(utils._journal_path(self.source)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+Report export: CSV and JSON lines written in chunks, filters applied,
+no password column, and no half-written file after a failure
+'''
+
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import export
+import utils
+
+USERS = [
+    {"userID": "U1", "username": "ann", "password": "plain", "role": "patient"},
+    {"userID": "U2", "username": "dr_bo", "password": "pbkdf2_sha256$1$00$00", "role": "doctor"},
+]
+APPOINTMENTS = [
+    {"aptID": f"A{i}", "patient": "U1", "doctor": "U2", "date": f"2025-03-{i:02d}",
+     "time": "09:00", "status": "pending" if i % 2 else "confirmed"}
+    for i in range(1, 11)
+]
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        utils.replace_records(admin.user_source, USERS)
+        utils.replace_records(admin.appointment_source, APPOINTMENTS)
+        self.output = os.path.join(self.folder, "out")
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def test_users_leave_out_passwords(self):
+        out = io.StringIO()
+        self.assertEqual(export.export("users", stdout=out), 2)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["username"] for r in rows], ["ann", "dr_bo"])
+        self.assertFalse(any("password" in r for r in rows))
+
+        export.export("users", self.output + ".csv")
+        with open(self.output + ".csv", newline="") as file:
+            header = next(csv.reader(file))
+        self.assertNotIn("password", header)
+
+    def test_filtered_appointments_csv(self):
+        count = export.export("filtered-appointments", self.output + ".csv",
+                              status="pending", date_from="2025-03-02", date_to="2025-03-07")
+        with open(self.output + ".csv", newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(count, 3)
+        self.assertEqual([r["aptID"] for r in rows], ["A3", "A5", "A7"])
+        self.assertEqual(rows[0]["patient"], "U1 - ann")
+
+    def test_chunk_boundaries_keep_every_row(self):
+        out = io.StringIO()
+        rows = ({"n": i} for i in range(7))
+        self.assertEqual(export.write_csv(rows, out, ["n"], chunk_rows=3), 7)
+        self.assertEqual(out.getvalue().split(), ["n"] + [str(i) for i in range(7)])
+
+    def test_failed_export_leaves_no_file(self):
+        def broken(options):
+            yield {"userID": "U1"}
+            raise OSError("disk full")
+
+        with mock.patch.dict(export.EXPORTS, {"users": (None, broken)}):
+            with self.assertRaises(OSError):
+                export.export("users", self.output + ".jsonl")
+        self.assertEqual(os.listdir(self.folder).count("out.jsonl"), 0)
+        self.assertFalse(os.path.exists(self.output + ".jsonl.tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
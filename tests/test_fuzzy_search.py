@@ -0,0 +1,75 @@
+'''
+Trigram username suggestions: agree with difflib on small tables, follow
+writes, and never score the whole table
+'''
+
+import difflib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fuzzy_search
+import utils
+
+NAMES = ["alice", "alicia", "alistair", "bob", "bobby", "carol", "caroline", "dave", "xyz"]
+
+
+class FuzzySearchTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+        utils.replace_records(self.source, [{"userID": f"U{i}", "username": name}
+                                            for i, name in enumerate(NAMES, 1)])
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        fuzzy_search._indexes.clear()
+        shutil.rmtree(self.folder)
+
+    def test_best_match_agrees_with_difflib(self):
+        for word in ("alce", "bobb", "carl", "dav", "qqq", "caroline"):
+            expected = difflib.get_close_matches(word, NAMES, n=3, cutoff=0.4)
+            got = fuzzy_search.close_matches(self.source, word)
+            self.assertEqual(got[:1], expected[:1], word)
+            self.assertEqual(sorted(got), sorted(expected), word)
+
+    def test_no_shared_trigram_uses_length_fallback(self):
+        # "yzx" shares no trigram with "xyz" but is close by ratio
+        self.assertEqual(fuzzy_search.close_matches(self.source, "yzx"), ["xyz"])
+
+    def test_index_follows_writes(self):
+        self.assertNotIn("zelda", fuzzy_search.close_matches(self.source, "zelda"))
+        with mock.patch("sys.stdout", io.StringIO()):
+            utils.add_record(self.source, {"userID": "U20", "username": "zelda"})
+            utils.update_record(self.source, "U4", {"username": "robert"})
+        self.assertEqual(fuzzy_search.close_matches(self.source, "zelda", n=1), ["zelda"])
+        self.assertNotIn("bob", fuzzy_search.close_matches(self.source, "bob", n=5))
+        self.assertEqual(fuzzy_search.suggest(self.source, "robert", n=1)[0]["userID"], "U4")
+
+    def test_fallback_is_bounded(self):
+        utils.replace_records(self.source, [{"userID": f"U{i}", "username": f"user{i:05d}"}
+                                            for i in range(3000)])
+        scored = []
+        original = difflib.SequenceMatcher.set_seq1
+
+        def counting(matcher, value):
+            scored.append(value)
+            return original(matcher, value)
+
+        with mock.patch.object(fuzzy_search, "MAX_FALLBACK", 100), \
+                mock.patch.object(difflib.SequenceMatcher, "set_seq1", counting):
+            fuzzy_search.close_matches(self.source, "qqqqqqqqq")
+        self.assertLessEqual(len(scored), 100 + fuzzy_search.MAX_CANDIDATES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+'''
+Hash indexes behind find_record: kept in step with adds, updates,
+renames and deletes, and never left ahead of a write that failed
+'''
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+USERS = [
+    {"userID": "U1", "username": "dr_ali", "role": "doctor"},
+    {"userID": "U2", "username": "Ben", "role": "patient"},
+    {"userID": "U3", "username": "cara", "role": "patient"},
+]
+
+
+def scan(source, mode, filters):
+    # What find_record answers without indexes
+    return [r for r in utils.read_records(source) if utils._filters_match(r, filters, mode)]
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.JOURNAL_MODE = False
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+        utils.replace_records(self.source, USERS)
+        quiet = mock.patch("sys.stdout", io.StringIO())  # utils prints a line per write
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def find(self, **filters):
+        return utils.find_record(self.source, "and", filters)
+
+    def test_lookup_is_case_insensitive(self):
+        self.assertEqual([r["userID"] for r in self.find(username="ben")], ["U2"])
+        self.assertEqual(len(utils.find_record(self.source, "or",
+                                               {"userID": "U1", "username": "CARA"})), 2)
+
+    def test_update_rename_delete_keep_indexes(self):
+        self.find(username="x")  # Build the indexes before the writes
+        utils.update_record(self.source, "U1", {"username": "renamed"})
+        self.assertEqual(self.find(username="dr_ali"), [])
+        self.assertEqual([r["userID"] for r in self.find(username="renamed")], ["U1"])
+        utils.update_record(self.source, "U2", {"userID": "U9"})
+        self.assertEqual(self.find(userID="U2"), [])
+        self.assertEqual([r["username"] for r in self.find(userID="U9")], ["Ben"])
+        utils.delete_record(self.source, "U1")
+        self.assertEqual(self.find(username="renamed"), [])
+        self.assertEqual([r["userID"] for r in self.find(username="cara")], ["U3"])
+
+    def test_random_mutations_match_scan(self):
+        rnd = random.Random(3)
+        names = ["ann", "Ann", "bob", "cid"]
+        for step in range(300):
+            kind = rnd.choice(["add", "update", "delete"])
+            record_id = f"U{rnd.randrange(8)}"
+            if kind == "add":
+                utils.add_record(self.source, {"userID": record_id,
+                                               "username": rnd.choice(names)})
+            elif kind == "update":
+                field = rnd.choice(["username", "userID"])
+                value = rnd.choice(names) if field == "username" else f"U{rnd.randrange(8)}"
+                utils.update_record(self.source, record_id, {field: value})
+            else:
+                utils.delete_record(self.source, record_id)
+            for filters in ({"username": rnd.choice(names)}, {"userID": record_id},
+                            {"userID": record_id, "username": rnd.choice(names)}):
+                for mode in ("and", "or"):
+                    self.assertEqual(utils.find_record(self.source, mode, filters),
+                                     scan(self.source, mode, filters), f"step {step}")
+
+    def test_failed_write_leaves_indexes_alone(self):
+        self.find(username="x")
+        with mock.patch.object(utils, "_save_records", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                utils.add_record(self.source, {"userID": "U4", "username": "zed"})
+            with self.assertRaises(OSError):
+                utils.update_record(self.source, "U1", {"username": "renamed"})
+        self.assertEqual(self.find(username="zed"), [])
+        self.assertEqual(self.find(username="renamed"), [])
+        self.assertEqual([r["userID"] for r in self.find(username="dr_ali")], ["U1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
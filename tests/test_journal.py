@@ -0,0 +1,154 @@
+'''
+Write-ahead journal: replay, compaction and the snapshot it belongs to
+'''
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+
+def ids(source):
+    return [r["userID"] for r in utils.read_records(source)]
+
+
+def naive_replay(records, ops):
+    # One scan of the list per operation, as replay used to work
+    for op in ops:
+        if op["op"] == "add":
+            records.append(op["record"])
+        elif op["op"] == "update":
+            for i, record in enumerate(records):
+                if utils._matches_id(record, op["id"]):
+                    records[i] = utils._updated_copy(record, op["updates"])
+                    break
+        else:
+            records[:] = [r for r in records if not utils._matches_id(r, op["id"])]
+
+
+def fresh_process():
+    # What another process starting now would know: nothing
+    utils.clear_cache()
+    utils._tokens.clear()
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+        utils.replace_records(self.source, [{"userID": "U1", "role": "patient"}])
+        utils.JOURNAL_MODE = True
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        fresh_process()
+        shutil.rmtree(self.folder)
+
+    def test_replay_matches_rewrite(self):
+        utils.add_records(self.source, [{"userID": f"U{i}", "role": "patient"}
+                                        for i in range(2, 6)])
+        utils.update_record(self.source, "U2", {"role": "doctor"})
+        utils.delete_record(self.source, "U3")
+        utils.add_record(self.source, {"userID": "U3", "role": "nurse"})
+        expected = utils.read_records(self.source)
+
+        fresh_process()
+        self.assertTrue(os.path.exists(utils._journal_path(self.source)))
+        self.assertEqual(utils.read_records(self.source), expected)
+        self.assertEqual(list(utils._stream_table(self.source)), expected)
+
+        utils.compact_journal(self.source)
+        self.assertFalse(os.path.exists(utils._journal_path(self.source)))
+        fresh_process()
+        self.assertEqual(utils.read_records(self.source), expected)
+
+    def test_touched_snapshot_keeps_journal(self):
+        utils.add_record(self.source, {"userID": "U2"})
+        os.utime(self.source, ns=(1, 1))
+        fresh_process()
+        utils.add_record(self.source, {"userID": "U3"})
+        fresh_process()
+        self.assertEqual(ids(self.source), ["U1", "U2", "U3"])
+
+    def test_copied_folder_keeps_journal(self):
+        utils.add_record(self.source, {"userID": "U2"})
+        copy = os.path.join(self.folder, "copy")
+        os.mkdir(copy)
+        for name in ("user.txt", "user.journal"):
+            shutil.copy(os.path.join(self.folder, name), copy)
+        fresh_process()
+        self.assertEqual(ids(os.path.join(copy, "user.txt")), ["U1", "U2"])
+
+    def test_foreign_snapshot_fails_loudly(self):
+        utils.add_record(self.source, {"userID": "U2"})
+        with open(self.source, "w") as file:
+            file.write('[{"userID": "U9"}]')
+        fresh_process()
+        with self.assertRaises(utils.JournalError):
+            utils.read_records(self.source)
+        with self.assertRaises(utils.JournalError):
+            utils.add_record(self.source, {"userID": "U3"})
+
+    def test_crash_after_compaction_does_not_replay(self):
+        utils.add_record(self.source, {"userID": "U2"})
+        # The new snapshot is in place but the journal could not be removed
+        with mock.patch.object(utils.os, "remove", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                utils.compact_journal(self.source)
+        self.assertTrue(os.path.exists(utils._journal_path(self.source)))
+
+        fresh_process()
+        self.assertEqual(ids(self.source), ["U1", "U2"])
+        utils.add_record(self.source, {"userID": "U3"})
+        fresh_process()
+        self.assertEqual(ids(self.source), ["U1", "U2", "U3"])
+
+    def test_delete_during_iteration_keeps_rows(self):
+        utils.add_records(self.source, [{"userID": f"U{i}"} for i in range(2, 5)])
+        rows = utils.iter_records(self.source)
+        self.assertEqual(next(rows)["userID"], "U1")
+        utils.delete_record(self.source, "U1")
+        self.assertEqual([r["userID"] for r in rows], ["U2", "U3", "U4"])
+        self.assertEqual(ids(self.source), ["U2", "U3", "U4"])
+
+    def test_append_is_fsynced(self):
+        with mock.patch.object(utils.os, "fsync", wraps=os.fsync) as fsync:
+            utils.add_record(self.source, {"userID": "U2"})
+        self.assertTrue(fsync.called)
+
+
+class ReplayTest(unittest.TestCase):
+    def test_random_ops_match_naive_replay(self):
+        rnd = random.Random(5)
+        for _ in range(200):
+            records = [{"userID": f"U{rnd.randrange(8)}", "n": i} for i in range(rnd.randrange(10))]
+            ops = []
+            for _ in range(rnd.randrange(15)):
+                kind = rnd.choice(["add", "update", "update", "delete"])
+                record_id = f"U{rnd.randrange(8)}"
+                if kind == "add":
+                    ops.append({"op": "add", "record": {"userID": record_id, "n": -1}})
+                elif kind == "update":
+                    updates = {"n": rnd.randrange(100)}
+                    if rnd.random() < 0.2:
+                        updates["userID"] = f"U{rnd.randrange(8)}"  # Renames the record
+                    ops.append({"op": "update", "id": record_id, "updates": updates})
+                else:
+                    ops.append({"op": "delete", "id": record_id})
+            expected = [dict(r) for r in records]
+            naive_replay(expected, ops)
+            utils._replay(records, ops)
+            self.assertEqual(records, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
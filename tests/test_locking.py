@@ -0,0 +1,91 @@
+'''
+Locks and record versions: conflicting updates are refused, concurrent
+sessions lose no writes
+'''
+
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite_store
+import utils
+
+
+def increment(task):
+    source, journal, backend, times = task
+    utils.JOURNAL_MODE, utils.STORAGE_BACKEND = journal, backend
+    sqlite_store.close_all()  # Never share the parent's connection
+    retries = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(times):
+            while True:
+                counter = utils.find_record(source, "and", {"recID": "C"})[0]
+                try:
+                    utils.update_record(source, "C", {"count": counter["count"] + 1},
+                                        expected_version=utils.record_version(counter))
+                    break
+                except utils.ConflictError:
+                    retries += 1
+    return retries
+
+
+class VersionTest(unittest.TestCase):
+    backend = "json"
+
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = self.backend
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "stress.txt")
+        utils.replace_records(self.source, [{"recID": "C", "count": 0}])
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        sqlite_store.close_all()
+        shutil.rmtree(self.folder)
+
+    def counter(self):
+        return utils.find_record(self.source, "and", {"recID": "C"})[0]
+
+    def test_stale_version_is_refused(self):
+        seen = self.counter()
+        utils.update_record(self.source, "C", {"count": 1},
+                            expected_version=utils.record_version(seen))
+        with self.assertRaises(utils.ConflictError):
+            utils.update_record(self.source, "C", {"count": 99},
+                                expected_version=utils.record_version(seen))
+        with self.assertRaises(utils.ConflictError):
+            utils.delete_record(self.source, "C", expected_version=utils.record_version(seen))
+        self.assertEqual(self.counter()["count"], 1)
+        self.assertEqual(utils.record_version(self.counter()), 1)
+
+    def run_processes(self, journal):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            self.skipTest("needs fork")
+        context = multiprocessing.get_context("fork")
+        with context.Pool(4) as pool:
+            pool.map(increment, [(self.source, journal, self.backend, 25)] * 4)
+        utils.clear_cache()
+        self.assertEqual(self.counter()["count"], 100)
+
+    def test_no_lost_updates(self):
+        self.run_processes(journal=False)
+
+    def test_no_lost_updates_journal(self):
+        self.run_processes(journal=True)
+
+
+class SqliteVersionTest(VersionTest):
+    backend = "sqlite"
+
+
+if __name__ == "__main__":
+    unittest.main()
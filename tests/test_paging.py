@@ -0,0 +1,56 @@
+'''
+Terminal paging: pages are read as they are shown, only a window of
+them is kept, and going back further reads the records again
+'''
+
+import contextlib
+import io
+import os
+import re
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+ROWS = [{"n": i} for i in range(100)]  # 10 pages of 10
+
+
+class PagingTest(unittest.TestCase):
+    def page(self, records, *choices):
+        """Run page_records with the given answers; return the page numbers shown."""
+        out = io.StringIO()
+        answers = iter(choices + ("q",))
+        with mock.patch.object(utils, "clear_screen", lambda: None), \
+                mock.patch("builtins.input", lambda prompt: next(answers)), \
+                contextlib.redirect_stdout(out):
+            utils.page_records(records, page_size=10)
+        return [int(m) for m in re.findall(r"^Page (\d+)", out.getvalue(), re.M)]
+
+    def test_going_back_past_the_window_reads_again(self):
+        opened = []  # Rows read, one list per pass over the records
+
+        def reopen():
+            opened.append([])
+            for row in ROWS:
+                opened[-1].append(row["n"])
+                yield row
+
+        shown = self.page(reopen, *["n"] * 7, "p", "1", "n")
+        self.assertEqual(shown, [1, 2, 3, 4, 5, 6, 7, 8, 7, 1, 2])
+        self.assertEqual(len(opened), 2)  # Page 7 was still kept, page 1 was not
+        self.assertEqual(opened[1], list(range(20)))  # Only up to the page asked for
+
+    def test_one_shot_iterable_stops_at_the_window(self):
+        shown = self.page(iter(ROWS), *["n"] * 7, "1", "p")
+        self.assertEqual(shown[-2:], [8 - utils.PAGE_WINDOW + 1] * 2)
+
+    def test_list_jumps_and_end(self):
+        self.assertEqual(self.page(ROWS, "9", "n", "n", "n"), [1, 9, 10])
+        self.assertEqual(self.page(ROWS, "50"), [1, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
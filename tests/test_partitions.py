@@ -0,0 +1,111 @@
+'''
+Monthly partitions: routing, pruned reads and records changing month
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import aggregates
+import partitions
+import utils
+
+APPOINTMENTS = [
+    {"aptID": "A1", "patient": "U6", "doctor": "U1", "date": "2025-03-01", "time": "09:30",
+     "status": "confirmed"},
+    {"aptID": "A2", "patient": "U7", "doctor": "U1", "date": "2025-03-03", "time": "11:00",
+     "status": "pending"},
+    {"aptID": "A3", "patient": "U6", "doctor": "U2", "date": "2025-04-10", "time": "10:00",
+     "status": "pending"},
+]
+FIELDS = ("status", "date", "time")
+
+
+class PartitionTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        utils.replace_records(admin.user_source, [
+            {"userID": f"U{i}", "username": f"user{i}", "role": "patient"} for i in range(1, 8)])
+        self.source = admin.appointment_source
+        utils.replace_records(self.source, APPOINTMENTS)
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.split(self.source)
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def month_ids(self, month, status="pending"):
+        low, high = (status, f"{month}-01"), (status, f"{month}-31")
+        return sorted(r["aptID"] for r in partitions.find_range(self.source, FIELDS, low, high))
+
+    def test_split_routes_by_month(self):
+        self.assertEqual(partitions.read_manifest(self.source)["partitions"],
+                         ["2025-03", "2025-04"])
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(self.month_ids("2025-03"), ["A2"])
+        self.assertEqual(
+            partitions.partition_sources(self.source, "2025-04-01", "2025-04-30"),
+            [partitions.partition_source(self.source, "2025-04")])
+        self.assertEqual(aggregates.get(self.source, "confirmed_appointments"), 1)
+
+    def test_update_record_moves_month(self):
+        partitions.update_record(self.source, "A2", {"date": "2025-08-02"})
+        self.assertEqual(self.month_ids("2025-03"), [])
+        self.assertEqual(self.month_ids("2025-08"), ["A2"])
+        found = admin.filter_appointments("pending", "2025-08-01", "2025-08-31", "00:00", "23:59")
+        self.assertEqual([r["aptID"] for r in found], ["A2"])
+        moved = partitions.find_record(self.source, "and", {"aptID": "A2"})
+        self.assertEqual(len(moved), 1)
+        self.assertEqual(utils.record_version(moved[0]), 1)
+
+    def test_update_records_moves_month(self):
+        # What bulk_import --update sends: an in-place change, then a move
+        # of the same record, then a plain update elsewhere
+        partitions.update_records(self.source, [
+            ("A2", {"time": "15:00"}),
+            ("A2", {"date": "2025-08-02"}),
+            ("A3", {"status": "cancelled"}),
+        ])
+        self.assertEqual(self.month_ids("2025-08"), ["A2"])
+        self.assertEqual(self.month_ids("2025-03"), [])
+        moved = partitions.find_record(self.source, "and", {"aptID": "A2"})
+        self.assertEqual([(r["date"], r["time"]) for r in moved], [("2025-08-02", "15:00")])
+        self.assertEqual(self.month_ids("2025-04", "cancelled"), ["A3"])
+
+    def test_move_adds_before_deleting(self):
+        with mock.patch.object(utils, "delete_record", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                partitions.update_record(self.source, "A2", {"date": "2025-08-02"})
+        # The old copy is still there, and so is the new one
+        dates = sorted(r["date"] for r in partitions.find_record(self.source, "and",
+                                                                   {"aptID": "A2"}))
+        self.assertEqual(dates, ["2025-03-03", "2025-08-02"])
+
+    def test_new_ids_continue_and_join_restores(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_id = utils.next_id(self.source, "A")
+            partitions.add_record(self.source, {"aptID": new_id, "date": "2025-05-01",
+                                                "status": "pending"})
+            self.assertEqual(new_id, "A4")
+            self.assertEqual(partitions.join(self.source), 4)
+        self.assertFalse(partitions.is_partitioned(self.source))
+        self.assertEqual(sorted(r["aptID"] for r in utils.read_records(self.source)),
+                         ["A1", "A2", "A3", "A4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
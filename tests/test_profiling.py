@@ -0,0 +1,115 @@
+'''
+Profiling: timing wrappers go in and come out cleanly, count calls and
+disk/scan work per function, and traces can be saved and compared
+'''
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import profiling
+import utils
+
+USERS = [{"userID": f"U{i}", "username": f"user{i}",
+          "role": "patient" if i % 2 else "doctor"} for i in range(1, 101)]
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir)
+        utils.JOURNAL_MODE = False
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        utils.replace_records(admin.user_source, USERS)
+        utils.clear_cache()
+        self.originals = (utils.read_records, utils.iter_records, admin.patient_records)
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def test_enable_and_disable(self):
+        profiling.enable()
+        self.assertTrue(profiling.is_enabled())
+        self.assertIsNot(utils.read_records, self.originals[0])
+        self.assertIsNotNone(utils._trace)
+        profiling.disable()
+        self.assertFalse(profiling.is_enabled())
+        self.assertEqual((utils.read_records, utils.iter_records, admin.patient_records),
+                         self.originals)
+        self.assertIsNone(utils._trace)
+
+    def test_counts_calls_and_work(self):
+        profiling.enable()
+        patients = list(admin.patient_records())
+        utils.read_records(admin.user_source)
+        utils.update_record(admin.user_source, "U1", {"username": "first"}, quiet=True)
+        profiling.disable()
+
+        functions = profiling.results()["functions"]
+        self.assertEqual(len(patients), 50)
+        self.assertEqual(functions["admin.patient_records"]["calls"], 1)
+        # Generator calls count once, not once per record
+        self.assertEqual(functions["utils.iter_records"]["calls"], 1)
+        self.assertEqual(functions["utils.iter_records"]["records_read"], 100)
+        self.assertGreaterEqual(functions["utils._load_entry"]["calls"], 1)
+        # Not in journal mode, so the whole table is written again
+        self.assertEqual(functions["utils.update_record"]["records_written"], 100)
+        self.assertGreater(functions["utils.update_record"]["bytes_written"], 0)
+        for name, stats in functions.items():
+            self.assertLessEqual(stats["self"], stats["total"] + 1e-6, name)
+        totals = profiling.results()["totals"]
+        self.assertEqual(totals["records_read"], 100)
+        self.assertGreater(totals["bytes_read"], 0)
+
+    def test_generator_closed_early(self):
+        profiling.enable()
+        records = utils.iter_records(admin.user_source)
+        next(records)
+        records.close()
+        profiling.disable()
+        self.assertEqual(profiling.results()["functions"]["utils.iter_records"]["calls"], 1)
+
+    def test_trace_files(self):
+        profiling.enable()
+        utils.read_records(admin.user_source)
+        profiling.disable()
+        old = os.path.join(self.folder, "old.json")
+        profiling.write_trace(old)
+        with open(old) as file:
+            trace = json.load(file)
+        self.assertEqual(trace["meta"]["backend"], "json")
+        self.assertIn("utils.read_records", profiling.format_summary(trace))
+
+        profiling.reset()
+        profiling.enable()
+        list(admin.patient_records())
+        profiling.disable()
+        comparison = profiling.format_comparison(trace, profiling.results())
+        self.assertIn("admin.patient_records", comparison)
+        self.assertIn("new", comparison)
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            sys.argv, argv = ["profiling.py", "show", old], sys.argv
+            try:
+                profiling.main()
+            finally:
+                sys.argv = argv
+        self.assertIn("utils.read_records", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+'''
+Range queries: find_range and count_by agree with a plain scan, keep
+agreeing after writes, and give the same answers on partitioned tables
+'''
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import partitions
+import utils
+
+STATUSES = ["pending", "confirmed", "cancelled"]
+
+
+def appointment(rng, i):
+    return {"aptID": f"A{i}", "status": rng.choice(STATUSES),
+            "date": f"2025-{rng.randint(1, 4):02d}-{rng.randint(1, 28):02d}",
+            "time": f"{rng.randint(8, 17):02d}:{rng.choice(['00', '30'])}"}
+
+
+def plain(record):
+    return {k: v for k, v in record.items() if k != utils.VERSION_FIELD}
+
+
+def scan(records, fields, low, high):
+    def key(r):
+        return tuple(r.get(f, "") for f in fields)
+    return sorted((r for r in records
+                   if tuple(low) <= key(r)[:len(low)] and key(r)[:len(high)] <= tuple(high)),
+                  key=key)
+
+
+class RangeTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "appointment.txt")
+        self.rng = random.Random(4)
+        self.records = [appointment(self.rng, i) for i in range(400)]
+        utils.replace_records(self.source, self.records)
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def check(self, find_range, count_by):
+        windows = [
+            (("date", "time"), ("2025-02-03",), ("2025-02-20",)),
+            (("date", "time"), ("2025-01-05", "12:00"), ("2025-01-05", "15:30")),
+            (("status", "date", "time"), ("pending", "2025-03-01"), ("pending", "2025-04-10")),
+            (("date",), ("2026-01-01",), ("2026-12-31",)),
+        ]
+        for fields, low, high in windows:
+            expected = scan(self.records, fields, low, high)
+            got = find_range(self.source, fields, low, high)
+            key = lambda r: (tuple(r.get(f) for f in fields), r["aptID"])
+            self.assertEqual(sorted(map(plain, got), key=key), sorted(expected, key=key),
+                             (fields, low))
+            self.assertEqual(count_by(self.source, fields, low, high, ("status",)),
+                             Counter((r["status"],) for r in expected))
+
+    def test_matches_a_scan(self):
+        self.check(utils.find_range, utils.count_by)
+        got = utils.find_range(self.source, ("date", "time"), ("2025-02-01",), ("2025-02-28",))
+        self.assertEqual(got, sorted(got, key=lambda r: (r["date"], r["time"])))
+
+    def test_follows_writes(self):
+        for journal in (False, True):
+            utils.JOURNAL_MODE = journal
+            for step in range(60):
+                target = self.rng.choice(self.records)
+                kind = self.rng.choice(["add", "update", "delete"])
+                if kind == "add":
+                    record = appointment(self.rng, 1000 + step + 100 * journal)
+                    utils.add_record(self.source, record, quiet=True)
+                    self.records.append(record)
+                elif kind == "update":
+                    changes = {"date": appointment(self.rng, 0)["date"],
+                               "status": self.rng.choice(STATUSES)}
+                    utils.update_record(self.source, target["aptID"], changes, quiet=True)
+                    target.update(changes)
+                else:
+                    utils.delete_record(self.source, target["aptID"], quiet=True)
+                    self.records.remove(target)
+                # After every write, so the next one updates built indexes
+                self.check(utils.find_range, utils.count_by)
+
+    def test_partitioned_table(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.split(self.source)
+        self.check(partitions.find_range, partitions.count_by)
+
+
+if __name__ == "__main__":
+    unittest.main()
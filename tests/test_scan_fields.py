@@ -0,0 +1,93 @@
+'''
+Field scans: the index, stream and snapshot paths of scan_fields all
+return what a plain filter over the records returns
+'''
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot
+import utils
+
+WHERES = [
+    {},
+    {"status": {"pending"}},
+    {"status": {"PENDING", "cancelled"}},  # Exact values, unlike find_record
+    {"status": {"pending"}, "time": lambda t: t >= "12:00"},
+    {"date": lambda d: d.startswith("2025-02")},
+    {"room": {""}},
+    {"status": {"nothing"}},
+]
+
+
+class ScanFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.BINARY_SNAPSHOTS,
+                      utils.CACHE_MAX_BYTES, snapshot.BLOCK_ROWS)
+        utils.JOURNAL_MODE = False
+        utils.STORAGE_BACKEND = "json"
+        utils.BINARY_SNAPSHOTS = False
+        snapshot.BLOCK_ROWS = 64  # Several blocks, some without a match
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "appointment.txt")
+        rng = random.Random(8)
+        self.records = [{"aptID": f"A{i}", "status": rng.choice(["pending", "confirmed",
+                                                                  "cancelled"]),
+                         "date": f"2025-0{rng.randint(1, 3)}-{rng.randint(10, 28)}",
+                         "time": f"{rng.randint(8, 17):02d}:00"} for i in range(500)]
+        for record in self.records[::7]:
+            record["room"] = "R1"
+        utils.replace_records(self.source, self.records)
+        utils.clear_cache()
+
+    def tearDown(self):
+        (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.BINARY_SNAPSHOTS,
+         utils.CACHE_MAX_BYTES, snapshot.BLOCK_ROWS) = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def expected(self, where):
+        def passes(value, test):
+            return test(value) if callable(test) else value in test
+        return [{f: r.get(f, "") for f in ("aptID", "room")} for r in self.records
+                if all(passes(r.get(f, ""), t) for f, t in where.items())]
+
+    def check(self):
+        for where in WHERES:
+            got = list(utils.scan_fields(self.source, ["aptID", "room"], where))
+            self.assertEqual(got, self.expected(where), where)
+
+    def test_cached_table(self):
+        utils.read_records(self.source)
+        self.check()
+
+    def test_streamed_table(self):
+        utils.CACHE_MAX_BYTES = 1024
+        self.check()
+
+    def test_snapshot(self):
+        utils.BINARY_SNAPSHOTS = True
+        self.check()
+        self.assertTrue(os.path.exists(snapshot.snapshot_path(self.source)))
+        self.assertEqual(utils.cache_stats()["files"], 0)
+
+    def test_snapshot_skipped_while_a_journal_is_pending(self):
+        utils.BINARY_SNAPSHOTS = True
+        utils.write_snapshot(self.source)
+        utils.JOURNAL_MODE = True
+        utils.update_record(self.source, "A1", {"status": "pending"}, quiet=True)
+        utils.delete_record(self.source, "A2", quiet=True)
+        utils.clear_cache()
+        self.records[1]["status"] = "pending"
+        del self.records[2]
+        self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+'''
+Doctor schedules: overlap checks, free slots against a brute-force
+grid, and booking that never gives one slot out twice
+'''
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import partitions
+import schedule
+import utils
+
+DAYS = ["2025-03-03", "2025-03-04", "2025-03-05"]
+
+
+def minutes(time):
+    hours, mins = time.split(":")
+    return int(hours) * 60 + int(mins)
+
+
+class ScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "appointment.txt")
+        utils.replace_records(self.source, [
+            {"aptID": "A1", "doctor": "U1", "patient": "U9", "date": DAYS[0],
+             "time": "10:00", "status": "confirmed"},
+            {"aptID": "A2", "doctor": "U1", "patient": "U9", "date": DAYS[0],
+             "time": "11:00", "status": "cancelled"},
+            {"aptID": "A3", "doctor": "U2", "patient": "U9", "date": DAYS[0],
+             "time": "10:00", "status": "pending"},
+            {"aptID": "A4", "doctor": "U1", "patient": "U9", "date": "bad", "time": "10:00"},
+        ])
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND = self.saved
+        utils.clear_cache()
+        schedule._indexes.clear()
+        shutil.rmtree(self.folder)
+
+    def book(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return schedule.book(self.source, *args)
+
+    def test_overlaps(self):
+        cases = {"09:30": [], "09:31": ["A1"], "10:00": ["A1"], "10:15": ["A1"],
+                 "10:29": ["A1"], "10:30": [], "11:00": []}
+        for time, expected in cases.items():
+            self.assertEqual(schedule.conflicts(self.source, "U1", DAYS[0], time), expected, time)
+        self.assertEqual(schedule.conflicts(self.source, "U1", DAYS[0], "10:00", ignore="A1"), [])
+        self.assertTrue(schedule.is_free(self.source, "U3", DAYS[0], "10:00"))
+        with self.assertRaises(ValueError):
+            schedule.conflicts(self.source, "U1", "2025-13-01", "10:00")
+
+    def test_free_slots_match_a_brute_force_grid(self):
+        rng = random.Random(21)
+        records = [{"aptID": f"R{i}", "doctor": rng.choice(["U1", "U2"]), "patient": "U9",
+                    "date": rng.choice(DAYS),
+                    "time": f"{rng.randint(8, 16):02d}:{rng.choice(['00', '15', '30', '45'])}",
+                    "status": rng.choice(["pending", "confirmed", "cancelled"])}
+                   for i in range(40)]
+        utils.replace_records(self.source, records)
+        grid = [f"{m // 60:02d}:{m % 60:02d}" for m in range(8 * 60, 16 * 60 + 31, 30)]
+
+        def free(doctor, day, time):
+            return all(abs(minutes(r["time"]) - minutes(time)) >= 30 for r in records
+                       if r["doctor"] == doctor and r["date"] == day
+                       and r["status"] != "cancelled")
+
+        found = schedule.availability(self.source, DAYS[0], DAYS[-1], ["U1", "U2"])
+        for doctor in ("U1", "U2"):
+            expected = {day: [t for t in grid if free(doctor, day, t)] for day in DAYS}
+            self.assertEqual(found[doctor], {d: t for d, t in expected.items() if t})
+
+        after = datetime(2025, 3, 3, 12, 10)
+        slots = schedule.next_free_slots(self.source, n=6, after=after, doctors=["U1", "U2"])
+        self.assertEqual(len(slots), 6)
+        keys = [(s["date"], s["time"], s["doctor"]) for s in slots]
+        self.assertEqual(keys, sorted(keys))
+        for slot in slots:
+            self.assertGreaterEqual((slot["date"], slot["time"]), (DAYS[0], "12:10"))
+            self.assertTrue(free(slot["doctor"], slot["date"], slot["time"]))
+
+    def test_book_and_cancel(self):
+        with self.assertRaises(schedule.SlotTakenError):
+            self.book("U8", "U1", DAYS[0], "10:15")
+        record = self.book("U8", "U1", DAYS[0], "11:00")  # Only a cancelled one there
+        self.assertEqual(record["aptID"], "A5")
+        with self.assertRaises(schedule.SlotTakenError):
+            self.book("U7", "U1", DAYS[0], "11:00")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(schedule.cancel(self.source, "A5"), 1)
+            utils.update_record(self.source, "A1", {"time": "14:00"})
+        self.assertTrue(schedule.is_free(self.source, "U1", DAYS[0], "10:00"))
+        self.assertEqual(schedule.conflicts(self.source, "U1", DAYS[0], "14:00"), ["A1"])
+        self.assertEqual(self.book("U7", "U1", DAYS[0], "11:00")["aptID"], "A6")
+
+    def test_partitioned_table(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.split(self.source)
+        self.book("U8", "U1", "2025-04-01", "09:00")
+        with self.assertRaises(schedule.SlotTakenError):
+            self.book("U8", "U1", "2025-04-01", "09:15")
+        with self.assertRaises(schedule.SlotTakenError):
+            self.book("U8", "U1", DAYS[0], "10:00")
+
+    def test_concurrent_bookings_take_a_slot_once(self):
+        start = threading.Barrier(4)
+        booked, taken = [], []
+
+        def attempt(patient):
+            start.wait()
+            try:
+                booked.append(schedule.book(self.source, patient, "U3", DAYS[1], "09:00"))
+            except schedule.SlotTakenError:
+                taken.append(patient)
+
+        threads = [threading.Thread(target=attempt, args=(f"U{i}",)) for i in range(4)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual((len(booked), len(taken)), (1, 3))
+        self.assertEqual(len(utils.find_record(self.source, "and", {"doctor": "U3"})), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+ID sequences: new IDs never repeat one that was deleted or that a
+caller wrote itself
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import bulk_import
+import partitions
+import utils
+
+
+class SequenceTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir,
+                      dict(bulk_import.TABLES["users"]))
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        bulk_import.TABLES["users"]["source"] = admin.user_source
+        self.source = admin.user_source
+        utils.replace_records(self.source, [{"userID": f"U{i}", "username": f"user{i}",
+                                             "role": "patient"} for i in range(1, 13)])
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir, users = self.saved
+        bulk_import.TABLES["users"] = users
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def test_deleted_ids_are_not_reused(self):
+        self.assertEqual(utils.next_ids(self.source, "U", 2), ["U13", "U14"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            utils.delete_record(self.source, "U12")
+        utils.clear_cache()
+        self.assertEqual(utils.next_id(self.source, "U"), "U15")
+
+    def test_explicit_id_moves_the_sequence(self):
+        self.assertEqual(utils.next_id(self.source, "U"), "U13")
+        with contextlib.redirect_stdout(io.StringIO()):
+            utils.add_record(self.source, {"userID": "U20", "role": "patient"})
+        self.assertEqual(utils.next_id(self.source, "U"), "U21")
+
+    def test_rename_moves_the_sequence(self):
+        utils.next_id(self.source, "U")
+        with contextlib.redirect_stdout(io.StringIO()):
+            utils.update_record(self.source, "U1", {"userID": "U30"})
+        self.assertEqual(utils.next_id(self.source, "U"), "U31")
+
+    def test_bulk_import_then_create_user(self):
+        utils.next_ids(self.source, "U", 0)  # Sequence at U12
+        roster = os.path.join(self.folder, "roster.jsonl")
+        with open(roster, "w") as file:
+            file.write('{"userID": "U13", "username": "imported", "role": "doctor",'
+                       ' "password": "pbkdf2_sha256$1$00$00"}\n')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(bulk_import.import_file("users", roster), (1, 0, 0))
+            user = admin.create_user("new", "pw", "30", "", "doctor")
+        self.assertEqual(user["userID"], "U14")
+
+    def test_partitioned_table(self):
+        source = admin.appointment_source
+        utils.replace_records(source, [{"aptID": "A1", "date": "2025-03-01"}])
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.split(source)
+            partitions.add_records(source, [{"aptID": "A7", "date": "2025-04-02"}])
+        self.assertEqual(utils.next_id(source, "A"), "A8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+'''
+HTTP service: no password hash in any reply, request validation, and
+reports running off the event loop
+'''
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import auth
+import server
+import utils
+
+USERS = [
+    {"userID": "U1", "username": "boss", "password": "boss-pw", "role": "administrator"},
+    {"userID": "U2", "username": "pat", "password": "pat-pw", "role": "patient"},
+]
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir,
+                      auth.HASH_ITERATIONS, server._lock, dict(server._sessions))
+        utils.STORAGE_BACKEND = "json"
+        auth.HASH_ITERATIONS = 1000  # Hashing speed is not under test here
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        utils.replace_records(admin.user_source, USERS)
+        for source in (admin.appointment_source, admin.income_source, admin.medicine_source):
+            utils.replace_records(source, [])
+
+    def tearDown(self):
+        (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir,
+         auth.HASH_ITERATIONS, server._lock, sessions) = self.saved
+        server._sessions.clear()
+        server._sessions.update(sessions)
+        admin.set_data_dir(data_dir)
+        auth.clear_verify_cache()
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def run_server(self, client):
+        """Run client(port) against a server on a free port."""
+        async def main():
+            server._lock = server.ReadWriteLock()
+            service = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+            async with service:
+                return await client(service.sockets[0].getsockname()[1])
+        return asyncio.run(main())
+
+    async def request(self, port, method, path, body=None, token=None, raw=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        if raw is None:
+            payload = json.dumps(body).encode() if body is not None else b""
+            raw = (f"{method} {path} HTTP/1.1\r\nConnection: close\r\n"
+                   f"Content-Length: {len(payload)}\r\n"
+                   + (f"Authorization: Bearer {token}\r\n" if token else "")
+                   + "\r\n").encode() + payload
+        writer.write(raw)
+        reply = await reader.read()
+        writer.close()
+        head, _, payload = reply.partition(b"\r\n\r\n")
+        return int(head.split()[1]), payload.decode()
+
+    async def login(self, port):
+        status, payload = await self.request(port, "POST", "/login",
+                                             {"username": "boss", "password": "boss-pw"})
+        self.assertEqual(status, 200, payload)
+        return json.loads(payload)["token"]
+
+    def test_replies_never_include_passwords(self):
+        async def client(port):
+            token = await self.login(port)
+            calls = [("GET", "/users", None), ("GET", "/users?q=pat", None),
+                     ("GET", "/users/U2", None), ("GET", "/reports/patients?details=1", None),
+                     ("GET", "/reports/staff", None),
+                     ("POST", "/users", {"username": "doc", "password": "doc-pw",
+                                         "role": "doctor"}),
+                     ("PATCH", "/users/U3", {"password": "new-pw", "age": "40"}),
+                     ("DELETE", "/users/U3", None)]
+            replies = []
+            for method, path, body in calls:
+                replies.append(await self.request(port, method, path, body, token))
+            return replies
+
+        for status, payload in self.run_server(client):
+            self.assertLess(status, 300, payload)
+            self.assertNotIn("password", payload)
+            self.assertNotIn("pbkdf2", payload)
+
+    def test_bad_requests(self):
+        async def client(port):
+            return [
+                await self.request(port, "GET", "/users"),
+                await self.request(port, "POST", "/login", raw=b"POST /login HTTP/1.1\r\n"
+                                   b"Content-Length: -1\r\n\r\n"),
+                await self.request(port, "POST", "/login",
+                                   {"username": "pat", "password": "pat-pw"}),
+                await self.request(port, "POST", "/login",
+                                   {"username": "boss", "password": "wrong"}),
+            ]
+
+        statuses = [status for status, _ in self.run_server(client)]
+        self.assertEqual(statuses, [401, 400, 403, 401])
+
+    def test_reports_do_not_block_other_requests(self):
+        release = threading.Event()
+        original = admin.medicine_records
+
+        def slow_report():
+            release.wait(5)
+            return original()
+
+        async def client(port):
+            token = await self.login(port)
+            report = asyncio.ensure_future(
+                self.request(port, "GET", "/reports/medicine", token=token))
+            await asyncio.sleep(0.05)
+            status, _ = await self.request(port, "GET", "/users/U1", token=token)
+            finished_first = not report.done()
+            release.set()
+            return status, finished_first, (await report)[0]
+
+        with mock.patch.object(admin, "medicine_records", slow_report):
+            self.assertEqual(self.run_server(client), (200, True, 200))
+
+    def test_writes_wait_for_reads_in_progress(self):
+        async def main():
+            lock = server.ReadWriteLock()
+            events = []
+
+            async def read(name, delay):
+                async with lock.read():
+                    events.append(name + " start")
+                    await asyncio.sleep(delay)
+                    events.append(name + " end")
+
+            async def write():
+                await asyncio.sleep(0.01)
+                async with lock.write():
+                    events.append("write")
+
+            async def late_read():
+                await asyncio.sleep(0.02)
+                await read("late", 0)
+
+            await asyncio.gather(read("a", 0.05), read("b", 0.05), write(), late_read())
+            return events
+
+        events = asyncio.run(main())
+        self.assertEqual(events[:2], ["a start", "b start"])
+        # The write goes after both reads and before the read that came after it
+        self.assertLess(max(events.index("a end"), events.index("b end")), events.index("write"))
+        self.assertLess(events.index("write"), events.index("late start"))
+
+
+if __name__ == "__main__":
+    unittest.main()
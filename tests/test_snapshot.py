@@ -0,0 +1,81 @@
+'''
+Binary snapshots: reads and field scans match the JSON file, and a
+damaged .bin falls back to the JSON file instead of failing
+'''
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot
+import utils
+
+USERS = [{"userID": f"U{i}", "username": f"user{i}", "role": "doctor" if i % 3 else "patient"}
+         for i in range(1, 41)]
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.BINARY_SNAPSHOTS)
+        utils.JOURNAL_MODE = False
+        utils.STORAGE_BACKEND = "json"
+        utils.BINARY_SNAPSHOTS = True
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "user.txt")
+        self.bin = snapshot.snapshot_path(self.source)
+        utils.replace_records(self.source, USERS)
+        utils.write_snapshot(self.source)
+        utils.clear_cache()
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.BINARY_SNAPSHOTS = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def damage(self):
+        # Overwrite the rows and columns of the first block; the header
+        # and offset table stay valid
+        snap = snapshot.open_snapshot(self.bin)
+        start, end = snap["offsets"][0], snap["offsets"][len(snap["fields"]) + 1]
+        snapshot.close_snapshot(snap)
+        with open(self.bin, "r+b") as file:
+            file.seek(start)
+            file.write(b"\xff" * (end - start))
+
+    def scan(self):
+        return list(utils.scan_fields(self.source, ["userID"], {"role": {"patient"}}))
+
+    def test_snapshot_matches_json(self):
+        self.assertEqual(utils.read_records(self.source), USERS)
+        utils.clear_cache()
+        self.assertEqual(self.scan(), [{"userID": u["userID"]} for u in USERS
+                                       if u["role"] == "patient"])
+
+    def test_damaged_snapshot_reads_json(self):
+        self.damage()
+        self.assertEqual(utils.read_records(self.source), USERS)
+        self.assertFalse(os.path.exists(self.bin))
+
+    def test_damaged_snapshot_scan_reads_json(self):
+        utils.BINARY_SNAPSHOTS = False  # Do not rebuild it on the way
+        self.damage()
+        self.assertEqual(self.scan(), [{"userID": u["userID"]} for u in USERS
+                                       if u["role"] == "patient"])
+        self.assertFalse(os.path.exists(self.bin))
+
+    def test_damaged_snapshot_is_not_restored(self):
+        self.damage()
+        with mock.patch("sys.stdout", io.StringIO()):
+            self.assertFalse(utils.restore_from_snapshot(self.source))
+        utils.clear_cache()
+        self.assertEqual(utils.read_records(self.source), USERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+'''
+Differential test: the JSON engine (rewrite and journal modes) and the
+SQLite engine give the same answers for the same random operations
+'''
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite_store
+import utils
+
+# (STORAGE_BACKEND, JOURNAL_MODE) of each engine under test
+ENGINES = [("json", False), ("json", True), ("sqlite", False)]
+ROLES = ["patient", "doctor", "nurse"]
+
+
+def random_user(rnd):
+    # Few IDs and names, so duplicates, misses and case clashes happen
+    user = {"userID": f"U{rnd.randrange(12)}",
+            "username": rnd.choice(["ann", "Ann", "bob", "cid", "dee"]),
+            "role": rnd.choice(ROLES),
+            "age": str(rnd.randrange(18, 30))}
+    if rnd.random() < 0.2:
+        del user["age"]
+    return user
+
+
+def random_ops(rnd):
+    """One batch: [(method name, args, kwargs)], applied to every engine."""
+    kind = rnd.choice(["add", "add", "adds", "update", "update", "updates",
+                       "delete", "deletes"])
+    record_id = f"U{rnd.randrange(12)}"
+    if kind == "add":
+        return ("add_record", (random_user(rnd),), {})
+    if kind == "adds":
+        return ("add_records", ([random_user(rnd) for _ in range(rnd.randrange(1, 4))],), {})
+    if kind == "update":
+        updates = {"role": rnd.choice(ROLES)}
+        if rnd.random() < 0.2:
+            updates["userID"] = f"U{rnd.randrange(12)}"  # Renames the record
+        return ("update_record", (record_id, updates), {})
+    if kind == "updates":
+        return ("update_records", ([(f"U{rnd.randrange(12)}", {"age": str(rnd.randrange(18, 30))})
+                                    for _ in range(rnd.randrange(1, 4))],), {})
+    if kind == "delete":
+        return ("delete_record", (record_id,), {})
+    return ("delete_records", ([f"U{rnd.randrange(12)}" for _ in range(2)],), {})
+
+
+class StorageEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES)
+        self.folders = [tempfile.mkdtemp() for _ in ENGINES]
+        self.sources = [os.path.join(folder, "user.txt") for folder in self.folders]
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES = self.saved
+        utils.clear_cache()
+        utils._tokens.clear()
+        sqlite_store.close_all()
+        for folder in self.folders:
+            shutil.rmtree(folder)
+
+    @contextlib.contextmanager
+    def engine(self, i):
+        utils.STORAGE_BACKEND, utils.JOURNAL_MODE = ENGINES[i]
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield self.sources[i]
+
+    def each(self, call):
+        """call(source) on every engine; returns the results in ENGINES order."""
+        results = []
+        for i in range(len(ENGINES)):
+            with self.engine(i) as source:
+                try:
+                    results.append(call(source))
+                except utils.ConflictError:
+                    results.append("conflict")
+        return results
+
+    def assert_same(self, call, what):
+        first, *others = self.each(call)
+        for engine, result in zip(ENGINES[1:], others):
+            self.assertEqual(result, first, f"{what}: {engine} differs from {ENGINES[0]}")
+
+    def check_reads(self, step):
+        self.assert_same(utils.read_records, f"step {step} read_records")
+        self.assert_same(lambda s: sorted(map(repr, utils.find_record(
+            s, "and", {"username": "ann", "role": "doctor"}))), f"step {step} find and")
+        self.assert_same(lambda s: sorted(map(repr, utils.find_record(
+            s, "or", {"userID": "U3", "username": "bob"}))), f"step {step} find or")
+        self.assert_same(lambda s: utils.find_range(s, ("role", "age"), ("doctor", "20"),
+                                                    ("nurse", "25")), f"step {step} find_range")
+        self.assert_same(lambda s: utils.count_by(s, ("role",), ("a",), ("z",), ("role",)),
+                         f"step {step} count_by")
+        self.assert_same(lambda s: list(utils.scan_fields(s, ["userID", "age"],
+                                                          {"role": {"nurse"}})),
+                         f"step {step} scan_fields")
+
+    def test_random_operations_agree(self):
+        rnd = random.Random(19)
+        seed = [random_user(rnd) for _ in range(6)]
+        self.each(lambda s: utils.replace_records(s, seed))
+
+        for step in range(300):
+            method, args, kwargs = random_ops(rnd)
+            if method in ("update_record", "delete_record") and rnd.random() < 0.3:
+                kwargs["expected_version"] = rnd.randrange(3)  # Often stale
+            self.assert_same(lambda s: getattr(utils, method)(s, *args, **kwargs),
+                             f"step {step} {method}{args}")
+            if step % 10 == 0:
+                self.check_reads(step)
+            if step % 25 == 0:
+                # As another process would see the tables
+                utils.clear_cache()
+                utils._tokens.clear()
+                sqlite_store.close_all()
+                self.check_reads(step)
+
+        # The streaming reader, without the cache
+        utils.clear_cache()
+        utils.CACHE_MAX_BYTES = 0
+        self.assert_same(lambda s: list(utils.iter_records(s)), "iter_records uncached")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+Streaming JSON reader: the same records as json.loads for any chunk
+size, and the same refusals for anything json.loads would not accept
+'''
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+VALID = [
+    "", "[]", " [ ] \n", "[1]", "[1,2,3]", '[{"a": "x,]y"}, {"b": [1, 2]}]',
+    '[ {"n": 12345} ,\n {"s": "\\" ]"} ]\n', "[true, false, null, 1.5e3]",
+]
+MALFORMED = [
+    "[1,,2]", "[,1]", "[1,]", "[1 2]", "[1] 2", "[1]]", "[[1]", "[1", "[",
+    "   ", "x", '[{"a": }]', "[1,\n", '["open]', "[1.5.2]",
+]
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "table.txt")
+
+    def tearDown(self):
+        utils.STORAGE_BACKEND, utils.CACHE_MAX_BYTES = self.saved
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def stream(self, text, chunk):
+        with open(self.path, "w") as file:
+            file.write(text)
+        with mock.patch.object(utils, "STREAM_CHUNK_SIZE", chunk):
+            return list(utils._stream_json_array(open(self.path, "r")))
+
+    def test_valid_arrays(self):
+        for text in VALID:
+            expected = json.loads(text) if text else []
+            for chunk in (1, 2, 3, 7, 64 * 1024):
+                self.assertEqual(self.stream(text, chunk), expected, (text, chunk))
+
+    def test_malformed_input_is_rejected(self):
+        for text in MALFORMED:
+            with self.assertRaises(ValueError):
+                json.loads(text)
+            for chunk in (1, 3, 64 * 1024):
+                with self.assertRaises(utils.CorruptTableError, msg=(text, chunk)):
+                    self.stream(text, chunk)
+
+    def test_other_json_is_not_a_table(self):
+        for text in ('{"a": 1}', "1", '"[1]"'):
+            with self.assertRaises(utils.CorruptTableError):
+                self.stream(text, 64 * 1024)
+
+    def test_iter_records_streams_tables_over_the_budget(self):
+        records = [{"id": f"R{i}", "note": "x" * (i % 7)} for i in range(500)]
+        utils.replace_records(self.path, records)
+        utils.clear_cache()
+        utils.CACHE_MAX_BYTES = 1024  # Too small to load the table
+        with mock.patch.object(utils, "STREAM_CHUNK_SIZE", 100):
+            self.assertEqual(list(utils.iter_records(self.path)), records)
+            self.assertEqual(utils.cache_stats()["files"], 0)
+
+            with open(self.path, "a") as file:
+                file.write("junk")
+            with self.assertRaises(utils.CorruptTableError):
+                list(utils.iter_records(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+Unpaid bills report: the indexed join finds the same bills and related
+appointments as going through both tables, also after writes and on
+partitioned tables
+'''
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin
+import partitions
+import utils
+
+
+class UnpaidTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (utils.JOURNAL_MODE, utils.STORAGE_BACKEND, admin.data_dir)
+        utils.STORAGE_BACKEND = "json"
+        self.folder = tempfile.mkdtemp()
+        admin.set_data_dir(self.folder)
+        rng = random.Random(12)
+        utils.replace_records(admin.user_source, [{"userID": f"U{i}", "username": f"user{i}"}
+                                                  for i in range(1, 31)])
+        self.bills = [{"inID": f"B{i}", "patient": f"U{rng.randint(1, 30)}",
+                       "amount": 10.0, "status": rng.choice(["paid", "unpaid", "UNPAID"]),
+                       "date": f"2025-0{rng.randint(1, 3)}-10"} for i in range(60)]
+        self.bills[0].update(patient="u5", status="unpaid")  # Not the same patient as U5
+        self.bills[1]["status"] = "unpaid"
+        del self.bills[1]["patient"]
+        utils.replace_records(admin.income_source, self.bills)
+        utils.replace_records(admin.appointment_source, [
+            {"aptID": f"A{i}", "patient": f"U{rng.randint(1, 30)}", "doctor": "U1",
+             "date": f"2025-0{rng.randint(1, 3)}-{rng.randint(10, 28)}", "time": "09:00",
+             "status": "pending"} for i in range(200)])
+
+    def tearDown(self):
+        utils.JOURNAL_MODE, utils.STORAGE_BACKEND, data_dir = self.saved
+        admin.set_data_dir(data_dir)
+        utils.clear_cache()
+        shutil.rmtree(self.folder)
+
+    def expected(self):
+        """What the report showed before the join: both tables gone through in full."""
+        bills = [b for b in partitions.iter_records(admin.income_source)
+                 if b.get("status") == "unpaid"]
+        owing = [b.get("patient") for b in bills if b.get("patient")]
+        appointments = [a for a in partitions.iter_records(admin.appointment_source)
+                        if a.get("patient") in owing]
+        return [b["inID"] for b in bills], sorted(a["aptID"] for a in appointments)
+
+    def check(self):
+        bills, appointments = admin.unpaid_bills()
+        self.assertEqual(([b["inID"] for b in bills], sorted(a["aptID"] for a in appointments)),
+                         self.expected())
+        self.assertEqual(len(appointments), len({a["aptID"] for a in appointments}))
+        for bill in bills:
+            if bill.get("patient", "").startswith("U"):
+                self.assertRegex(bill["patient"], r"^U\d+ - user\d+$")
+
+    def test_matches_full_scan(self):
+        self.check()
+
+    def test_after_writes(self):
+        self.check()
+        utils.update_record(admin.income_source, "B2", {"status": "paid"}, quiet=True)
+        utils.update_record(admin.income_source, "B3", {"status": "unpaid"}, quiet=True)
+        utils.update_record(admin.appointment_source, "A0", {"patient": "U7"}, quiet=True)
+        utils.add_record(admin.appointment_source,
+                         {"aptID": "A999", "patient": self.bills[3]["patient"]}, quiet=True)
+        utils.delete_record(admin.appointment_source, "A5", quiet=True)
+        self.check()
+
+    def test_partitioned_tables(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.split(admin.income_source)
+            partitions.split(admin.appointment_source)
+        self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
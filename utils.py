@@ -1,25 +1,967 @@
 # utils.py
 import os
 # --- Read all records ---
+import hashlib
+import itertools
 import json
 import os
+import re
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+
+import locking
+import snapshot
+import sqlite_store
 
 # ------------------------------
-# Read all records from JSON file
+# Record cache
 # ------------------------------
-def read_records(source, headers=None):
-    if not os.path.exists(source):
-        return []  # File not created yet
+# Parsed records are kept per data file and reused until the file changes
+# on disk (mtime, size or inode). The budget is the memory the parsed
+# records take, estimated from a sample of them (sys.getsizeof of each
+# dict and its values); the least recently used file is dropped first.
+# Indexes built later on a cached table are not counted. Threads may
+# read at the same time (_cache_lock keeps the cache consistent), but a
+# write must not overlap reads in other threads: it updates the cached
+# indexes in place.
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+MEMORY_SAMPLE = 64        # Records sized per estimate
+MEMORY_PER_FILE_BYTE = 4  # Guess for a table not loaded yet (JSON text -> dicts)
+
+_cache = OrderedDict()  # abs path -> {"stamp", "records", "size", "indexes"}
+_memory_ratio = {}      # abs path -> estimated memory / file bytes, from its last load
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_cache_lock = threading.RLock()
+
+# ------------------------------
+# Write-ahead journal
+# ------------------------------
+# With JOURNAL_MODE on, add/update/delete_record append one line per
+# operation to "<table>.journal" instead of rewriting the JSON file.
+# Reads replay the journal over the JSON snapshot. The journal is folded
+# back into the snapshot by compact_journal(), which also runs on its own
+# once the journal grows past JOURNAL_COMPACT_RATIO of the snapshot size.
+# Its header names the snapshot it applies to by file stamp and by a
+# digest of the snapshot's content, so copying or touching the data
+# folder keeps it valid; a journal that matches neither raises
+# JournalError instead of being skipped.
+JOURNAL_MODE = False
+JOURNAL_COMPACT_RATIO = 0.5
+JOURNAL_MIN_BYTES = 64 * 1024
+
+# ------------------------------
+# Binary snapshots
+# ------------------------------
+# A "<table>.bin" snapshot (see snapshot.py) is loaded instead of parsing
+# the JSON whenever it was built from the current JSON file. With
+# BINARY_SNAPSHOTS on, every full save refreshes it as well.
+BINARY_SNAPSHOTS = False
+
+# ------------------------------
+# Concurrency
+# ------------------------------
+# Reads that go to disk hold a shared lock and every write holds an
+# exclusive lock (see locking.py) for its whole read-modify-write, so
+# several sessions can share one data directory without losing updates.
+# Each update bumps the record's "_version"; passing expected_version to
+# update_record/delete_record raises ConflictError if someone else changed
+# the record since it was read.
+VERSION_FIELD = "_version"
+
+# A data file that is not a JSON array of records raises CorruptTableError
+# on every read and write, so a damaged table is never taken for an empty
+# one and overwritten. Only a zero-length file counts as an empty table.
+
+
+class ConflictError(Exception):
+    """The record changed since the caller read it."""
+
+
+class CorruptTableError(Exception):
+    """A data file exists but does not hold a JSON array of records."""
+
+
+class JournalError(Exception):
+    """A table's journal was started against different snapshot content."""
+
+
+# ------------------------------
+# Storage backend
+# ------------------------------
+# "json" keeps every table in its own JSON file, with the journal and
+# binary snapshot options above. "sqlite" keeps the tables of a data
+# folder in one SQLite database (see sqlite_store.py); sources are still
+# named by their .txt path, e.g. data/user.txt is table "user" of
+# data/healthplus.db. Both engines share the cache, the indexes, the
+# versions and the change listeners. Choose with HEALTHPLUS_STORAGE or
+# by setting STORAGE_BACKEND before the first read; migrate_storage.py
+# copies the data between the two.
+STORAGE_BACKEND = os.environ.get("HEALTHPLUS_STORAGE", "json")
+
+# ------------------------------
+# Instrumentation hook
+# ------------------------------
+# While profiling.py is enabled, _trace(event, nbytes, records) is called
+# with "read" (loaded from disk), "write" (written to disk) and "scan"
+# (records looked at by a query). When it is None, as by default, each
+# call site costs one global lookup.
+_trace = None
+
+
+def _counted(rows):
+    """Pass rows through, reporting how many were pulled as one scan event."""
+    count = 0
+    try:
+        for record in rows:
+            count += 1
+            yield record
+    finally:
+        if _trace is not None:  # Profiling may have stopped meanwhile
+            _trace("scan", 0, count)
+
+
+def _uses_sqlite():
+    return STORAGE_BACKEND == "sqlite"
+
+
+def record_version(record):
+    return int(record.get(VERSION_FIELD, 0))
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _journal_path(path):
+    return os.path.splitext(path)[0] + ".journal"
+
+
+def _table_stamp(path):
+    """Stamp covering both the snapshot and its journal, None if neither exists."""
+    snap = _file_stamp(path)
+    journal = _file_stamp(_journal_path(path))
+    if snap is None and journal is None:
+        return None
+    return (snap, journal)
+
+
+def _current_stamp(path):
+    """Stamp of path in whichever storage backend is in use."""
+    if _uses_sqlite():
+        return sqlite_store.stamp(sqlite_store.connect(path), sqlite_store.table_name(path))
+    return _table_stamp(path)
+
+
+def table_stamp(source):
+    """Return a value that changes whenever source (or its journal) changes."""
+    return _current_stamp(os.path.abspath(source))
+
+
+def _stamp_size(stamp):
+    if stamp[0] == "sqlite":
+        return stamp[3]
+    return sum(s[1] for s in stamp if s is not None)
+
+
+def _cache_get(path, stamp):
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is None or entry["stamp"] != stamp:
+            _cache_stats["misses"] += 1
+            return None
+        _cache.move_to_end(path)
+        _cache_stats["hits"] += 1
+        return entry
+
+
+def _records_memory(records):
+    """Estimated bytes of memory held by a list of parsed records."""
+    if not records:
+        return sys.getsizeof(records)
+    step = max(1, len(records) // MEMORY_SAMPLE)
+    sample = records[::step][:MEMORY_SAMPLE]
+    # Keys are not counted: the JSON decoder shares one string per name
+    sampled = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values())
+                  for r in sample)
+    return sys.getsizeof(records) + sampled * len(records) // len(sample)
+
+
+def _expected_memory(path, stamp):
+    """Memory the records of path would take once loaded, before loading them."""
+    return int(_stamp_size(stamp) * _memory_ratio.get(path, MEMORY_PER_FILE_BYTE))
+
+
+def _cache_put(path, stamp, records, indexes=None):
+    entry = {"stamp": stamp, "records": records, "indexes": indexes or {}}
+    if stamp is not None:
+        entry["size"] = _records_memory(records)
+    with _cache_lock:
+        _cache.pop(path, None)
+        if stamp is None:
+            return entry
+        size = entry["size"]
+        if _stamp_size(stamp):
+            _memory_ratio[path] = size / _stamp_size(stamp)
+        if size > CACHE_MAX_BYTES:
+            return entry  # Bigger than the whole budget, never cache it
+        _cache[path] = entry
+        total = sum(e["size"] for e in _cache.values())
+        while total > CACHE_MAX_BYTES:
+            _, old = _cache.popitem(last=False)
+            total -= old["size"]
+            _cache_stats["evictions"] += 1
+        return entry
+
+
+def cache_stats():
+    """Return hit/miss/eviction counters and current cache usage (estimated bytes)."""
+    with _cache_lock:
+        return {
+            **_cache_stats,
+            "files": len(_cache),
+            "bytes": sum(e["size"] for e in _cache.values()),
+        }
+
+
+def clear_cache(source=None):
+    """Drop one file (or everything) from the record cache."""
+    if source is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.path.abspath(source), None)
+
+
+def _digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_tokens = {}  # abs path -> (snapshot file stamp, content digest)
+
+
+def _snapshot_token(path, snap_stamp):
+    """Content digest of the snapshot, hashed once per file stamp."""
+    if snap_stamp is None:
+        return None
+    cached = _tokens.get(path)
+    if cached is None or cached[0] != snap_stamp:
+        cached = _tokens[path] = (snap_stamp, _digest(path))
+    return cached[1]
+
+
+def _header_matches(path, header, snap_stamp):
+    """Does a journal header belong to the snapshot now at path?"""
+    base = header.get("snapshot")
+    if (tuple(base) if base else None) == snap_stamp:
+        return True
+    # Same content under a new stamp, e.g. after cp -r, touch or rsync
+    token = header.get("token")
+    return token is not None and token == _snapshot_token(path, snap_stamp)
+
+
+def _read_journal(path, snap_stamp):
+    """Return the journal operations that still apply to the snapshot.
+
+    A journal left behind by a compaction that finished replacing the
+    snapshot carries a "folded" line with the new snapshot's digest and
+    is ignored. Any other mismatch raises JournalError.
+    """
+    journal = _journal_path(path)
+    if not os.path.exists(journal):
+        return []
+
+    header = None
+    ops = []
+    folded = None
+    with open(journal, "r") as file:
+        for i, line in enumerate(file):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn line from a crash mid-append
+            if i == 0:
+                header = entry
+            elif "folded" in entry:
+                folded = entry["folded"]
+            else:
+                ops.append(entry)
+
+    if not header or "snapshot" not in header:
+        return []  # Torn header: nothing after it was acknowledged
+    if folded is not None and folded == _snapshot_token(path, snap_stamp):
+        return []
+    if not _header_matches(path, header, snap_stamp):
+        raise JournalError(
+            f"{journal} does not belong to the current {os.path.basename(path)}; "
+            f"its {len(ops)} pending operation(s) were not applied. Restore the "
+            f"snapshot it was written against, or remove the journal to discard them.")
+    return ops
+
+
+def _corrupt(path, problem):
+    return CorruptTableError(
+        f"{path} is damaged ({problem}). Restore it (restore_from_snapshot() if "
+        f"it has a .bin snapshot) before reading or writing this table.")
+
+
+def _parse_table(path, text):
+    if not text:
+        return []  # Created empty, no records yet
+    try:
+        records = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise _corrupt(path, e) from None
+    if not isinstance(records, list):
+        raise _corrupt(path, "not a JSON array")
+    return records
+
+
+def _load_entry(source):
+    """Return the cache entry (records + indexes) for source."""
+    path = os.path.abspath(source)
+    if _uses_sqlite():
+        return _load_entry_sqlite(path)
+    stamp = _table_stamp(path)
+    if stamp is None:
+        _cache.pop(path, None)
+        return {"stamp": None, "records": [], "indexes": {}}  # File not created yet
+
+    entry = _cache_get(path, stamp)
+    if entry is not None:
+        return entry
+
+    # Snapshot and journal have to be read as one consistent pair
+    with locking.shared_lock(path):
+        stamp = _table_stamp(path)
+        if stamp is None:
+            return {"stamp": None, "records": [], "indexes": {}}
+
+        records = []
+        if stamp[0] is not None:
+            records = _read_binary_snapshot(path, stamp[0])
+            if records is None:
+                with open(path, "r") as file:
+                    records = _parse_table(path, file.read())
+
+        _replay(records, _read_journal(path, stamp[0]))
+
+    if _trace is not None:
+        _trace("read", _stamp_size(stamp), len(records))
+    return _cache_put(path, stamp, records)
+
+
+def _load_entry_sqlite(path):
+    conn = sqlite_store.connect(path)
+    table = sqlite_store.table_name(path)
+    # Stamp and rows from one read snapshot
+    with sqlite_store.read(conn):
+        stamp = sqlite_store.stamp(conn, table)
+        if stamp is None:
+            _cache.pop(path, None)
+            return {"stamp": None, "records": [], "indexes": {}}
+        entry = _cache_get(path, stamp)
+        if entry is not None:
+            return entry
+        records = list(sqlite_store.rows(conn, table))
+    if _trace is not None:
+        _trace("read", _stamp_size(stamp), len(records))
+    return _cache_put(path, stamp, records)
+
+
+def _load_records(source):
+    """Return the shared cached list for source. Callers must not mutate it."""
+    return _load_entry(source)["records"]
+
+
+def _save_records(source, records, indexes=None):
+    """Atomically replace the JSON file and drop any journal folded into it."""
+    path = os.path.abspath(source)
+    temp = path + ".tmp"
+    with locking.exclusive_lock(path):
+        with open(temp, "w") as file:
+            json.dump(records, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
 
-    with open(source, "r") as file:
+        # Mark a pending journal as folded into the new snapshot before it
+        # goes live, so a crash before the journal is removed below cannot
+        # replay it a second time
+        journal = _journal_path(path)
+        token = None
+        if os.path.exists(journal):
+            token = _digest(temp)
+            with open(journal, "a") as file:
+                file.write("\n" + json.dumps({"folded": token}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp, path)
+        if token is not None:
+            _tokens[path] = (_file_stamp(path), token)
+            os.remove(journal)
+
+        if BINARY_SNAPSHOTS:
+            write_snapshot(path, records)
+
+        stamp = _table_stamp(path)
+        if _trace is not None:
+            _trace("write", _stamp_size(stamp), len(records))
+        return _cache_put(path, stamp, records, indexes)
+
+
+def _discard_snapshot(path):
+    # The JSON file is the source of truth; a damaged .bin is only removed
+    try:
+        os.remove(snapshot.snapshot_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def _read_binary_snapshot(path, json_stamp):
+    """Rows from the binary snapshot if it matches the JSON file, else None.
+
+    A snapshot that cannot be decoded is deleted and None returned, so
+    the caller reads the JSON file instead.
+    """
+    snap = snapshot.open_snapshot(snapshot.snapshot_path(path))
+    if snap is None:
+        return None
+    try:
+        if tuple(snap["source"] or ()) != json_stamp:
+            return None  # Built from an older JSON file
+        return snapshot.load_rows(snap)
+    except snapshot.DECODE_ERRORS:
+        _discard_snapshot(path)
+        return None
+    finally:
+        snapshot.close_snapshot(snap)
+
+
+def write_snapshot(source, records=None):
+    """Write "<table>.bin" from the JSON file of source (JSON -> binary).
+
+    records, if given, must be the current content of the JSON file;
+    otherwise the file is streamed twice (once for the field list).
+    A pending journal is not included, it is replayed on top as usual.
+    """
+    path = os.path.abspath(source)
+    with locking.exclusive_lock(path):
+        json_stamp = _file_stamp(path)
+        if json_stamp is None:
+            return
+
+        entry = _cache.get(path)
+        if records is None and entry is not None and entry["stamp"] == (json_stamp, None):
+            records = entry["records"]
+
+        fields = {}
+        if records is None:
+            with open(path, "r") as file:
+                for record in _stream_json_array(file):
+                    fields.update(dict.fromkeys(record))
+            with open(path, "r") as file:
+                snapshot.write_snapshot(snapshot.snapshot_path(path),
+                                        _stream_json_array(file),
+                                        list(fields), json_stamp)
+            return
+
+        for record in records:
+            fields.update(dict.fromkeys(record))
+        snapshot.write_snapshot(snapshot.snapshot_path(path), records,
+                                list(fields), json_stamp)
+
+
+def restore_from_snapshot(source):
+    """Rewrite the JSON file of source from its binary snapshot (binary -> JSON)."""
+    path = os.path.abspath(source)
+    snap = snapshot.open_snapshot(snapshot.snapshot_path(path))
+    if snap is None:
+        print("No binary snapshot found!")
+        return False
+    try:
+        records = snapshot.load_rows(snap)
+    except snapshot.DECODE_ERRORS:
+        print("Binary snapshot is damaged, the JSON file was left as it is!")
+        return False
+    finally:
+        snapshot.close_snapshot(snap)
+    _save_records(path, records)
+    return True
+
+
+def compact_journal(source):
+    """Fold the journal of source into a new JSON snapshot."""
+    if _uses_sqlite():
+        return  # The JSON files and their journals are not in use
+    path = os.path.abspath(source)
+    with locking.exclusive_lock(path):
+        if not os.path.exists(_journal_path(path)):
+            return
+        entry = _load_entry(path)
+        saved = _save_records(path, entry["records"], entry["indexes"])
+        # Same records, only the stamp moves
+        _notify(path, entry["stamp"], saved["stamp"], [])
+
+
+def _journal_header(journal):
+    try:
+        with open(journal, "r") as file:
+            return json.loads(file.readline())
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        return {}
+
+
+def _append_journal(path, ops):
+    """Append ops durably: they are on disk before the write is acknowledged."""
+    journal = _journal_path(path)
+    snap_stamp = _file_stamp(path)
+    text = "".join(json.dumps(op) + "\n" for op in ops)
+    header = _journal_header(journal)
+    if header and _header_matches(path, header, snap_stamp):
+        mode = "a"
+    else:
+        # No journal yet, or one already folded into the snapshot (loading
+        # the table raised for any other kind): start over
+        mode = "w"
+        text = json.dumps({"snapshot": snap_stamp,
+                           "token": _snapshot_token(path, snap_stamp)}) + "\n" + text
+    with open(journal, mode) as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    if _trace is not None:
+        _trace("write", len(text), len(ops))
+
+
+def _journal_too_big(stamp):
+    snap, journal = stamp
+    snap_size = snap[1] if snap else 0
+    limit = max(JOURNAL_MIN_BYTES, snap_size * JOURNAL_COMPACT_RATIO)
+    return journal is not None and journal[1] > limit
+
+
+# ------------------------------
+# Hash indexes
+# ------------------------------
+# Indexes map the lowercased string of a field (the same comparison
+# find_record uses) to the set of row positions holding it. They are
+# built per file on first use and kept up to date by add/update/delete.
+INDEXED_FIELDS = ("userID", "username", "aptID", "inID", "medID",
+                  "patient", "doctor", "status")
+
+
+def _index_key(value):
+    return str(value).lower()
+
+
+def _get_index(entry, field):
+    """Return {lowercased value: set of row positions} for field."""
+    index = entry["indexes"].get(field)
+    if index is None:
+        index = {}
+        for i, record in enumerate(entry["records"]):
+            index.setdefault(_index_key(record.get(field, "")), set()).add(i)
+        entry["indexes"][field] = index
+    return index
+
+
+def _sort_key(record, fields):
+    return tuple(str(record.get(field, "")) for field in fields)
+
+
+def _get_sorted_index(entry, fields):
+    """Return a sorted list of (field values, row position) for a field tuple.
+
+    Sorted indexes share entry["indexes"] with the hash indexes, keyed by
+    the tuple of field names instead of a single name.
+    """
+    index = entry["indexes"].get(fields)
+    if index is None:
+        index = sorted((_sort_key(r, fields), i)
+                       for i, r in enumerate(entry["records"]))
+        entry["indexes"][fields] = index
+    return index
+
+
+def _index_add(entry, i, record):
+    for field, index in entry["indexes"].items():
+        if isinstance(field, tuple):
+            insort(index, (_sort_key(record, field), i))
+        else:
+            index.setdefault(_index_key(record.get(field, "")), set()).add(i)
+
+
+def _index_remove(entry, i, record):
+    for field, index in entry["indexes"].items():
+        if isinstance(field, tuple):
+            item = (_sort_key(record, field), i)
+            pos = bisect_left(index, item)
+            if pos < len(index) and index[pos] == item:
+                del index[pos]
+            continue
+        key = _index_key(record.get(field, ""))
+        rows = index.get(key)
+        if rows is not None:
+            rows.discard(i)
+            if not rows:
+                del index[key]
+
+
+# ------------------------------
+# Replay journal operations
+# ------------------------------
+def _matches_id(record, record_id):
+    id_key = _get_id_key(record)
+    return id_key is not None and record.get(id_key) == record_id
+
+
+def _updated_copy(record, updates):
+    # Copy before changing, the cached dicts are shared
+    record = dict(record)
+    for k, v in updates.items():
+        if k in record:
+            record[k] = v
+    record[VERSION_FIELD] = record_version(record) + 1
+    return record
+
+
+def _replay(records, ops):
+    """Apply journal operations to a plain list (no indexes) in place.
+
+    Row positions are looked up by ID in a dict built once, so the cost
+    is one pass over the rows plus one step per operation. An update
+    changes the first record with the ID, a delete removes all of them.
+    """
+    if not ops:
+        return
+    positions = {}  # record ID -> row positions, ascending
+    for i, record in enumerate(records):
+        id_key = _get_id_key(record)
+        if id_key is not None:
+            positions.setdefault(record.get(id_key), []).append(i)
+
+    deleted = False
+    for op in ops:
+        kind = op.get("op")
+        if kind == "add":
+            record = op["record"]
+            id_key = _get_id_key(record)
+            if id_key is not None:
+                positions.setdefault(record.get(id_key), []).append(len(records))
+            records.append(record)
+        elif kind == "update":
+            rows = positions.get(op["id"])
+            if not rows:
+                continue
+            i = rows[0]
+            records[i] = _updated_copy(records[i], op["updates"])
+            new_id = records[i].get(_get_id_key(records[i]))
+            if new_id != op["id"]:  # The update renamed the record
+                del rows[0]
+                if not rows:
+                    del positions[op["id"]]
+                insort(positions.setdefault(new_id, []), i)
+        elif kind == "delete":
+            for i in positions.pop(op["id"], ()):
+                records[i] = None
+                deleted = True
+
+    if deleted:
+        records[:] = [r for r in records if r is not None]
+
+
+def _id_positions(entry, record_id):
+    """Row positions whose ID field equals record_id, using the ID index."""
+    records = entry["records"]
+    if not records:
+        return []
+    id_key = _get_id_key(records[0])
+    if id_key in INDEXED_FIELDS:
+        rows = _get_index(entry, id_key).get(_index_key(record_id), ())
+        return [i for i in sorted(rows) if _matches_id(records[i], record_id)]
+    return [i for i, r in enumerate(records) if _matches_id(r, record_id)]
+
+
+def _mutate(source, ops, expected_version=None):
+    """Apply ops to source, through the journal or by rewriting the file.
+
+    All ops are of one kind (add, update or delete) and go out in a
+    single write (one transaction with the SQLite backend). Returns how
+    many of them matched a record.
+    """
+    with locking.exclusive_lock(source):
+        if _uses_sqlite():
+            count = _mutate_sqlite(os.path.abspath(source), ops, expected_version)
+        else:
+            count = _mutate_locked(source, ops, expected_version)
+        # Added IDs, and IDs given by renames, must not be minted again
+        written = [op["record"] if op["op"] == "add" else op["updates"]
+                   for op in ops if op["op"] != "delete"]
+        if count and written:
+            advance_ids(source, written)
+        return count
+
+
+def _resolve_targets(entry, ops, expected_version):
+    """[(op, row positions)] for the ops that match, positions None for adds.
+
+    Each op sees the rows as the earlier ops of the batch leave them, as
+    journal replay and the SQLite engine do: a second delete of an ID
+    matches nothing, an update finds a row an earlier update renamed.
+    """
+    # Find every target row first, so nothing is written if a check fails
+    records = entry["records"]
+    targets = []
+    touched = {}   # position -> record after the earlier ops, None if deleted
+    renamed = {}   # ID index key -> positions an earlier update gave that ID
+    for op in ops:
+        if op["op"] == "add":
+            targets.append((op, None))
+            continue
+        candidates = set(_id_positions(entry, op["id"]))
+        candidates.update(renamed.get(_index_key(op["id"]), ()))
+        positions = sorted(i for i in candidates
+                           if touched.get(i, records[i]) is not None
+                           and _matches_id(touched.get(i, records[i]), op["id"]))
+        if not positions:
+            continue
+        current = record_version(touched.get(positions[0], records[positions[0]]))
+        if expected_version is not None and current != expected_version:
+            raise ConflictError(
+                f"Record {op['id']} is at version {current}, expected {expected_version}."
+            )
+        targets.append((op, positions))
+        if op["op"] == "update":
+            i = positions[0]
+            touched[i] = _updated_copy(touched.get(i, records[i]), op["updates"])
+            renamed.setdefault(_index_key(_record_id(touched[i])), set()).add(i)
+        else:
+            touched.update((i, None) for i in positions)
+    return targets
+
+
+def _apply_targets(entry, records, targets):
+    """Apply resolved ops to records, keeping entry's indexes in step.
+
+    Returns (indexes, changes); indexes is None once deletes have
+    shifted the row positions.
+    """
+    indexes = entry["indexes"]
+    changes = []  # (old record, new record), None for a side that is absent
+    drop = set()
+    for op, positions in targets:
+        kind = op["op"]
+        if kind == "add":
+            records.append(op["record"])
+            _index_add(entry, len(records) - 1, op["record"])
+            changes.append((None, op["record"]))
+        elif kind == "update":
+            i = positions[0]
+            old = records[i]
+            _index_remove(entry, i, old)
+            records[i] = _updated_copy(old, op["updates"])
+            _index_add(entry, i, records[i])
+            changes.append((old, records[i]))
+        else:
+            drop.update(positions)
+
+    if drop:
+        changes.extend((records[i], None) for i in sorted(drop))
+        records[:] = [r for i, r in enumerate(records) if i not in drop]
+        indexes = None  # Positions shifted, rebuild on next lookup
+    return indexes, changes
+
+
+def _mutate_locked(source, ops, expected_version):
+    path = os.path.abspath(source)
+    entry = _load_entry(path)
+    targets = _resolve_targets(entry, ops, expected_version)
+    if not targets:
+        return 0
+
+    if JOURNAL_MODE:
+        try:
+            _append_journal(path, [op for op, _ in targets])
+        except OSError:
+            _cache.pop(path, None)
+            raise
+    # A new list, not the cached one changed in place: iter_records
+    # generators over the old list keep the rows they started with
+    records = list(entry["records"])
+
+    old_stamp = entry["stamp"]
+    indexes, changes = _apply_targets(entry, records, targets)
+
+    if not JOURNAL_MODE:
         try:
-            records = json.load(file)
-        except json.JSONDecodeError:
-            return []  # Empty or corrupt JSON file
+            saved = _save_records(path, records, indexes)
+        except BaseException:
+            # The cached indexes were changed for records that never got
+            # written; drop them so the next read starts from the file
+            _cache.pop(path, None)
+            raise
+        _notify(path, old_stamp, saved["stamp"], changes)
+        return len(targets)
+
+    stamp = _table_stamp(path)
+    _cache_put(path, stamp, records, indexes)
+    _notify(path, old_stamp, stamp, changes)
+    if _journal_too_big(stamp):
+        compact_journal(path)
+    return len(targets)
+
+
+def _record_id(record):
+    id_key = _get_id_key(record)
+    return record.get(id_key) if id_key else None
+
+
+def _row_keys(record):
+    # The SQLite key columns hold exactly what the hash indexes hold
+    return {field: _index_key(record.get(field, "")) for field in INDEXED_FIELDS}
+
+
+def _mutate_sqlite(path, ops, expected_version):
+    conn = sqlite_store.connect(path)
+    table = sqlite_store.table_name(path)
+    adds = [op["record"] for op in ops if op["op"] == "add"]
+
+    with sqlite_store.write(conn):
+        present = {field for record in adds for field in record}
+        sqlite_store.ensure_table(conn, table, INDEXED_FIELDS,
+                                  [f for f in INDEXED_FIELDS if f in present])
+        old_stamp = sqlite_store.stamp(conn, table)
+
+        # Every version is checked before anything is written
+        if expected_version is not None:
+            for op in ops:
+                if op["op"] == "add":
+                    continue
+                rows = sqlite_store.rows_by_id(conn, table, op["id"])
+                current = record_version(rows[0][1]) if rows else expected_version
+                if current != expected_version:
+                    raise ConflictError(
+                        f"Record {op['id']} is at version {current}, expected {expected_version}."
+                    )
+
+        count = len(adds)
+        changes = [(None, record) for record in adds]
+        size_change = written = 0
+        if adds:
+            written = sqlite_store.insert_many(
+                conn, table, [(_record_id(r), r, _row_keys(r)) for r in adds], INDEXED_FIELDS)
+            size_change += written
+
+        for op in ops:
+            if op["op"] == "add":
+                continue
+            rows = sqlite_store.rows_by_id(conn, table, op["id"])
+            if not rows:
+                continue
+            count += 1
+            if op["op"] == "update":
+                rowid, old = rows[0]  # Like the JSON engine, the first match only
+                new = _updated_copy(old, op["updates"])
+                stored = sqlite_store.replace(conn, table, rowid, _record_id(new),
+                                              new, _row_keys(new))
+                written += stored
+                size_change += stored - len(json.dumps(old))
+                changes.append((old, new))
+            else:
+                sqlite_store.delete(conn, table, [rowid for rowid, _ in rows])
+                size_change -= sum(len(json.dumps(old)) for _, old in rows)
+                changes.extend((old, None) for _, old in rows)
+
+        if not count:
+            return 0
+        new_stamp = sqlite_store.bump(conn, table, size_change)
+
+    if _trace is not None:
+        _trace("write", written, count)
+    # A cached copy that was current gets the same change in memory
+    entry = _cache.get(path)
+    if entry is not None and entry["stamp"] == old_stamp:
+        records = list(entry["records"])
+        indexes, _ = _apply_targets(entry, records, _resolve_targets(entry, ops, None))
+        _cache_put(path, new_stamp, records, indexes)
+    else:
+        _cache.pop(path, None)
+    _notify(path, old_stamp, new_stamp, changes)
+    return count
+
+
+def replace_records(source, records):
+    """Overwrite the whole table of source with records in one write.
+
+    No change notifications are sent; listeners see the new stamp and
+    rebuild whatever they derive from the table.
+    """
+    path = os.path.abspath(source)
+    records = list(records)
+    with locking.exclusive_lock(path):
+        if not _uses_sqlite():
+            _save_records(path, records)
+            return len(records)
+
+        conn = sqlite_store.connect(path)
+        table = sqlite_store.table_name(path)
+        fields = {field for record in records for field in record}
+        with sqlite_store.write(conn):
+            sqlite_store.drop_table(conn, table)
+            sqlite_store.ensure_table(conn, table, INDEXED_FIELDS,
+                                      [f for f in INDEXED_FIELDS if f in fields])
+            size = sqlite_store.insert_many(
+                conn, table, ((_record_id(r), r, _row_keys(r)) for r in records),
+                INDEXED_FIELDS)
+            stamp = sqlite_store.bump(conn, table, size)
+        if _trace is not None:
+            _trace("write", size, len(records))
+        _cache_put(path, stamp, records)
+        return len(records)
+
+
+# ------------------------------
+# Change listeners
+# ------------------------------
+_listeners = []
+
+
+def add_listener(listener):
+    """Call listener(path, old_stamp, new_stamp, changes) after each write.
+
+    changes is a list of (old_record, new_record) pairs with None for the
+    missing side of an add or a delete. It is empty when only the stamp
+    moved, e.g. after a journal compaction. Listeners run while the
+    table's exclusive lock is still held.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _notify(path, old_stamp, new_stamp, changes):
+    for listener in _listeners:
+        listener(path, old_stamp, new_stamp, changes)
+
+
+# ------------------------------
+# Read all records from JSON file
+# ------------------------------
+def read_records(source, headers=None):
+    records = _load_records(source)
 
     # If no headers specified, return all records
     if not headers:
-        return records
+        return list(records)
 
     result = []
     for record in records:
@@ -27,6 +969,316 @@ def read_records(source, headers=None):
 
     return result
 
+# ------------------------------
+# Stream records one at a time
+# ------------------------------
+# Files expected to fit CACHE_MAX_BYTES once parsed go through the cache
+# as usual. Anything larger is parsed incrementally, so memory stays at one chunk plus one
+# record no matter how big the file is.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_json_array(file):
+    """Yield the elements of a top-level JSON array without loading it all.
+
+    Takes an open file and closes it when done. An empty file yields
+    nothing; anything else that json.loads would not take as an array
+    raises CorruptTableError when the reader gets there, like
+    read_records.
+    """
+    decoder = json.JSONDecoder()
+    with file:
+        buf = file.read(STREAM_CHUNK_SIZE)
+        eof = not buf
+        pos = 0
+        # What comes next: "[", "first" record or "]", "record" after a
+        # comma, "," or "]" after a record ("sep"), only whitespace after "]"
+        expect = "["
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buf):
+                if eof:
+                    if expect == "end":
+                        return
+                    if expect != "[":
+                        raise _corrupt(file.name, "truncated, no closing ]")
+                    if buf or file.tell():
+                        raise _corrupt(file.name, "not a JSON array")
+                    return
+                buf = file.read(STREAM_CHUNK_SIZE)
+                eof = not buf
+                pos = 0
+                continue
+
+            char = buf[pos]
+            if expect == "[":
+                if char != "[":
+                    raise _corrupt(file.name, "not a JSON array")
+                expect = "first"
+                pos += 1
+                continue
+            if expect == "end":
+                raise _corrupt(file.name, "extra data after the closing ]")
+            if expect == "sep":
+                if char not in ",]":
+                    raise _corrupt(file.name, "expected , or ] after a record")
+                expect = "record" if char == "," else "end"
+                pos += 1
+                continue
+            if char == "]" and expect == "first":
+                expect = "end"
+                pos += 1
+                continue
+            if char in ",]":
+                raise _corrupt(file.name, f"missing record before {char}")
+
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A record running into the end of the buffer may be cut short,
+            # a number even when it decodes ("1." of "1.5")
+            if end is None or (not eof and (end == len(buf) or buf[end] not in " \t\r\n,]")):
+                if eof:
+                    raise _corrupt(file.name, "bad or truncated record")
+                more = file.read(STREAM_CHUNK_SIZE)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+
+            pos = end
+            expect = "sep"
+            yield record
+
+
+def _journal_overlay(ops):
+    """Group journal operations by record ID for replay while streaming."""
+    by_id = {}
+    for seq, op in enumerate(ops):
+        if op.get("op") == "add":
+            record = op["record"]
+            record_id = record.get(_get_id_key(record))
+        else:
+            record_id = op.get("id")
+        by_id.setdefault(record_id, []).append((seq, op))
+    return by_id
+
+
+def _replay_id(id_ops, base):
+    """Replay one ID's operations over its snapshot record (or None).
+
+    Returns the final snapshot record (None if deleted) and the surviving
+    journal-added records as (sequence, record) pairs.
+    """
+    live = [] if base is None else [(-1, base)]
+    for seq, op in id_ops:
+        kind = op.get("op")
+        if kind == "add":
+            live.append((seq, op["record"]))
+        elif kind == "update":
+            for i, (n, record) in enumerate(live):
+                if _matches_id(record, op["id"]):
+                    live[i] = (n, _updated_copy(record, op["updates"]))
+                    break
+        elif kind == "delete":
+            live = [(n, r) for n, r in live if not _matches_id(r, op["id"])]
+
+    result = next((r for n, r in live if n == -1), None)
+    return result, [(n, r) for n, r in live if n != -1]
+
+
+def _stream_table(path):
+    # Open the snapshot and read the journal as one consistent pair; the
+    # open file stays valid even if a compaction replaces it meanwhile
+    with locking.shared_lock(path):
+        stamp = _table_stamp(path)
+        if stamp is None:
+            return
+        ops = _read_journal(path, stamp[0])
+        rows = _stream_json_array(open(path, "r")) if stamp[0] is not None else iter(())
+    if _trace is not None:
+        _trace("read", _stamp_size(stamp), 0)
+
+    if not ops:
+        yield from rows
+        return
+    if any(op.get("op") == "update" and any(k.lower().endswith("id") for k in op["updates"])
+           for op in ops):
+        # An update that renames a record moves it to another ID's ops,
+        # which the per-ID overlay cannot follow; replay in full instead
+        records = list(rows)
+        _replay(records, ops)
+        yield from records
+        return
+
+    by_id = _journal_overlay(ops)
+    seen = set()
+    added = []
+    for record in rows:
+        record_id = record.get(_get_id_key(record))
+        id_ops = by_id.get(record_id)
+        if id_ops is None:
+            yield record
+        elif record_id not in seen:
+            seen.add(record_id)
+            record, new = _replay_id(id_ops, record)
+            added.extend(new)
+            if record is not None:
+                yield record
+        elif not any(op.get("op") == "delete" for _, op in id_ops):
+            yield record  # Duplicate ID, only the first one gets updates
+
+    for record_id, id_ops in by_id.items():
+        if record_id not in seen:
+            added.extend(_replay_id(id_ops, None)[1])
+    added.sort(key=lambda item: item[0])
+    for _, record in added:
+        yield record
+
+
+def iter_records(source, headers=None, predicate=None):
+    """Yield records one at a time, optionally filtered and projected.
+
+    predicate sees the full record; headers then picks the fields that
+    are yielded, like read_records.
+    """
+    path = os.path.abspath(source)
+    stamp = _current_stamp(path)
+    if stamp is None:
+        return
+
+    entry = _cache.get(path)
+    if entry is not None and entry["stamp"] == stamp:
+        rows = iter(entry["records"])
+    elif _expected_memory(path, stamp) <= CACHE_MAX_BYTES:
+        rows = iter(_load_records(path))
+    elif _uses_sqlite():
+        rows = sqlite_store.stream(path)
+    else:
+        rows = _stream_table(path)
+    if _trace is not None:
+        rows = _counted(rows)
+
+    for record in rows:
+        if predicate is not None and not predicate(record):
+            continue
+        if headers:
+            record = {h: record.get(h, "") for h in headers}
+        yield record
+
+
+# ------------------------------
+# Read-only field scans over the binary snapshot
+# ------------------------------
+def _passes(value, test):
+    return test(value) if callable(test) else value in test
+
+
+def _scan_snapshot(snap, fields, where):
+    """Yield (rows in block, matching rows) per block; a block is fully
+    decoded before any of its rows is handed out."""
+    names = set(snap["fields"])
+
+    def column(block, field, size):
+        if field not in names:
+            return [""] * size
+        values = snapshot.read_column(snap, block, field)
+        if snapshot.MISSING in values:
+            values = ["" if v is snapshot.MISSING else v for v in values]
+        return values
+
+    for block in range(snapshot.block_count(snap)):
+        size = min(snap["block_rows"], snap["rows"] - block * snap["block_rows"])
+
+        # Decode the filter fields first, the rest only if a row survives
+        rows = range(size)
+        for field, test in where.items():
+            values = column(block, field, size)
+            rows = [i for i in rows if _passes(values[i], test)]
+            if not rows:
+                break
+        if not rows:
+            yield size, []
+            continue
+
+        columns = [column(block, field, size) for field in fields]
+        yield size, [{field: col[i] for field, col in zip(fields, columns)} for i in rows]
+
+
+def scan_fields(source, fields, where=None):
+    """Yield {field: value} dicts for the rows that pass where.
+
+    where maps a field to a set of accepted values or to a callable test.
+    Missing fields read as "", like read_records with headers. This is a
+    read-only path: when the binary snapshot of source is current it is
+    memory-mapped and only the where fields, and then the requested
+    fields of blocks with matching rows, are decoded.
+    """
+    fields = list(fields)
+    where = where or {}
+    path = os.path.abspath(source)
+    stamp = _current_stamp(path)
+    if stamp is None:
+        return
+
+    entry = _cache.get(path)
+    use_snapshot = (not _uses_sqlite() and stamp[1] is None
+                    and not (entry is not None and entry["stamp"] == stamp))
+
+    snap = None
+    if use_snapshot:
+        snap = snapshot.open_snapshot(snapshot.snapshot_path(path))
+        if snap is not None and tuple(snap["source"] or ()) != stamp[0]:
+            snapshot.close_snapshot(snap)
+            snap = None
+        if snap is None and BINARY_SNAPSHOTS:
+            write_snapshot(path)
+            snap = snapshot.open_snapshot(snapshot.snapshot_path(path))
+
+    def predicate(record):
+        return all(_passes(record.get(f, ""), t) for f, t in where.items())
+
+    if snap is None:
+
+        # A set test can start from the hash index of a cached table,
+        # so only the rows holding one of the values are looked at
+        indexed = next((f for f, t in where.items() if not callable(t)), None)
+        if indexed is not None and _expected_memory(path, stamp) <= CACHE_MAX_BYTES:
+            entry = _load_entry(path)
+            index = _get_index(entry, indexed)
+            rows = set()
+            for value in where[indexed]:
+                rows.update(index.get(_index_key(value), ()))
+            records = entry["records"]
+            if _trace is not None:
+                _trace("scan", 0, len(rows))
+            for i in sorted(rows):
+                if predicate(records[i]):
+                    yield {f: records[i].get(f, "") for f in fields}
+            return
+
+        yield from iter_records(path, fields, predicate if where else None)
+        return
+
+    if _trace is not None:
+        _trace("scan", 0, snap["rows"])
+    done = 0  # Snapshot rows already scanned
+    try:
+        for size, rows in _scan_snapshot(snap, fields, where):
+            yield from rows
+            done += size
+    except snapshot.DECODE_ERRORS:
+        # Damaged snapshot: the rest comes from the JSON file
+        _discard_snapshot(path)
+        rows = itertools.islice(iter_records(path), done, None)
+        yield from ({f: r.get(f, "") for f in fields} for r in rows
+                    if not where or predicate(r))
+    finally:
+        snapshot.close_snapshot(snap)
+
 # ------------------------------
 # Helper: find ID key dynamically
 # ------------------------------
@@ -39,99 +1291,295 @@ def _get_id_key(record):
 # ------------------------------
 # Find record by any field
 # ------------------------------
+def _filters_match(record, filters, mode):
+    # Convert record to lowercase strings for comparison
+    matches = [
+        str(record.get(key, "")).lower() == str(value).lower()
+        for key, value in filters.items()
+    ]
+    return all(matches) if mode == "and" else any(matches)
+
+
 def find_record(source, mode, filters):
-    records = read_records(source)
     mode = mode.lower()
+    if mode not in ("and", "or"):
+        raise ValueError("Mode must be 'and' or 'or'.")
 
-    result = []
+    indexed = [key for key in filters if key in INDEXED_FIELDS]
 
-    for record in records:
-        # Convert record to lowercase strings for comparison
-        matches = [
-            str(record.get(key, "")).lower() == str(value).lower()
-            for key, value in filters.items()
-        ]
+    # OR can only use the indexes when every field has one
+    if mode == "or" and (not filters or len(indexed) < len(filters)):
+        indexed = []
 
-        if mode == "and":
-            if all(matches):
-                result.append(record)
+    if indexed and _uses_sqlite():
+        path = os.path.abspath(source)
+        entry = _cache.get(path)
+        if entry is None or entry["stamp"] != _current_stamp(path):
+            # Not in memory: let SQLite seek its key columns instead of
+            # loading the whole table
+            return _find_sqlite(path, mode, filters, indexed)
 
-        elif mode == "or":
-            if any(matches):
-                result.append(record)
+    entry = _load_entry(source)
+    records = entry["records"]
 
-        else:
-            raise ValueError("Mode must be 'and' or 'or'.")
+    if not indexed:
+        if _trace is not None:
+            _trace("scan", 0, len(records))
+        return [r for r in records if _filters_match(r, filters, mode)]
+
+    buckets = [_get_index(entry, key).get(_index_key(filters[key]), set())
+               for key in indexed]
+    if mode == "and":
+        buckets.sort(key=len)
+        rows = buckets[0].intersection(*buckets[1:])
+    else:
+        rows = set().union(*buckets)
+
+    result = [records[i] for i in sorted(rows)]
+    if _trace is not None:
+        _trace("scan", 0, len(result))
+
+    # Remaining AND filters on fields without an index
+    rest = {k: v for k, v in filters.items() if k not in INDEXED_FIELDS}
+    if rest:
+        result = [r for r in result if _filters_match(r, rest, "and")]
+    return result
+
+
+def _find_sqlite(path, mode, filters, indexed):
+    conn = sqlite_store.connect(path)
+    table = sqlite_store.table_name(path)
+    if sqlite_store.stamp(conn, table) is None:
+        return []
+    keys = {key: _index_key(filters[key]) for key in indexed}
+    result = sqlite_store.find(conn, table, keys, mode)
+    if _trace is not None:
+        _trace("read", 0, len(result))
+    rest = {k: v for k, v in filters.items() if k not in INDEXED_FIELDS}
+    if rest:
+        result = [r for r in result if _filters_match(r, rest, "and")]
     return result
 
 
 # ------------------------------
-# Add a new record
+# Multi-value lookups and joins
+# ------------------------------
+def join_records(left_source, left_filters, right_source, on):
+    """Pair each left record matching left_filters with its right records.
+
+    Returns a list of (left_record, [right records with the same `on`
+    value]) pairs, both sides looked up through the hash indexes.
+    """
+    right = _load_entry(right_source)
+    right_records = right["records"]
+    index = _get_index(right, on)
+
+    pairs = []
+    for left in find_record(left_source, "and", left_filters):
+        value = left.get(on)
+        rows = sorted(index.get(_index_key(value), ())) if value else []
+        pairs.append((left, [right_records[i] for i in rows
+                             if right_records[i].get(on) == value]))
+    return pairs
+
+
+# ------------------------------
+# Range queries over sorted fields
 # ------------------------------
-def add_record(source, values):
-    records = read_records(source)
+def _range_rows(entry, fields, low, high):
+    index = _get_sorted_index(entry, tuple(fields))
+    # Bounds may be shorter than fields, e.g. a date range over (date, time)
+    lo = bisect_left(index, tuple(low), key=lambda item: item[0][:len(low)])
+    hi = bisect_right(index, tuple(high), key=lambda item: item[0][:len(high)])
+    if _trace is not None:
+        _trace("scan", 0, hi - lo)
+    return index[lo:hi]
 
-    # Add new record
-    records.append(values)
 
-    # Save back to JSON file
-    with open(source, "w") as file:
-        json.dump(records, file, indent=4)
+def find_range(source, fields, low, high):
+    """Return records whose values for fields fall within [low, high].
 
-    print("Record added successfully!")
+    fields is a tuple such as ("date", "time"); low and high are tuples of
+    the same or shorter length, compared as strings. Records come back in
+    sorted order, and the cost is proportional to the rows in range.
+    """
+    entry = _load_entry(source)
+    records = entry["records"]
+    return [records[i] for _, i in _range_rows(entry, fields, low, high)]
+
+
+def count_by(source, fields, low, high, group_fields):
+    """Count records in a find_range window grouped by group_fields.
+
+    Returns a Counter keyed by tuples of group_fields values.
+    """
+    entry = _load_entry(source)
+    records = entry["records"]
+    counts = Counter()
+    for _, i in _range_rows(entry, fields, low, high):
+        record = records[i]
+        counts[tuple(record.get(g, "") for g in group_fields)] += 1
+    return counts
 
 
 # ------------------------------
-# Update a record by ID
+# Add a new record
+# quiet=True skips the confirmation line (servers, background jobs);
+# it is per call, so concurrent callers do not silence each other
 # ------------------------------
-def update_record(source, record_id, updates):
-    records = read_records(source)
-    updated = False
+def add_record(source, values, quiet=False):
+    _mutate(source, [{"op": "add", "record": values}])
+    _report(quiet, "Record added successfully!")
 
-    for record in records:
-        if record["id"] == record_id:
-            for k, v in updates.items():
-                if k in record:
-                    record[k] = v
-            updated = True
-            break
-
-    if updated:
-        with open(source, "w") as file:
-            json.dump(records, file, indent=4)
-        print("Record updated successfully!")
-    else:
-        print("Record not found!")
+
+def _report(quiet, message):
+    if not quiet:
+        print(message)
+
+
+# ------------------------------
+# Update a record by ID
+# ------------------------------
+def update_record(source, record_id, updates, expected_version=None, quiet=False):
+    op = {"op": "update", "id": record_id, "updates": updates}
+    count = _mutate(source, [op], expected_version)
+    _report(quiet, "Record updated successfully!" if count else "Record not found!")
+    return count
 
 
 # ------------------------------
 # Delete record by ID
 # ------------------------------
-def delete_record(source, record_id):
-    records = read_records(source)
+def delete_record(source, record_id, expected_version=None, quiet=False):
+    count = _mutate(source, [{"op": "delete", "id": record_id}], expected_version)
+    _report(quiet, "Record deleted successfully!" if count else "Record not found!")
+    return count
 
-    new_records = []
-    deleted = False
 
-    for record in records:
+# ------------------------------
+# Batch versions: one pass and one write for many records
+# ------------------------------
+def add_records(source, records, quiet=False):
+    """Add every record from an iterable. Returns how many were added."""
+    count = _mutate(source, [{"op": "add", "record": r} for r in records])
+    _report(quiet, f"{count} record(s) added successfully!")
+    return count
+
+
+def update_records(source, changes, quiet=False):
+    """Apply (record_id, updates) pairs. Returns how many records matched."""
+    ops = [{"op": "update", "id": record_id, "updates": updates}
+           for record_id, updates in changes]
+    count = _mutate(source, ops)
+    _report(quiet, f"{count} of {len(ops)} record(s) updated successfully!")
+    return count
+
+
+def delete_records(source, record_ids, quiet=False):
+    """Delete every record whose ID is in record_ids. Returns how many matched."""
+    ops = [{"op": "delete", "id": record_id} for record_id in record_ids]
+    count = _mutate(source, ops)
+    _report(quiet, f"{count} of {len(ops)} record(s) deleted successfully!")
+    return count
+
+
+
+# ------------------------------
+# ID sequences
+# ------------------------------
+# "<table>.seq" stores the highest number handed out per ID prefix, so
+# new IDs never reuse one freed by a delete and minting one does not
+# read the table. The first call for a prefix seeds it from the table.
+def _sequence_path(path):
+    return os.path.splitext(path)[0] + ".seq"
+
+
+def _highest_id_number(path, prefix):
+    pattern = re.compile(re.escape(prefix) + r"(\d+)$")
+    highest = 0
+    for record in iter_records(path):
         id_key = _get_id_key(record)
-        if id_key and record.get(id_key) == record_id:
-            deleted = True
-            continue
-        new_records.append(record)
+        match = pattern.match(str(record.get(id_key, ""))) if id_key else None
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
 
-    if deleted:
-        with open(source, "w") as file:
-            json.dump(new_records, file, indent=4)
-        print("Record deleted successfully!")
-    else:
-        print("Record not found!")
+
+def _read_sequences(seq_path):
+    try:
+        with open(seq_path, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
 
+def _write_sequences(seq_path, sequences):
+    # Write-then-rename, so a crash leaves the old or the new mark
+    temp = seq_path + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(sequences, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, seq_path)
+
+
+def next_ids(source, prefix, count):
+    """Reserve count new IDs like "U12" for source and return them."""
+    path = os.path.abspath(source)
+    seq_path = _sequence_path(path)
+    with locking.exclusive_lock(path):
+        sequences = _read_sequences(seq_path)
+        last = sequences.get(prefix)
+        if last is None:
+            last = _highest_id_number(path, prefix)
+        sequences[prefix] = last + count
+        _write_sequences(seq_path, sequences)
+
+    return [f"{prefix}{n}" for n in range(last + 1, last + count + 1)]
+
+
+def advance_ids(source, records):
+    """Move the ID sequences of source past IDs that records bring along.
+
+    Called for every add, so an ID given by the caller (e.g. a bulk
+    import row with its own userID) is never minted again later.
+    Prefixes without a sequence yet are left alone; their first
+    next_ids call scans the table anyway.
+    """
+    path = os.path.abspath(source)
+    seq_path = _sequence_path(path)
+    with locking.exclusive_lock(path):
+        sequences = _read_sequences(seq_path)
+        changed = False
+        for prefix, last in sequences.items():
+            pattern = re.compile(re.escape(prefix) + r"(\d+)$")
+            for record in records:
+                match = pattern.match(str(_record_id(record) or ""))
+                if match and int(match.group(1)) > last:
+                    last = sequences[prefix] = int(match.group(1))
+                    changed = True
+        if changed:
+            _write_sequences(seq_path, sequences)
+
+
+def next_id(source, prefix):
+    """Return the next unused ID for source, e.g. next_id(user_source, "U")."""
+    return next_ids(source, prefix, 1)[0]
+
 
 #Pretty print section
+def clear_screen():
+    """Clear the terminal with an ANSI escape instead of a cls/clear shell."""
+    if os.name == "nt" and not os.environ.get("WT_SESSION"):
+        os.system("cls")  # Classic Windows consoles ignore ANSI escapes
+    else:
+        print("\033[2J\033[H", end="", flush=True)
+
+
 #Pretty print a single record in a box
 def pretty_print_box(record):
+    # Internal fields such as _version are not shown
+    record = {k: v for k, v in record.items() if not k.startswith("_")}
     # Find the longest key for alignment
     max_key_length = max(len(key) for key in record.keys())
     # Calculate box width
@@ -148,31 +1596,148 @@ def pretty_print_box(record):
     # Print bottom border
     print("└" + "─" * box_width + "┘")
 
+# Column widths come from the first WIDTH_SAMPLE rows only, so a table
+# of any length starts printing at once; longer values are cut short
+WIDTH_SAMPLE = 200
+MAX_COL_WIDTH = 40
+PAGE_SIZE = 20
+PAGE_WINDOW = 5  # Pages page_records keeps for going back
+
+
+def _column_widths(sample, headers):
+    col_widths = {}
+    for header in headers:
+        max_width = len(header)
+        for record in sample:
+            max_width = max(max_width, len(str(record.get(header, ""))))
+        col_widths[header] = min(max_width, max(MAX_COL_WIDTH, len(header)))
+    return col_widths
+
+
+def _format_cell(value, width):
+    value = str(value)
+    if len(value) > width:
+        value = value[:width - 1] + "…"
+    return value.ljust(width)
+
+
+def _format_row(record, headers, col_widths):
+    return " | ".join(_format_cell(record.get(header, ""), col_widths[header])
+                      for header in headers)
+
+
+def _table_start(records, headers):
+    # Peek at the first rows for the widths without consuming the stream
+    records = iter(records)
+    sample = list(itertools.islice(records, WIDTH_SAMPLE))
+    if headers is None and sample:
+        headers = [k for k in sample[0].keys() if not k.startswith("_")]
+    return sample, itertools.chain(sample, records), headers
+
+
+def _print_header(headers, col_widths):
+    print(" | ".join(header.ljust(col_widths[header]) for header in headers))
+    print("-+-".join("-" * col_widths[header] for header in headers))
+
+
 #Pretty print multiple records in a formatted table style
 def pretty_print_records(records, headers=None):
-    if not records:
+    """Print records as a table; records may be a list or any iterable.
+
+    Rows are printed as they are read, so a generator such as
+    iter_records() is never loaded into memory.
+    """
+    sample, rows, headers = _table_start(records, headers)
+    if not sample:
         print("No records to display.")
         return
-    if headers is None:
-        headers = list(records[0].keys())
-    # Calculate the maximum width needed for each column
-    col_widths = {}
-    for header in headers:
-        # Start with header length
-        max_width = len(header)
-        # Check all records for longest values
-        for record in records:
-            value_len = len(str(record.get(header, "")))
-            max_width = max(max_width, value_len)
-        col_widths[header] = max_width
-    # Print header row
-    header_row = " | ".join(header.ljust(col_widths[header]) for header in headers)
-    separator = "-+-".join("-" * col_widths[header] for header in headers)
+    col_widths = _column_widths(sample, headers)
+    _print_header(headers, col_widths)
+    for record in rows:
+        print(_format_row(record, headers, col_widths))
 
-    print(header_row)
-    print(separator)
 
-    # Print data rows
-    for record in records:
-        data_row = " | ".join(str(record.get(header, "")).ljust(col_widths[header]) for header in headers)
-        print(data_row)
+def iter_pages(records, page_size=PAGE_SIZE):
+    """Yield lists of up to page_size records, reading lazily."""
+    records = iter(records)
+    while True:
+        page = list(itertools.islice(records, page_size))
+        if not page:
+            return
+        yield page
+
+
+def page_records(records, headers=None, page_size=PAGE_SIZE):
+    """Show records one page at a time with a next/prev/jump prompt.
+
+    records may be a list, any iterable, or a function returning a fresh
+    iterable of them. Pages are only read when first shown and just the
+    last PAGE_WINDOW are kept; going back further reads the records
+    again from the start (a one-shot iterable stops at the oldest kept
+    page). Rendering a page costs the same whatever the total row count.
+    """
+    reopen = records if callable(records) else None
+    if reopen is not None:
+        records = reopen()
+    elif isinstance(records, (list, tuple)):
+        reopen = lambda: records
+    sample, rows, headers = _table_start(records, headers)
+    if not sample:
+        print("No records to display.")
+        return
+    col_widths = _column_widths(sample, headers)
+    total = len(records) if hasattr(records, "__len__") else None
+    pages = iter_pages(rows, page_size)
+    read = 0                 # Pages taken from pages so far
+    window = OrderedDict()   # page number -> rows, least recently shown first
+
+    def fetch(number):
+        """Rows of page number, or None past the end or out of reach."""
+        nonlocal pages, read
+        if number in window:
+            window.move_to_end(number)
+            return window[number]
+        if number < read:
+            if reopen is None:
+                return None
+            pages, read = iter_pages(reopen(), page_size), 0
+        # Read ahead only up to the page asked for
+        while read <= number:
+            page = next(pages, None)
+            if page is None:
+                return None
+            window[read] = page
+            read += 1
+            if len(window) > PAGE_WINDOW:
+                window.popitem(last=False)
+        return window[number]
+
+    current = 0
+    while True:
+        page = fetch(current)
+        if page is None:
+            # Jumped past the end, or behind what a one-shot iterable kept
+            current = read - 1 if current >= read else min(window)
+            page = fetch(current)
+
+        clear_screen()
+        _print_header(headers, col_widths)
+        for record in page:
+            print(_format_row(record, headers, col_widths))
+        if total is not None:
+            page_count = (total + page_size - 1) // page_size
+            print(f"\nPage {current + 1} of {page_count}")
+        else:
+            print(f"\nPage {current + 1}")
+
+        choice = input("[Enter/n] next  [p] prev  [number] jump  [q] quit: ").strip().lower()
+        if choice == "q":
+            return
+        elif choice == "p":
+            current = max(current - 1, 0)
+        elif choice.isdigit() and int(choice) > 0:
+            current = int(choice) - 1
+        elif choice in ("", "n"):
+            if fetch(current + 1) is None:
+                return
+            current += 1